@@ -0,0 +1,748 @@
+"""各图像生成脚本共用的小工具：可复现的随机源、折线裁剪、渐变坐标场与查找表、分带绘制记录、流式PNG写出、粒子精灵图集、圆形图元层、帧缓冲区池和噪声纹理库"""
+import math
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw
+from typing import Dict, List, Optional, Tuple
+
+from perlin_noise import PerlinNoise
+
+
+def make_generator(seed: Optional[int] = None, *spawn_key: int) -> np.random.Generator:
+    """按种子和派生键创建PCG64随机流，不同派生键（如帧号）得到互相独立的流"""
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=spawn_key)))
+
+
+class SeededRandom:
+    """基于 np.random.Generator(PCG64) 的随机源，接口与 random 模块一致（randint 含上界）
+
+    seed 与派生键（如帧号、图片序号）相同则随机序列相同；向量化采样直接使用 .generator。
+    每帧一个实例，工作进程之间不共享随机数状态
+    """
+
+    def __init__(self, seed: Optional[int] = None, *spawn_key: int):
+        self.generator = make_generator(seed, *spawn_key)
+
+    def random(self) -> float:
+        return float(self.generator.random())
+
+    def uniform(self, a: float, b: float) -> float:
+        return float(self.generator.uniform(a, b))
+
+    def randint(self, a: int, b: int) -> int:
+        return int(self.generator.integers(a, b + 1))
+
+    def randrange(self, n: int) -> int:
+        return int(self.generator.integers(n))
+
+    def choice(self, seq):
+        return seq[int(self.generator.integers(len(seq)))]
+
+    def sample(self, population, k: int) -> list:
+        return [population[i] for i in self.generator.choice(len(population), k, replace=False)]
+
+
+def clip_polyline(points, width: int, height: int, margin: float = 0.0) -> List[np.ndarray]:
+    """Liang–Barsky 向量化裁剪：把折线裁到 [-margin, width-1+margin]×[-margin, height-1+margin]
+
+    所有线段一次性求出进入/离开参数 t0、t1，跨边界的线段保留画布内的部分，
+    返回画布内连续的折线段列表，每段为 (k, 2) 的float数组
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) < 2:
+        return []
+
+    start = points[:-1]
+    delta = np.diff(points, axis=0)
+    # 左、上、右、下四条边：p·t <= q
+    p = np.concatenate([-delta, delta], axis=1)
+    q = np.concatenate([start + margin, [width - 1 + margin, height - 1 + margin] - start], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = q / p
+    t0 = np.max(np.where(p < 0, ratio, 0.0), axis=1)
+    t1 = np.min(np.where(p > 0, ratio, 1.0), axis=1)
+    visible = (t0 <= t1) & ~np.any((p == 0) & (q < 0), axis=1)
+
+    # 上一段完整走到终点、这一段从起点开始时两段首尾相连，否则另起一条折线
+    joined = np.zeros_like(visible)
+    joined[1:] = visible[1:] & visible[:-1] & (t1[:-1] >= 1) & (t0[1:] <= 0)
+    index = np.flatnonzero(visible)
+    if index.size == 0:
+        return []
+    opens = ~joined[index]
+
+    ends = np.stack([start[index] + t0[index, None] * delta[index],
+                     start[index] + t1[index, None] * delta[index]], axis=1).reshape(-1, 2)
+    keep = np.stack([opens, np.ones_like(opens)], axis=1).ravel()
+    breaks = (np.cumsum(keep) - 1)[0::2][opens]
+    return np.split(ends[keep], breaks[1:])
+
+
+class CoordinateFieldCache:
+    """坐标场缓存 - 按(宽, 高, 方向)缓存归一化的float32标量场（进程内LRU）"""
+
+    # 按字节数限制缓存大小，1080p全尺寸标量场约8MB
+    MAX_BYTES = 256 * 1024 * 1024
+
+    _FIELDS = OrderedDict()
+    _CACHE_LOCK = threading.Lock()
+    _bytes = 0
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def get(cls, w: int, h: int, direction: str) -> Tuple[np.ndarray, ...]:
+        """获取只读标量场，未命中时构建并加入缓存"""
+        return cls._lookup((w, h, direction), lambda: cls._build_fields(w, h, direction))
+
+    @classmethod
+    def get_indices(cls, w: int, h: int, direction: str, lut_size: int) -> np.ndarray:
+        """获取量化为查找表下标的只读索引场，方向必须是单一标量场"""
+        return cls._lookup((w, h, direction, lut_size),
+                           lambda: (cls.quantize(cls._build_fields(w, h, direction)[0], lut_size),))[0]
+
+    @staticmethod
+    def quantize(t: np.ndarray, lut_size: int) -> np.ndarray:
+        """[0, 1] 标量场量化为查找表下标；表长不超过65536时用uint16，4K整帧约16MB（intp的1/4）"""
+        dtype = np.uint16 if lut_size <= 1 << 16 else np.intp
+        return np.rint(t * (lut_size - 1)).astype(dtype)
+
+    @classmethod
+    def _lookup(cls, key: tuple, build) -> Tuple[np.ndarray, ...]:
+        with cls._CACHE_LOCK:
+            fields = cls._FIELDS.get(key)
+            if fields is not None:
+                cls._FIELDS.move_to_end(key)
+                cls.hits += 1
+                return fields
+            cls.misses += 1
+
+        fields = build()
+        for field in fields:
+            field.setflags(write=False)
+
+        with cls._CACHE_LOCK:
+            if key not in cls._FIELDS:
+                cls._FIELDS[key] = fields
+                cls._bytes += sum(field.nbytes for field in fields)
+            # 淘汰最久未使用的条目，至少保留当前条目
+            while cls._bytes > cls.MAX_BYTES and len(cls._FIELDS) > 1:
+                _, evicted = cls._FIELDS.popitem(last=False)
+                cls._bytes -= sum(field.nbytes for field in evicted)
+        return fields
+
+    @staticmethod
+    def get_band(w: int, h: int, direction: str, top: int, bottom: int) -> Tuple[np.ndarray, ...]:
+        """获取整帧标量场中 [top, bottom) 行的条带，不进入缓存（供分带渲染超大画布）"""
+        return CoordinateFieldCache._build_fields(w, h, direction, slice(top, bottom))
+
+    @staticmethod
+    def _build_fields(w: int, h: int, direction: str, rows: slice = slice(None)) -> Tuple[np.ndarray, ...]:
+        """构建[0, 1]内的float32标量场，只用一行x和一列y广播，不生成meshgrid
+
+        能分离的方向（水平、垂直、波浪）只保存一行/一列；rows 选取整帧中的部分行
+        """
+        if direction == 'horizontal':
+            return (np.linspace(0, 1, w, dtype=np.float32)[None, :],)
+
+        elif direction == 'vertical':
+            return (np.linspace(0, 1, h, dtype=np.float32)[rows, None],)
+
+        elif direction == 'wave_horizontal':
+            wave = np.sin(np.linspace(0, 6 * np.pi, w, dtype=np.float32))  # 3个波峰
+            return (wave[None, :] * np.float32(0.5) + np.float32(0.5),)
+
+        elif direction == 'wave_vertical':
+            wave = np.sin(np.linspace(0, 6 * np.pi, h, dtype=np.float32)[rows])
+            return (wave[:, None] * np.float32(0.5) + np.float32(0.5),)
+
+        elif direction == 'diagonal':
+            x = np.linspace(0, 0.5, w, dtype=np.float32)
+            y = np.linspace(0, 0.5, h, dtype=np.float32)[rows]
+            return (y[:, None] + x[None, :],)
+
+        elif direction == 'diagonal_reverse':  # 右上到左下
+            x = np.linspace(0.5, 0, w, dtype=np.float32)
+            y = np.linspace(0, 0.5, h, dtype=np.float32)[rows]
+            return (y[:, None] + x[None, :],)
+
+        elif direction == 'four_corner':  # 双线性插值只需要x行和y列
+            return (np.linspace(0, 1, w, dtype=np.float32)[None, :],
+                    np.linspace(0, 1, h, dtype=np.float32)[rows, None])
+
+        # 其余方向以画面中心为原点，坐标范围[-1, 1]
+        x = np.linspace(-1, 1, w, dtype=np.float32)[None, :]
+        y = np.linspace(-1, 1, h, dtype=np.float32)[rows, None]
+
+        if direction == 'radial_square':  # 切比雪夫距离，方形等值线
+            t = np.maximum(np.abs(x), np.abs(y))
+
+        elif direction == 'diamond':  # 曼哈顿距离，菱形等值线
+            t = np.abs(x) + np.abs(y)
+            t *= np.float32(0.5)
+
+        elif direction == 'cross':  # 到中心十字线的距离
+            t = np.minimum(np.abs(x), np.abs(y))
+
+        elif direction == 'radial_ellipse':
+            t = x * x + 2 * (y * y)
+            np.sqrt(t, out=t)
+            t *= np.float32(1 / np.sqrt(3))
+
+        elif direction == 'triangle':  # 顶点朝上的三角形等值线
+            t = np.maximum(y, (np.float32(np.sqrt(3)) * np.abs(x) - y) * np.float32(0.5))
+            t *= np.float32(1 / (0.5 + np.sqrt(3) / 2))
+
+        elif direction == 'multi_radial':  # 两个径向中心取较近者，先比较平方距离再开方
+            half = np.float32(0.5)
+            t = np.square(x + half) + np.square(y + half)
+            np.minimum(t, np.square(x - half) + np.square(y - half), out=t)
+            np.sqrt(t, out=t)
+            t *= np.float32(0.7071067811865476)
+
+        elif direction == 'conic':  # 绕中心的极角
+            t = np.arctan2(y, x)
+            t += np.float32(np.pi)
+            t *= np.float32(0.5 / np.pi)
+
+        elif direction == 'spiral':  # 极角随半径旋转，两圈螺旋
+            r = x * x + y * y
+            np.sqrt(r, out=r)
+            t = np.arctan2(y, x)
+            t += np.float32(4 * np.pi) * r
+            np.cos(t, out=t)
+            t *= np.float32(-0.5)
+            t += np.float32(0.5)
+
+        else:  # radial - 平方项各只算一行/一列再广播相加
+            t = x * x + y * y
+            np.sqrt(t, out=t)
+            t *= np.float32(0.7071067811865476)  # 1/sqrt(2) 预计算
+
+        np.clip(t, 0, 1, out=t)
+        return (t,)
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """返回缓存命中统计"""
+        with cls._CACHE_LOCK:
+            return {'hits': cls.hits, 'misses': cls.misses,
+                    'entries': len(cls._FIELDS), 'bytes': cls._bytes}
+
+    @classmethod
+    def clear(cls):
+        """清空缓存和计数器"""
+        with cls._CACHE_LOCK:
+            cls._FIELDS.clear()
+            cls._bytes = 0
+            cls.hits = 0
+            cls.misses = 0
+
+
+class GradientLUT:
+    """多色标渐变查找表 - 把任意色标列表预计算成 size×3 的颜色表，逐像素只剩一次查表"""
+
+    def __init__(self, stops: List[np.ndarray], positions: List[float] = None, size: int = 1024):
+        stops = np.asarray(stops, dtype=np.float32).reshape(-1, 3)
+        if positions is None:
+            positions = np.linspace(0, 1, len(stops))
+
+        t = np.linspace(0, 1, size)
+        table = np.empty((size, 3), dtype=np.float32)
+        for k in range(3):
+            table[:, k] = np.interp(t, positions, stops[:, k])
+
+        self.size = size
+        self.table = np.clip(table, 0, 255)
+        self.table_u8 = np.rint(self.table).astype(np.uint8)
+
+    def table_for(self, dtype) -> np.ndarray:
+        """按输出类型选择查找表"""
+        if np.dtype(dtype) == np.uint8:
+            return self.table_u8
+        return self.table.astype(dtype, copy=False)
+
+    def fill(self, out: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """按下标场查表写入 (h, w, 3) 的 out（uint8或float32）；可分离场只查一行/一列，再按通道广播"""
+        h, w = out.shape[:2]
+        table = self.table_for(out.dtype)
+        if indices.size < w * h:
+            line = np.take(table, indices, axis=0)
+            for k in range(3):
+                out[:, :, k] = line[:, :, k]
+        else:
+            np.take(table, indices, axis=0, out=out)
+        return out
+
+
+class PNGStreamWriter:
+    """流式PNG写入器 - 按行带追加IDAT块，整幅图像不需要驻留内存"""
+
+    SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+    def __init__(self, filepath: str, width: int, height: int, compress_level: int = 1):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(filepath, 'wb')
+        self._compressor = zlib.compressobj(compress_level)
+        self._file.write(self.SIGNATURE)
+        # 8位RGB，无隔行
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _write_chunk(self, tag: bytes, data: bytes):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(tag)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xffffffff))
+
+    def write_rows(self, rows: np.ndarray):
+        """写入 (n, width, 3) 的uint8行，每行前加过滤字节0（None）"""
+        n = rows.shape[0]
+        if self.rows_written + n > self.height:
+            raise ValueError(f"写入行数超出图像高度: {self.rows_written + n} > {self.height}")
+        scanlines = np.zeros((n, 1 + self.width * 3), dtype=np.uint8)
+        scanlines[:, 1:] = rows.reshape(n, -1)
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._write_chunk(b'IDAT', data)
+        self.rows_written += n
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"写入行数不完整: {self.rows_written} / {self.height}")
+            self._write_chunk(b'IDAT', self._compressor.flush())
+            self._write_chunk(b'IEND', b'')
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+class DrawRecorder:
+    """绘制记录器 - 代替ImageDraw接收ellipse/line/polygon调用，按行带裁剪后重放"""
+
+    def __init__(self):
+        self.calls = []
+
+    @staticmethod
+    def _flatten(xy) -> List[float]:
+        coords = []
+        for item in xy:
+            if isinstance(item, (tuple, list)):
+                coords.extend(item)
+            else:
+                coords.append(item)
+        return coords
+
+    def _record(self, method: str, xy, kwargs: dict):
+        ys = self._flatten(xy)[1::2]
+        pad = kwargs.get('width', 1)
+        self.calls.append((method, xy, kwargs, min(ys) - pad, max(ys) + pad))
+
+    def ellipse(self, xy, **kwargs):
+        self._record('ellipse', xy, kwargs)
+
+    def line(self, xy, **kwargs):
+        self._record('line', xy, kwargs)
+
+    def polygon(self, xy, **kwargs):
+        self._record('polygon', xy, kwargs)
+
+    def replay(self, draw: ImageDraw.Draw, top: int, bottom: int):
+        """只重放与 [top, bottom) 行相交的调用，坐标平移到条带内
+
+        Pillow 把浮点坐标向零取整，先在画布坐标上取整再平移，条带内的光栅化与整帧逐像素一致
+        """
+        for method, xy, kwargs, y0, y1 in self.calls:
+            if y1 < top or y0 >= bottom:
+                continue
+            coords = self._flatten(xy)
+            shifted = [int(c) - top if i % 2 else int(c) for i, c in enumerate(coords)]
+            getattr(draw, method)(shifted, **kwargs)
+
+
+class SpriteAtlas:
+    """粒子精灵图集 - 每种字形在每个尺寸下预先光栅化成alpha蒙版，进程内按十字线宽各构建一次
+
+    合成时按粒子的不透明度取缩放后的蒙版（按 (字形, 尺寸, alpha, 线宽) 缓存），
+    用 Image.paste(颜色, 位置, 蒙版) 着色混合，代替每个粒子若干次 line/ellipse 调用
+    """
+
+    KINDS = ('dot', 'star', 'cross', 'ring')
+    MAX_SIZE = 8
+
+    _MASKS: Dict[int, Dict[Tuple[int, int], np.ndarray]] = {}
+
+    @staticmethod
+    def rasterize(kind: str, size: int, cross_width: int = 1) -> np.ndarray:
+        """画出不透明度255的字形蒙版，尺寸 (2·size+3)²，中心位于 (size+1, size+1)，十字笔画宽 cross_width"""
+        center = size + 1
+        if kind == 'dot':
+            offsets = np.arange(-center, center + 1, dtype=np.float32)
+            coverage = np.clip(size + 0.5 - np.hypot(offsets[:, None], offsets[None, :]), 0, 1)
+            return np.rint(coverage * 255).astype(np.uint8)
+
+        mask = Image.new('L', (2 * center + 1, 2 * center + 1), 0)
+        draw = ImageDraw.Draw(mask)
+        if kind == 'star':
+            # 简单星形
+            for i in range(4):
+                angle = i * math.pi / 2
+                draw.line([(center, center), (center + size * math.cos(angle), center + size * math.sin(angle))],
+                          fill=255, width=1)
+        elif kind == 'cross':
+            draw.line([(center - size, center), (center + size, center)], fill=255, width=cross_width)
+            draw.line([(center, center - size), (center, center + size)], fill=255, width=cross_width)
+        elif kind == 'ring':
+            draw.ellipse([center - size, center - size, center + size, center + size], outline=255, width=1)
+        return np.asarray(mask)
+
+    @classmethod
+    def build(cls, cross_width: int = 1) -> Dict[Tuple[int, int], np.ndarray]:
+        """构建全部 (字形下标, 尺寸) 的蒙版"""
+        masks = cls._MASKS.get(cross_width)
+        if masks is None:
+            masks = cls._MASKS[cross_width] = {
+                (index, size): cls.rasterize(kind, size, cross_width).astype(np.float32)
+                for index, kind in enumerate(cls.KINDS) for size in range(1, cls.MAX_SIZE + 1)}
+        return masks
+
+    @classmethod
+    @lru_cache(maxsize=8192)
+    def get_mask(cls, kind: int, size: int, alpha: int, cross_width: int = 1) -> Image.Image:
+        """字形下标 kind、尺寸 size 的蒙版按 alpha/255 缩放后的 'L' 图像"""
+        return Image.fromarray(np.rint(cls.build(cross_width)[kind, size] * (alpha / 255.0)).astype(np.uint8), 'L')
+
+    @classmethod
+    def blit(cls, img: Image.Image, kinds, cx, cy, sizes, rgba, cross_width: int = 1,
+             fill_alpha: int = 255) -> Image.Image:
+        """把一批粒子按顺序原地混合到RGB/RGBA/L图像 img 上
+
+        kinds 为 KINDS 中的下标，sizes 截断到 1..MAX_SIZE，rgba 为 (n, 4)，每个粒子用自身颜色着色；
+        img 为RGBA时 alpha 通道按蒙版向 fill_alpha 混合（默认255，不透明背景保持不透明），
+        img 为'L'时视为覆盖率图层，按蒙版向255累加
+        """
+        sizes = np.clip(np.asarray(sizes, dtype=np.int64), 1, cls.MAX_SIZE)
+        rgba = np.clip(np.asarray(rgba, dtype=np.int64).reshape(-1, 4), 0, 255)
+        corners_x = (np.asarray(cx, dtype=np.int64) - sizes - 1).tolist()
+        corners_y = (np.asarray(cy, dtype=np.int64) - sizes - 1).tolist()
+        extra = (fill_alpha,) if img.mode == 'RGBA' else ()
+        coverage_only = img.mode == 'L'
+        paste = img.paste
+        get_mask = cls.get_mask
+        for kind, x, y, size, (red, green, blue, alpha) in zip(np.asarray(kinds).tolist(), corners_x, corners_y,
+                                                               sizes.tolist(), rgba.tolist()):
+            if alpha:
+                paste(255 if coverage_only else (red, green, blue) + extra, (x, y),
+                      get_mask(kind, size, alpha, cross_width))
+        return img
+
+
+class SplatLayer:
+    """抗锯齿圆形图元层 - 批量记录气泡/粒子，按包围盒一次性混合到背景上
+
+    每个 (半径, alpha) 缓存一张解析覆盖率蒙版 clip(r + 0.5 - d, 0, 1)·alpha，
+    合成时用 Image.paste(颜色, 包围盒, 蒙版) 在C层按包围盒做 alpha 混合，
+    既有抗锯齿边缘，重叠的半透明气泡也会逐层叠加（ImageDraw 在RGBA图层上是直接覆盖）。
+    粒子字形取自 SpriteAtlas，混合在全部圆形之上。
+    """
+
+    MAX_MASKS = 4096
+
+    _MASKS = OrderedDict()
+    _CACHE_LOCK = threading.Lock()
+
+    def __init__(self, width: int, height: int, cross_width: int = 1):
+        self.width = width
+        self.height = height
+        self.cross_width = cross_width  # 十字粒子的笔画宽度，见 SpriteAtlas
+        self._batches = []
+        self._sprites = []
+
+    def __len__(self) -> int:
+        return sum(len(batch[0]) for batch in self._batches + self._sprites)
+
+    def boxes(self, top: int = 0) -> Tuple[np.ndarray, ...]:
+        """所有圆和粒子的包围盒 (x0, y0, x1, y1)，含端点，纵坐标相对第 top 行"""
+        extents = [(cx, cy, radius) for cx, cy, radius, _ in self._batches]
+        extents += [(cx, cy, np.clip(sizes, 1, SpriteAtlas.MAX_SIZE) + 1) for _, cx, cy, sizes, _ in self._sprites]
+        if not extents:
+            return (np.empty(0, dtype=np.int64),) * 4
+        cx, cy, radius = (np.concatenate(column) for column in zip(*extents))
+        return cx - radius, cy - radius - top, cx + radius, cy + radius - top
+
+    def add_circles(self, cx, cy, radius, rgba):
+        """添加一批实心圆：圆心和整数半径为 (n,)，颜色为 (n, 4) 的 RGBA（alpha 0-255），按添加顺序绘制"""
+        cx = np.asarray(cx, dtype=np.int64).ravel()
+        cy = np.broadcast_to(np.asarray(cy, dtype=np.int64).ravel(), cx.shape)
+        radius = np.broadcast_to(np.maximum(np.asarray(radius, dtype=np.int64).ravel(), 0), cx.shape)
+        rgba = np.clip(np.asarray(rgba, dtype=np.int64).reshape(-1, 4), 0, 255)
+        self._batches.append((cx, cy, radius, rgba))
+
+    def add_sprites(self, kinds, cx, cy, sizes, rgba):
+        """添加一批粒子字形：kinds 为 SpriteAtlas.KINDS 中的下标，其余参数同 add_circles"""
+        self._sprites.append(tuple(np.asarray(values, dtype=np.int64).ravel()
+                                   for values in (kinds, cx, cy, sizes)) +
+                             (np.asarray(rgba, dtype=np.int64).reshape(-1, 4),))
+
+    @classmethod
+    def get_mask(cls, radius: int, alpha: int) -> Image.Image:
+        """半径 radius、不透明度 alpha 的 'L' 蒙版，尺寸 (2r+1)²，圆心位于中心像素"""
+        key = (radius, alpha)
+        with cls._CACHE_LOCK:
+            mask = cls._MASKS.get(key)
+            if mask is not None:
+                cls._MASKS.move_to_end(key)
+                return mask
+
+        offsets = np.arange(-radius, radius + 1, dtype=np.float32)
+        coverage = np.clip(radius + 0.5 - np.hypot(offsets[:, None], offsets[None, :]), 0, 1)
+        mask = Image.fromarray(np.rint(coverage * alpha).astype(np.uint8), 'L')
+
+        with cls._CACHE_LOCK:
+            cls._MASKS[key] = mask
+            while len(cls._MASKS) > cls.MAX_MASKS:
+                cls._MASKS.popitem(last=False)
+        return mask
+
+    def clear(self):
+        """清空已记录的图元"""
+        self._batches.clear()
+        self._sprites.clear()
+
+    def composite(self, img: Image.Image, top: int = 0, coverage: Image.Image = None) -> Image.Image:
+        """把图元原地混合到RGB图像 img 上，img 的第0行对应画布第 top 行（分带渲染时只画相交的图元）
+
+        coverage: 可选的'L'图像，给定时 img 视为预乘颜色层，覆盖率同步累加到 coverage 上
+        """
+        bottom = top + img.height
+        for cx, cy, radius, rgba in self._batches:
+            visible = np.flatnonzero((cy + radius >= top) & (cy - radius < bottom) &
+                                     (cx + radius >= 0) & (cx - radius < self.width) & (rgba[:, 3] > 0))
+            paste = img.paste
+            get_mask = self.get_mask
+            for x, y, r, (red, green, blue, alpha) in zip((cx[visible] - radius[visible]).tolist(),
+                                                          (cy[visible] - radius[visible] - top).tolist(),
+                                                          radius[visible].tolist(), rgba[visible].tolist()):
+                mask = get_mask(r, alpha)
+                paste((red, green, blue), (x, y), mask)
+                if coverage is not None:
+                    coverage.paste(255, (x, y), mask)
+
+        for kinds, cx, cy, sizes, rgba in self._sprites:
+            extent = np.clip(sizes, 1, SpriteAtlas.MAX_SIZE) + 1
+            visible = np.flatnonzero((cy + extent >= top) & (cy - extent < bottom))
+            batch = (kinds[visible], cx[visible], cy[visible] - top, sizes[visible], rgba[visible])
+            SpriteAtlas.blit(img, *batch, cross_width=self.cross_width)
+            if coverage is not None:
+                SpriteAtlas.blit(coverage, *batch, cross_width=self.cross_width)
+        return img
+
+
+class FrameBufferArena:
+    """帧缓冲区池 - 每个工作进程(线程)跨帧复用暂存数组，稳态渲染几乎不再分配大块内存"""
+
+    _LOCAL = threading.local()
+
+    def __init__(self):
+        self._buffers: Dict[str, np.ndarray] = {}
+        self._pid = os.getpid()
+
+    @classmethod
+    def current(cls) -> 'FrameBufferArena':
+        """获取当前线程的缓冲区池；fork出的子进程会重新创建，不沿用父进程的缓冲区"""
+        arena = getattr(cls._LOCAL, 'arena', None)
+        if arena is None or arena._pid != os.getpid():
+            arena = cls._LOCAL.arena = cls()
+        return arena
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        """按名称取暂存数组，只在容量不足时重新分配，内容未初始化"""
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        raw = self._buffers.get(name)
+        if raw is None or raw.nbytes < nbytes:
+            raw = self._buffers[name] = np.empty(nbytes, dtype=np.uint8)
+        return raw[:nbytes].view(dtype).reshape(shape)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(raw.nbytes for raw in self._buffers.values())
+
+    def release(self):
+        """释放所有暂存数组"""
+        self._buffers.clear()
+
+
+class NoiseBank:
+    """噪声纹理库 - 预生成可平铺的高斯噪声纹理，保存为 .npy 后各工作进程只读内存映射共享
+
+    每帧随机选择纹理、偏移、翻转和符号后平铺到画面上，不再逐帧采样整帧高斯噪声。
+    白噪声本身首尾相接，较粗的颗粒用环形盒式滤波生成，同样可以无缝平铺。
+    另有Perlin云层纹理（perlin_noise.PerlinNoise.tileable），三个通道相同，按同样方式平铺。
+    """
+
+    TILE = 512
+    VARIANTS = 4
+    GRAINS = (1, 2, 4)  # 噪声颗粒大小（像素）
+    CHUNK_ROWS = 32
+    VERSION = 1
+    DEFAULT_PATH = os.path.join(tempfile.gettempdir(), f"fast_bg_noise_bank_v{VERSION}.npy")
+    CLOUD_PATH = os.path.join(tempfile.gettempdir(), f"fast_bg_cloud_bank_v{VERSION}.npy")
+    CLOUD_PERIOD = 4  # 云层纹理每边的格点数
+    CLOUD_OCTAVES = 6
+
+    # 每个进程按路径缓存内存映射，fork出的子进程直接沿用同一映射
+    _BANKS: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def build(cls, path: str = None, seed: int = None) -> str:
+        """生成 (颗粒数, 变体数, TILE, TILE, 3) 的float32单位方差纹理库，先写临时文件再原子替换"""
+        path = path or cls.DEFAULT_PATH
+        rng = np.random.default_rng(seed)
+        bank = np.empty((len(cls.GRAINS), cls.VARIANTS, cls.TILE, cls.TILE, 3), dtype=np.float32)
+        for level, grain in enumerate(cls.GRAINS):
+            textures = bank[level]
+            rng.standard_normal(dtype=np.float32, out=textures)
+            if grain > 1:
+                # 环形盒式滤波：沿行、列各累加 grain 个平移副本，边界回绕保证可平铺
+                for axis in (1, 2):
+                    smoothed = textures.copy()
+                    for shift in range(1, grain):
+                        smoothed += np.roll(textures, shift, axis=axis)
+                    textures[...] = smoothed
+                textures /= textures.std(axis=(1, 2, 3), keepdims=True)
+
+        return cls._save(bank, path)
+
+    @classmethod
+    def build_clouds(cls, path: str = None, seed: int = None) -> str:
+        """生成 (变体数, TILE, TILE, 3) 的float32零均值单位方差云层纹理，各变体用不同的 base
+
+        灰度云层预先展开成三个相同的通道，平铺时与高斯噪声走同一路径，避免逐像素广播
+        """
+        path = path or cls.CLOUD_PATH
+        perlin = PerlinNoise(seed)
+        clouds = np.stack([perlin.tileable(cls.TILE, cls.CLOUD_PERIOD, octaves=cls.CLOUD_OCTAVES, base=variant)
+                           for variant in range(cls.VARIANTS)])
+        clouds -= clouds.mean(axis=(1, 2), keepdims=True)
+        clouds /= clouds.std(axis=(1, 2), keepdims=True)
+        return cls._save(np.repeat(clouds[..., None], 3, axis=3), path)
+
+    @staticmethod
+    def _save(bank: np.ndarray, path: str) -> str:
+        """先写临时文件再原子替换，并发生成时读者不会读到半个文件"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, bank)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def _map(cls, path: str, expected: Tuple[int, ...], build) -> np.ndarray:
+        """只读内存映射纹理库，文件不存在或版本不符时先调用 build 生成"""
+        bank = cls._BANKS.get(path)
+        if bank is None:
+            if os.path.exists(path):
+                bank = np.load(path, mmap_mode='r')
+            if bank is None or bank.shape != expected or bank.dtype != np.float32:
+                build(path)
+                bank = np.load(path, mmap_mode='r')
+            bank = cls._BANKS[path] = bank
+        return bank
+
+    @classmethod
+    def load(cls, path: str = None) -> np.ndarray:
+        """只读内存映射高斯噪声纹理库"""
+        return cls._map(path or cls.DEFAULT_PATH,
+                        (len(cls.GRAINS), cls.VARIANTS, cls.TILE, cls.TILE, 3), cls.build)
+
+    @classmethod
+    def load_clouds(cls, path: str = None) -> np.ndarray:
+        """只读内存映射云层纹理库"""
+        return cls._map(path or cls.CLOUD_PATH, (cls.VARIANTS, cls.TILE, cls.TILE, 3), cls.build_clouds)
+
+    @staticmethod
+    def _spans(length: int, tile: int, offset: int) -> List[Tuple[int, int, int]]:
+        """把 [0, length) 切成 (目标起点, 纹理起点, 长度) 段，纹理从 offset 开始按 tile 回绕"""
+        spans = []
+        pos, src = 0, offset
+        while pos < length:
+            n = min(tile - src, length - pos)
+            spans.append((pos, src, n))
+            pos += n
+            src = 0
+        return spans
+
+    @classmethod
+    def add_noise(cls, out: np.ndarray, scale: float, rng: np.random.Generator, grain: int = 1,
+                  path: str = None) -> np.ndarray:
+        """把标准差为 scale 的纹理噪声平铺加到float32 (h, w, 3) 数组上"""
+        bank = cls.load(path)
+        texture = bank[cls.GRAINS.index(grain), rng.integers(cls.VARIANTS)]
+        if rng.random() < 0.5:
+            texture = texture[::-1]
+        if rng.random() < 0.5:
+            texture = texture[:, ::-1]
+        if rng.random() < 0.5:
+            scale = -scale
+        offset_y, offset_x = rng.integers(cls.TILE, size=2)
+        return cls._tile_add(out, texture, scale, offset_y, offset_x)
+
+    @classmethod
+    def cloud_placement(cls, rng: np.random.Generator) -> Tuple[np.ndarray, int, int, bool]:
+        """为一帧随机选择云层纹理（含翻转）、偏移和符号，返回 (纹理, 行偏移, 列偏移, 是否取反)"""
+        texture = cls.load_clouds()[rng.integers(cls.VARIANTS)]
+        if rng.random() < 0.5:
+            texture = texture[::-1]
+        if rng.random() < 0.5:
+            texture = texture[:, ::-1]
+        negate = bool(rng.random() < 0.5)
+        offset_y, offset_x = rng.integers(cls.TILE, size=2)
+        return texture, int(offset_y), int(offset_x), negate
+
+    @classmethod
+    def add_clouds(cls, out: np.ndarray, scale: float, placement: Tuple[np.ndarray, int, int, bool],
+                   top: int = 0) -> np.ndarray:
+        """把标准差为 scale 的云层纹理平铺加到float32 (h, w, 3) 数组上
+
+        out 是整帧从第 top 行开始的一段；同一帧的各条带共用一个 placement，拼起来与整帧一致。
+        """
+        texture, offset_y, offset_x, negate = placement
+        return cls._tile_add(out, texture, -scale if negate else scale, (offset_y + top) % cls.TILE, offset_x)
+
+    @classmethod
+    def _tile_add(cls, out: np.ndarray, texture: np.ndarray, scale: float, offset_y: int,
+                  offset_x: int) -> np.ndarray:
+        """从 (offset_y, offset_x) 开始回绕平铺 (TILE, TILE, 3) 的 texture，乘 scale 后加到 out"""
+        h, w = out.shape[:2]
+        # 按 CHUNK_ROWS 行切块，缩放结果在缓存里就加到输出上
+        scratch = FrameBufferArena.current().get('noise_tile', (cls.CHUNK_ROWS, cls.TILE, 3))
+        scale = np.float32(scale)
+        for y, sy, n in cls._spans(h, cls.TILE, offset_y):
+            for x, sx, m in cls._spans(w, cls.TILE, offset_x):
+                for r in range(0, n, cls.CHUNK_ROWS):
+                    k = min(cls.CHUNK_ROWS, n - r)
+                    block = scratch[:k, :m]
+                    np.multiply(texture[sy + r:sy + r + k, sx:sx + m], scale, out=block)
+                    out[y + r:y + r + k, x:x + m] += block
+        return out
@@ -0,0 +1,187 @@
+"""向量化Perlin梯度噪声 - 各脚本和批量生成器共用的噪声引擎，参数与 noise.pnoise2 对应"""
+import numpy as np
+from functools import lru_cache
+from typing import Tuple
+
+
+# Ken Perlin 参考实现的置换表，seed为None时使用
+PERLIN_PERMUTATION = [
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140, 36, 103, 30, 69, 142,
+    8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203,
+    117, 35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165,
+    71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41,
+    55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89,
+    18, 169, 200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226, 250,
+    124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227, 47, 16, 58, 17, 182, 189,
+    28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9,
+    129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251, 34,
+    242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31,
+    181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114,
+    67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180
+]
+
+# 二维梯度方向（与 noise 库 GRAD3 的前两个分量一致，哈希取低4位）
+GRADIENTS_2D = np.array([
+    [1, 1], [-1, 1], [1, -1], [-1, -1], [1, 0], [-1, 0], [1, 0], [-1, 0],
+    [0, 1], [0, -1], [0, 1], [0, -1], [1, 0], [-1, 0], [0, -1], [0, 1]
+], dtype=np.float32)
+
+
+class PerlinNoise:
+    """向量化Perlin梯度噪声 - 每个八度一次算完整张网格，参数与 noise.pnoise2 对应
+
+    网格坐标是可分离的：x只依赖列、y只依赖行，格点哈希在同一格内不变，所以哈希和梯度
+    只在很小的 (格点行, 格点列) 表上查，再按列、按行展开；整张 (h, w) 上只剩点积和插值，
+    并且按行带计算，临时数组能留在缓存里。
+    """
+
+    BAND_ROWS = 64
+
+    def __init__(self, seed: int = None):
+        self.seed = seed
+        self.perm, self.grad_x, self.grad_y = self.get_tables(seed)
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def get_tables(seed: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """按种子缓存置换表和梯度表（只读），同一种子的多帧噪声不再重建"""
+        if seed is None:
+            perm = np.array(PERLIN_PERMUTATION, dtype=np.intp)
+        else:
+            perm = np.random.default_rng(seed).permutation(256).astype(np.intp)
+        # 后两级查表 perm[perm[k]] 与梯度表合并：按 (A + j) 的低8位直接取梯度分量
+        gradient_index = perm[perm] & 15
+        grad_x = GRADIENTS_2D[gradient_index, 0].copy()
+        grad_y = GRADIENTS_2D[gradient_index, 1].copy()
+        for table in (perm, grad_x, grad_y):
+            table.setflags(write=False)
+        return perm, grad_x, grad_y
+
+    @staticmethod
+    def _lattice(coords: np.ndarray, repeat: float):
+        """一维坐标的格点信息：去重后每格的下标 (i, i+1)（按 repeat 回绕）、每个坐标所在格、小数部分和缓和曲线"""
+        # 与 noise 库一致：i = floor(fmod(x, repeat))，i + 1 再按 repeat 截断回绕
+        frac = (coords - np.floor(coords)).astype(np.float32)
+        cells, inverse = np.unique(np.floor(np.fmod(coords, repeat)), return_inverse=True)
+        i1 = np.trunc(np.fmod(cells + 1, repeat))
+        fade = frac * frac * frac * (frac * (frac * 6 - 15) + 10)
+        return cells.astype(np.intp) & 255, i1.astype(np.intp) & 255, inverse.ravel(), frac, fade
+
+    def noise2_grid(self, xs: np.ndarray, ys: np.ndarray, repeatx: float = 1024, repeaty: float = 1024,
+                    base: int = 0, out: np.ndarray = None, amplitude: float = 1.0) -> np.ndarray:
+        """单个八度：在 xs (w,) 与 ys (h,) 张成的网格上求值，结果乘 amplitude 后累加到 out (h, w)
+
+        out为None时新建float32数组
+        """
+        perm, grad_x, grad_y = self.perm, self.grad_x, self.grad_y
+        xi0, xi1, cx, xf, u = self._lattice(xs, repeatx)
+        yi0, yi1, cy, yf, v = self._lattice(ys, repeaty)
+        h, w = len(ys), len(xs)
+        if out is None:
+            out = np.zeros((h, w), dtype=np.float32)
+
+        # 与 noise 库相同的三级哈希 perm[perm[perm[i] + j]]，base 平移格点
+        a = perm[(xi0 + base) & 255][None, :]
+        b = perm[(xi1 + base) & 255][None, :]
+        j0 = (yi0 + base)[:, None]
+        j1 = (yi1 + base)[:, None]
+
+        def corner_tables(hx, row, dx):
+            """每个格点行一行：梯度x分量预乘dx，梯度y分量展开到列，形状 (格点行数, w)"""
+            hashed = (hx + row) & 255
+            return np.take(grad_x[hashed], cx, axis=1) * dx, np.take(grad_y[hashed], cx, axis=1)
+
+        xf1 = xf - 1
+        c00, c10 = corner_tables(a, j0, xf), corner_tables(b, j0, xf1)
+        c01, c11 = corner_tables(a, j1, xf), corner_tables(b, j1, xf1)
+
+        band_rows = min(self.BAND_ROWS, h)
+        n0 = np.empty((band_rows, w), dtype=np.float32)
+        n1 = np.empty_like(n0)
+        tmp = np.empty_like(n0)
+        for top in range(0, h, band_rows):
+            rows = cy[top:top + band_rows]
+            k = len(rows)
+            dy0 = yf[top:top + k, None]
+            dy1 = dy0 - 1
+
+            def corner(tables, dy, dst):
+                np.take(tables[1], rows, axis=0, out=dst[:k])
+                dst[:k] *= dy
+                dst[:k] += np.take(tables[0], rows, axis=0)
+
+            # 先沿x插值上下两条边，再沿y插值
+            corner(c00, dy0, n0)
+            corner(c10, dy0, tmp)
+            tmp[:k] -= n0[:k]
+            tmp[:k] *= u
+            n0[:k] += tmp[:k]
+            corner(c01, dy1, n1)
+            corner(c11, dy1, tmp)
+            tmp[:k] -= n1[:k]
+            tmp[:k] *= u
+            n1[:k] += tmp[:k]
+            n1[:k] -= n0[:k]
+            n1[:k] *= v[top:top + k, None]
+            n0[:k] += n1[:k]
+            if amplitude != 1.0:
+                n0[:k] *= np.float32(amplitude)
+            out[top:top + k] += n0[:k]
+        return out
+
+    def fractal(self, width: int, height: int, scale: float = 100.0, octaves: int = 1,
+                persistence: float = 0.5, lacunarity: float = 2.0, repeatx: float = 1024,
+                repeaty: float = 1024, base: int = 0, offset: Tuple[float, float] = (0, 0)) -> np.ndarray:
+        """分形噪声，等价于对每个像素调用 noise.pnoise2(x / scale, y / scale, ...)
+
+        每个八度频率乘 lacunarity、振幅乘 persistence、周期随频率放大，结果除以振幅和，
+        取值约在[-1, 1]（实际多在[-0.5, 0.5]）
+        """
+        # 坐标和频率都用float32，与 noise 库的单精度运算在格点边界上取整一致
+        xs = (np.arange(width, dtype=np.float32) + np.float32(offset[0])) / np.float32(scale)
+        ys = (np.arange(height, dtype=np.float32) + np.float32(offset[1])) / np.float32(scale)
+        return self.fractal_grid(xs, ys, octaves, persistence, lacunarity, repeatx, repeaty, base)
+
+    def fractal_grid(self, xs: np.ndarray, ys: np.ndarray, octaves: int = 1, persistence: float = 0.5,
+                     lacunarity: float = 2.0, repeatx: float = 1024, repeaty: float = 1024,
+                     base: int = 0) -> np.ndarray:
+        """在float32坐标 xs (w,) 与 ys (h,) 张成的网格上叠加 octaves 个八度，见 fractal"""
+        total = np.zeros((len(ys), len(xs)), dtype=np.float32)
+        frequency, amplitude, max_amplitude = np.float32(1.0), 1.0, 0.0
+        for _ in range(octaves):
+            self.noise2_grid(xs * frequency, ys * frequency, np.float32(repeatx) * frequency,
+                             np.float32(repeaty) * frequency, base, out=total, amplitude=amplitude)
+            max_amplitude += amplitude
+            frequency *= np.float32(lacunarity)
+            amplitude *= persistence
+
+        total *= np.float32(1.0 / max_amplitude)
+        return total
+
+    def tileable(self, size: int, period: int = 4, octaves: int = 4, persistence: float = 0.5,
+                 base: int = 0, height: int = None) -> np.ndarray:
+        """无缝平铺的 (height, size) 噪声（height默认等于size）：每个方向 period 个格点，
+
+        非正方形时格子沿两个方向分别拉伸；lacunarity固定为2保证各八度都能回绕
+        """
+        height = height or size
+        xs = np.arange(size, dtype=np.float32) / np.float32(size / period)
+        ys = np.arange(height, dtype=np.float32) / np.float32(height / period)
+        return self.fractal_grid(xs, ys, octaves, persistence, 2.0, period, period, base)
+
+
+def pnoise2_grid(width: int, height: int, scale: float = 100.0, octaves: int = 1, persistence: float = 0.5,
+                 lacunarity: float = 2.0, repeatx: float = 1024, repeaty: float = 1024, base: int = 0,
+                 seed: int = None) -> np.ndarray:
+    """整张网格的 pnoise2，参数与 noise.pnoise2 一致，另外可用 seed 打乱置换表"""
+    return PerlinNoise(seed).fractal(width, height, scale, octaves, persistence, lacunarity,
+                                     repeatx, repeaty, base)
+
+
+def noise_to_gray(values: np.ndarray, bias: float = 0.5) -> np.ndarray:
+    """噪声值映射为灰度RGB图像数组，gray = (val + bias) * 255"""
+    gray = values + np.float32(bias)
+    gray *= 255
+    np.clip(gray, 0, 255, out=gray)
+    gray = gray.astype(np.uint8)
+    return np.repeat(gray[:, :, None], 3, axis=2)
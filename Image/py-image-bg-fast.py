@@ -4,16 +4,25 @@ import random
 import os
 import math
 import json
+import io
 from typing import Dict, List, Tuple, Any, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 import colorsys
 import asyncio
 import concurrent.futures
 from functools import partial
 import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
 import time
 import threading
-from queue import Queue
+import sys
+import tempfile
+from queue import Queue, Empty
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from image_helpers import (CoordinateFieldCache, DrawRecorder, FrameBufferArena, GradientLUT, NoiseBank,
+                           PNGStreamWriter, SeededRandom, SplatLayer, clip_polyline, make_generator)
 
 
 @dataclass
@@ -25,9 +34,14 @@ class ImageConfig:
     color_scheme: str = 'pastel'
     noise_intensity: float = 0.01
     blur_radius: float = 0.8
-    effects: List[str] = None
+    max_blur_radius: float = 1.0  # 背景模糊半径上限，重模糊风格可调高并配合 box/downsample 后端
+    blur_backend: str = 'gaussian'  # gaussian/box/downsample，见 FrameCompositor.blur
+    effects: List[str] = None  # gradient/bubbles/curves/particles，bokeh 为数千个散景气泡
     element_density: float = 1.0
+    cloud_intensity: float = 0.0  # Perlin云层纹理强度（标准差占255的比例），0为关闭
     curve_types: List[str] = None
+    gradient_stops: int = 2  # 渐变色标数量，大于2时使用多色标查找表
+    seed: Optional[int] = None  # 随机种子，相同种子和帧号总是渲染出同一张图；None时每帧取系统熵
 
     def __post_init__(self):
         if self.effects is None:
@@ -63,8 +77,9 @@ class PerformanceMonitor:
 class ColorManager:
     """颜色管理器 - 优化版本"""
 
-    # 预计算的颜色池，避免每次都重新生成
+    # 预计算的颜色池，避免每次都重新生成；固定种子保证各进程的颜色池一致
     _COLOR_POOL_CACHE = None
+    POOL_SEED = 2024
     _CACHE_LOCK = threading.Lock()
 
     BASE_COLORS = [
@@ -86,7 +101,8 @@ class ColorManager:
         num_random_colors = len(cls.BASE_COLORS) * 2
 
         # 向量化生成随机RGB值
-        rgb_values = np.random.randint(180, 256, (num_random_colors, 3))
+        rng = make_generator(cls.POOL_SEED)
+        rgb_values = rng.integers(180, 256, (num_random_colors, 3))
 
         # 向量化调整颜色饱和度
         for rgb in rgb_values:
@@ -94,27 +110,35 @@ class ColorManager:
             min_val = np.min(rgb)
             if max_val - min_val > 60:
                 avg = np.mean(rgb)
-                rgb[:] = np.clip(np.random.randint(max(180, avg - 30), min(255, avg + 30), 3), 180, 255)
+                rgb[:] = np.clip(rng.integers(max(180, avg - 30), min(255, avg + 30), 3), 180, 255)
             color_pool.append(rgb.astype(np.uint8))
 
         return color_pool
 
     @classmethod
-    def get_gradient_colors(cls, count: int = 4) -> List[np.ndarray]:
+    def get_gradient_colors(cls, count: int = 4, rng: SeededRandom = None) -> List[np.ndarray]:
         """获取渐变颜色，使用缓存提高性能"""
         with cls._CACHE_LOCK:
             if cls._COLOR_POOL_CACHE is None:
                 cls._COLOR_POOL_CACHE = cls._generate_color_pool()
 
-        return random.sample(cls._COLOR_POOL_CACHE, count)
+        return (rng or SeededRandom()).sample(cls._COLOR_POOL_CACHE, count)
 
     @classmethod
-    def random_color_rgba(cls, alpha_range: Tuple[int, int] = (10, 50)) -> Tuple[int, int, int, int]:
+    def random_color_rgba(cls, alpha_range: Tuple[int, int] = (10, 50),
+                          rng: SeededRandom = None) -> Tuple[int, int, int, int]:
         """生成随机RGBA颜色"""
         # 使用numpy一次性生成所有随机数
-        rgba = np.random.randint([100, 100, 100, alpha_range[0]],
-                                [256, 256, 256, alpha_range[1] + 1])
-        return tuple(rgba)
+        rgba = (rng or SeededRandom()).generator.integers([100, 100, 100, alpha_range[0]],
+                                                          [256, 256, 256, alpha_range[1] + 1])
+        return tuple(rgba.tolist())
+
+    @classmethod
+    def random_colors_rgba(cls, count: int, alpha_range: Tuple[int, int] = (10, 50),
+                           rng: SeededRandom = None) -> np.ndarray:
+        """一次生成 count 个随机RGBA颜色，返回 (count, 4) 的int64数组"""
+        return (rng or SeededRandom()).generator.integers([100, 100, 100, alpha_range[0]],
+                                                          [256, 256, 256, alpha_range[1] + 1], (count, 4))
 
 
 class FastGradientGenerator:
@@ -126,14 +150,29 @@ class FastGradientGenerator:
         'spiral', 'diamond', 'cross', 'triangle', 'four_corner', 'multi_radial', 'conic'
     ]
 
+    # 单一标量场的方向，可用于两色混合和多色标查表（四角渐变需要两个场）
+    _SCALAR_DIRECTIONS = tuple(d for d in DIRECTIONS if d != 'four_corner')
+
     @staticmethod
-    def get_random_direction():
+    def get_random_direction(rng: SeededRandom = None):
         """随机选择渐变方向"""
-        return random.choice(FastGradientGenerator.DIRECTIONS)
+        return (rng or SeededRandom()).choice(FastGradientGenerator.DIRECTIONS)
 
     @staticmethod
     def create_gradient_vectorized(w: int, h: int, colors: List[np.ndarray], direction: str = None) -> np.ndarray:
-        """向量化的渐变生成，大幅提升性能"""
+        """向量化的渐变生成，基于缓存的坐标场只做一次混合"""
+        gradient = np.empty((h, w, 3), dtype=np.float32)
+        FastGradientGenerator.fill_gradient(gradient, colors, direction)
+        return gradient.astype(np.uint8)
+
+    @staticmethod
+    def fill_gradient(out: np.ndarray, colors: List[np.ndarray], direction: str = None,
+                      fields: Tuple[np.ndarray, ...] = None) -> np.ndarray:
+        """将float32渐变写入预分配的 (h, w, 3) 数组，取值已在[0, 255]内
+
+        fields: 可选的标量场（如 CoordinateFieldCache.get_band 的条带），为None时按out尺寸取缓存
+        """
+        h, w = out.shape[:2]
         if direction is None:
             direction = FastGradientGenerator.get_random_direction()
 
@@ -142,118 +181,141 @@ class FastGradientGenerator:
         if len(colors) < 4:
             colors = colors + colors[:4-len(colors)]
 
-        # 预分配输出数组
-        gradient = np.zeros((h, w, 3), dtype=np.float32)
-
-        if direction == 'horizontal':
-            # 水平渐变：向量化实现
-            x_weight = np.linspace(0, 1, w, dtype=np.float32)
-            gradient[:, :, :] = (colors[0][None, None, :] * (1 - x_weight[None, :, None]) +
-                               colors[1][None, None, :] * x_weight[None, :, None])
-
-        elif direction == 'vertical':
-            # 垂直渐变：向量化实现
-            y_weight = np.linspace(0, 1, h, dtype=np.float32)
-            gradient[:, :, :] = (colors[0][None, None, :] * (1 - y_weight[:, None, None]) +
-                               colors[1][None, None, :] * y_weight[:, None, None])
-
-        elif direction == 'diagonal':
-            # 对角线渐变：优化的meshgrid
-            x = np.linspace(0, 1, w, dtype=np.float32)
-            y = np.linspace(0, 1, h, dtype=np.float32)
-            X, Y = np.meshgrid(x, y, indexing='xy')
-            t = (X + Y) * 0.5
-            gradient = (colors[0][None, None, :] * (1 - t[:, :, None]) +
-                       colors[1][None, None, :] * t[:, :, None])
-
-        elif direction == 'radial':
-            # 径向渐变：优化计算
-            x = np.linspace(-1, 1, w, dtype=np.float32)
-            y = np.linspace(-1, 1, h, dtype=np.float32)
-            X, Y = np.meshgrid(x, y, indexing='xy')
-            distance = np.sqrt(X ** 2 + Y ** 2)
-            distance = np.clip(distance * 0.7071067811865476, 0, 1)  # 1/sqrt(2) 预计算
-            gradient = (colors[0][None, None, :] * (1 - distance[:, :, None]) +
-                       colors[1][None, None, :] * distance[:, :, None])
-
-        else:  # four_corner - 默认四角渐变
-            top_left, top_right, bottom_left, bottom_right = colors[:4]
-            x = np.linspace(0, 1, w, dtype=np.float32)
-            y = np.linspace(0, 1, h, dtype=np.float32)
-            X, Y = np.meshgrid(x, y, indexing='xy')
-
-            # 双线性插值 - 向量化实现
-            top = (top_left[None, None, :] * (1 - X[:, :, None]) +
-                   top_right[None, None, :] * X[:, :, None])
-            bottom = (bottom_left[None, None, :] * (1 - X[:, :, None]) +
-                     bottom_right[None, None, :] * X[:, :, None])
-            gradient = top * (1 - Y[:, :, None]) + bottom * Y[:, :, None]
-
-        return np.clip(gradient, 0, 255).astype(np.uint8)
+        if direction not in FastGradientGenerator.DIRECTIONS:
+            direction = 'four_corner'
+        if fields is None:
+            fields = CoordinateFieldCache.get(w, h, direction)
+        c = [np.asarray(color, dtype=np.float32) for color in colors[:4]]
+
+        if len(fields) == 1:
+            # 两色混合：gradient = c0 + (c1 - c0) * t，两色时直接混合比查表更快
+            t = fields[0]
+            delta = c[1] - c[0]
+            # 按通道写入，避免长度为3的内层循环；可分离场只在一行/一列上计算后广播
+            for k in range(3):
+                if t.size < w * h:
+                    out[:, :, k] = c[0][k] + delta[k] * t
+                else:
+                    np.multiply(t, delta[k], out=out[:, :, k])
+                    out[:, :, k] += c[0][k]
+
+        else:  # four_corner - 双线性插值，先在行/列上混合再广播
+            x, y = fields
+            top = c[0] + (c[1] - c[0]) * x[:, :, None]
+            bottom = c[2] + (c[3] - c[2]) * x[:, :, None]
+            np.multiply(y[:, :, None], bottom - top, out=out)
+            out += top
+
+        return out
+
+    @staticmethod
+    def fill_gradient_lut(out: np.ndarray, lut: GradientLUT, direction: str = None,
+                          indices: np.ndarray = None) -> np.ndarray:
+        """沿方向的标量场查表生成N色标渐变，out可以是uint8或float32的 (h, w, 3) 数组
+
+        indices: 可选的预计算下标场（如条带下标），为None时按out尺寸取缓存
+        """
+        h, w = out.shape[:2]
+        if direction is None:
+            direction = FastGradientGenerator.get_random_direction()
+        # 多色标需要单一标量场，四角渐变和未知方向退化为对角线
+        if direction not in FastGradientGenerator._SCALAR_DIRECTIONS:
+            direction = 'diagonal'
+
+        if indices is None:
+            indices = CoordinateFieldCache.get_indices(w, h, direction, lut.size)
+        return lut.fill(out, indices)
+
+
+    @staticmethod
+    def create_gradient_batch(w: int, h: int, colors_list: List[List[np.ndarray]],
+                              directions: List[str]) -> np.ndarray:
+        """批量生成 (N, h, w, 3) 的uint8渐变，按方向分组，同组连续使用同一份缓存坐标场
+
+        单帧混合已经受内存带宽限制，把N帧堆成一个大数组计算反而产生更多临时数组，
+        所以组内逐帧写入同一个float32暂存区再转换到输出槽位。
+        """
+        batch = np.empty((len(colors_list), h, w, 3), dtype=np.uint8)
+
+        groups: Dict[str, List[int]] = {}
+        for i, direction in enumerate(directions):
+            if direction not in FastGradientGenerator.DIRECTIONS:
+                direction = 'four_corner'
+            groups.setdefault(direction, []).append(i)
+
+        scratch = np.empty((h, w, 3), dtype=np.float32)
+        for direction, indices in groups.items():
+            for i in indices:
+                FastGradientGenerator.fill_gradient(scratch, colors_list[i], direction)
+                np.copyto(batch[i], scratch, casting='unsafe')
+
+        return batch
 
 
 class FastElementDrawer:
-    """快速元素绘制器 - 减少绘制数量，提高性能"""
+    """快速元素绘制器 - 减少绘制数量，提高性能
+
+    气泡和粒子写入 splats（SplatLayer）批量光栅化，曲线仍交给 draw 逐条绘制
+    """
 
-    def __init__(self, draw: ImageDraw.Draw, width: int, height: int):
+    def __init__(self, draw: ImageDraw.Draw, width: int, height: int, rng: SeededRandom = None):
         self.draw = draw
         self.width = width
         self.height = height
+        self.rng = rng or SeededRandom()
+        self.splats = SplatLayer(width, height)
 
-    def add_bubbles_fast(self, count: int = 8):  # 减少数量
-        """快速添加气泡效果"""
+    def add_bubbles_fast(self, count: int = 8, radius_range: Tuple[int, int] = (15, 40),
+                         alpha_range: Tuple[int, int] = (20, 50)):
+        """快速添加气泡效果，一半气泡带左上方高光"""
         # 批量生成位置和属性
-        positions = np.random.randint([0, 0], [self.width, self.height], (count, 2))
-        radii = np.random.randint(15, 40, count)  # 减小尺寸范围
-        alphas = np.random.randint(20, 50, count)
-
-        for i in range(count):
-            x, y = positions[i]
-            radius = radii[i]
-            alpha = alphas[i]
-
-            bubble_color = ColorManager.random_color_rgba((alpha, alpha + 15))
-            self.draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=bubble_color)
-
-            # 简化高光效果
-            if random.random() > 0.5:  # 只有50%的气泡有高光
-                highlight_radius = radius // 4
-                highlight_x = x - radius // 4
-                highlight_y = y - radius // 4
-                highlight_color = (255, 255, 255, min(255, alpha + 20))
-                self.draw.ellipse([
-                    highlight_x - highlight_radius, highlight_y - highlight_radius,
-                    highlight_x + highlight_radius, highlight_y + highlight_radius
-                ], fill=highlight_color)
+        generator = self.rng.generator
+        positions = generator.integers([0, 0], [self.width, self.height], (count, 2))
+        radii = generator.integers(*radius_range, count)
+        alphas = generator.integers(*alpha_range, count)
+
+        colors = ColorManager.random_colors_rgba(count, (0, 15), self.rng)
+        colors[:, 3] += alphas
+        self.splats.add_circles(positions[:, 0], positions[:, 1], radii, colors)
+
+        # 简化高光效果，只有50%的气泡有高光
+        lit = generator.random(count) > 0.5
+        offsets = radii[lit] // 4
+        highlights = np.full((offsets.size, 4), 255)
+        highlights[:, 3] = np.minimum(255, alphas[lit] + 20)
+        self.splats.add_circles(positions[lit, 0] - offsets, positions[lit, 1] - offsets, offsets, highlights)
+
+    def add_bokeh_fast(self, count: int = 5000):
+        """密集的散景气泡：数千个小而淡的气泡"""
+        self.add_bubbles_fast(count, radius_range=(3, 18), alpha_range=(8, 30))
 
     def add_curves_fast(self, count: int = 4):  # 减少数量
         """快速添加简化的曲线"""
         curve_types = ['sine', 'spiral']  # 只使用计算量小的曲线类型
 
         for _ in range(count):
-            curve_type = random.choice(curve_types)
-            color = ColorManager.random_color_rgba((25, 50))
+            curve_type = self.rng.choice(curve_types)
+            color = ColorManager.random_color_rgba((25, 50), self.rng)
 
             if curve_type == 'sine':
                 # 简化的正弦波
-                start_x = random.randint(0, self.width // 2)
-                start_y = random.randint(0, self.height)
-                length = random.randint(200, 400)
-                amplitude = random.randint(30, 60)
+                start_x = self.rng.randint(0, self.width // 2)
+                start_y = self.rng.randint(0, self.height)
+                length = self.rng.randint(200, 400)
+                amplitude = self.rng.randint(30, 60)
 
                 # 减少点数
                 num_points = 20
                 x = np.linspace(start_x, start_x + length, num_points)
                 y = start_y + amplitude * np.sin(np.linspace(0, 4 * np.pi, num_points))
 
-                points = list(zip(x.astype(int), y.astype(int)))
-                self._draw_polyline_fast(points, color)
+                self._draw_polyline_fast(np.column_stack([x, y]), color)
 
             elif curve_type == 'spiral':
                 # 简化的螺旋
-                center_x = random.randint(100, self.width - 100)
-                center_y = random.randint(100, self.height - 100)
-                max_radius = random.randint(40, 80)
+                center_x = self.rng.randint(100, self.width - 100)
+                center_y = self.rng.randint(100, self.height - 100)
+                max_radius = self.rng.randint(40, 80)
 
                 # 减少点数
                 num_points = 25
@@ -262,76 +324,567 @@ class FastElementDrawer:
                 x = center_x + r * np.cos(t)
                 y = center_y + r * np.sin(t)
 
-                points = list(zip(x.astype(int), y.astype(int)))
-                self._draw_polyline_fast(points, color)
+                self._draw_polyline_fast(np.column_stack([x, y]), color)
 
-    def _draw_polyline_fast(self, points, color):
-        """快速绘制多段线"""
-        valid_points = [(x, y) for x, y in points if 0 <= x < self.width and 0 <= y < self.height]
-        if len(valid_points) > 1:
-            for i in range(len(valid_points) - 1):
-                self.draw.line([valid_points[i], valid_points[i + 1]], fill=color, width=2)
+    def _draw_polyline_fast(self, points, color, width: int = 2):
+        """快速绘制多段线：裁剪后每条可见折线一次 draw.line 调用"""
+        for run in clip_polyline(points, self.width, self.height, width / 2):
+            self.draw.line(run.ravel().tolist(), fill=color, width=width, joint='curve')
 
-    def add_particles_fast(self, count: int = 25):  # 减少数量
-        """快速添加粒子效果"""
+    def add_particles_fast(self, count: int = 25):
+        """快速添加粒子效果（圆点）"""
         # 批量生成属性
-        positions = np.random.randint([0, 0], [self.width, self.height], (count, 2))
-        sizes = np.random.randint(2, 6, count)
+        positions = self.rng.generator.integers([0, 0], [self.width, self.height], (count, 2))
+        sizes = self.rng.generator.integers(2, 6, count)
+        colors = ColorManager.random_colors_rgba(count, (30, 70), self.rng)
+        self.splats.add_circles(positions[:, 0], positions[:, 1], sizes, colors)
+
+
+class DirtyTiles:
+    """脏瓦片表 - 按 TILE×TILE 网格记录绘制触及的区域，合成时只处理被标记的瓦片
+
+    跨度不超过相邻两格的小包围盒（粒子、折线短段）用四个角点批量标记，大包围盒逐个按切片标记；
+    rects 把标记合并成少量矩形：同一行相邻瓦片合成一段，上下各行相同的段再合成一个矩形；
+    标记比例超过 DENSE 时逐块处理反而更慢，直接返回一个外接矩形。
+    """
+
+    TILE = 64
+    DENSE = 0.5
+
+    def __init__(self, width: int, height: int, tile: int = TILE):
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.grid = np.zeros((-(-height // tile), -(-width // tile)), dtype=bool)
+
+    def __bool__(self) -> bool:
+        return bool(self.grid.any())
+
+    @property
+    def fraction(self) -> float:
+        """被标记瓦片占全部瓦片的比例"""
+        return float(self.grid.mean()) if self.grid.size else 0.0
+
+    def mark(self, x0, y0, x1, y1):
+        """标记包围盒 [x0, x1]×[y0, y1]（像素坐标，含端点，可为等长数组）触及的瓦片，画布外的部分忽略"""
+        x0, y0, x1, y1 = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=np.float64))
+                                               for v in (x0, y0, x1, y1)))
+        visible = (x1 >= 0) & (x0 < self.width) & (y1 >= 0) & (y0 < self.height) & (x0 <= x1) & (y0 <= y1)
+        if not visible.any():
+            return
+        rows, cols = self.grid.shape
+        tx0, tx1 = (np.clip(v[visible] // self.tile, 0, cols - 1).astype(np.intp) for v in (x0, x1))
+        ty0, ty1 = (np.clip(v[visible] // self.tile, 0, rows - 1).astype(np.intp) for v in (y0, y1))
+
+        small = (tx1 - tx0 <= 1) & (ty1 - ty0 <= 1)
+        for ty in (ty0[small], ty1[small]):
+            for tx in (tx0[small], tx1[small]):
+                self.grid[ty, tx] = True
+        for r0, r1, c0, c1 in zip(*(v[~small].tolist() for v in (ty0, ty1, tx0, tx1))):
+            self.grid[r0:r1 + 1, c0:c1 + 1] = True
+
+    def update(self, other: 'DirtyTiles'):
+        """并入另一张同尺寸脏瓦片表"""
+        self.grid |= other.grid
+
+    def rects(self) -> List[Tuple[int, int, int, int]]:
+        """被标记区域合并成的 (x0, y0, x1, y1) 像素矩形（右下开区间，已裁剪到画布内）"""
+        tile = self.tile
+        if self.fraction > self.DENSE:
+            rows, cols = np.flatnonzero(self.grid.any(axis=1)), np.flatnonzero(self.grid.any(axis=0))
+            return [(cols[0] * tile, rows[0] * tile,
+                     min((cols[-1] + 1) * tile, self.width), min((rows[-1] + 1) * tile, self.height))]
+        rects = []
+        open_runs: Dict[Tuple[int, int], int] = {}  # 列段 -> 起始瓦片行
+        for row in range(self.grid.shape[0] + 1):
+            runs = set()
+            if row < self.grid.shape[0]:
+                edges = np.flatnonzero(np.diff(np.concatenate(([0], self.grid[row].view(np.int8), [0]))))
+                runs = set(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+            for span in [span for span in open_runs if span not in runs]:
+                start = open_runs.pop(span)
+                rects.append((span[0] * tile, start * tile,
+                              min(span[1] * tile, self.width), min(row * tile, self.height)))
+            for span in runs:
+                open_runs.setdefault(span, row)
+        return rects
+
+    def clear(self):
+        self.grid[...] = False
+
+
+class DirtyDraw:
+    """ImageDraw 代理 - 转发 line/ellipse/rectangle/polygon 调用，同时把绘制范围记入 DirtyTiles
+
+    折线按每一小段的包围盒标记，斜穿画面的细曲线只标记沿途的瓦片。
+    """
+
+    def __init__(self, draw: ImageDraw.Draw, tiles: DirtyTiles):
+        self.draw = draw
+        self.tiles = tiles
+
+    @staticmethod
+    def _points(xy) -> np.ndarray:
+        return np.asarray(DrawRecorder._flatten(xy), dtype=np.float64).reshape(-1, 2)
+
+    def _mark_box(self, xy, pad: float):
+        points = self._points(xy)
+        (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+        self.tiles.mark(x0 - pad, y0 - pad, x1 + pad, y1 + pad)
+
+    def line(self, xy, **kwargs):
+        self.draw.line(xy, **kwargs)
+        points = self._points(xy)
+        pad = kwargs.get('width', 1) / 2 + 1  # 线宽一半，再留1像素给圆角连接
+        if len(points) == 1:
+            points = np.repeat(points, 2, axis=0)
+        start, end = points[:-1], points[1:]
+        low, high = np.minimum(start, end) - pad, np.maximum(start, end) + pad
+        self.tiles.mark(low[:, 0], low[:, 1], high[:, 0], high[:, 1])
+
+    def ellipse(self, xy, **kwargs):
+        self.draw.ellipse(xy, **kwargs)
+        self._mark_box(xy, kwargs.get('width', 1))
+
+    def rectangle(self, xy, **kwargs):
+        self.draw.rectangle(xy, **kwargs)
+        self._mark_box(xy, kwargs.get('width', 1))
+
+    def polygon(self, xy, **kwargs):
+        self.draw.polygon(xy, **kwargs)
+        self._mark_box(xy, kwargs.get('width', 1))
+
+
+class FrameCompositor:
+    """单帧合成管线 - 从第一层渐变到编码前只在一块float32工作帧上合成，最后只转换一次uint8
+
+    背景不透明，工作帧即预乘后的RGB（alpha恒为1）。气泡、曲线等图层先在C层累加到
+    预乘颜色'RGB'图像和覆盖率'L'图像上（两者的 paste 都是线性混合，恰好等于预乘 over），
+    再只在脏瓦片（dirty）覆盖的矩形内混合进工作帧：frame = color + frame·(1 - coverage)。
+    模糊同样在float32工作帧上分块完成，不再在RGB/RGBA之间来回转换。
+    各阶段耗时（秒）按名称累加在 timings 中。
+    """
+
+    CHUNK_ROWS = 32  # 分块模糊的行数
+    BLUR_BACKENDS = ('gaussian', 'box', 'downsample')
+    DOWNSAMPLE_MIN_SIGMA = 2.0  # downsample 后端从该半径起才缩小，更小的半径直接做高斯
+    BOX_MIN_SIGMA = 2.0  # box 后端从该半径起才用盒式核，更小的半径盒宽退化到3，直接做高斯
+
+    def __init__(self, frame: np.ndarray, timings: Dict[str, float] = None):
+        self.frame = frame
+        self.height, self.width = frame.shape[:2]
+        self.timings = OrderedDict() if timings is None else timings
+        self.dirty = DirtyTiles(self.width, self.height)  # 待合成图层触及的瓦片
+        self._color = None
+        self._coverage = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录一个阶段的耗时，同名阶段累加"""
+        start = time.perf_counter()
+        try:
+            yield self.frame
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def layer(self) -> Tuple[Image.Image, Image.Image]:
+        """待合成图层 (预乘颜色'RGB'图像, 覆盖率'L'图像)，首次使用时创建"""
+        if self._color is None:
+            size = (self.width, self.height)
+            self._color = Image.new('RGB', size, (0, 0, 0))
+            self._coverage = Image.new('L', size, 0)
+        return self._color, self._coverage
+
+    def add_splats(self, splats: SplatLayer, top: int = 0):
+        """把气泡/粒子图元混合到待合成图层上，工作帧第0行对应画布第 top 行"""
+        if len(splats):
+            color, coverage = self.layer()
+            splats.composite(color, top, coverage)
+            self.dirty.mark(*splats.boxes(top))
+
+    def add_overlay(self, overlay: Image.Image, tiles: DirtyTiles = None):
+        """把 ImageDraw 绘制的直通alpha RGBA图层 over 到待合成图层上
+
+        tiles: 绘制时由 DirtyDraw 记录的脏瓦片，只合成这些矩形；为None时退回整个非空包围盒
+        """
+        if tiles is None:
+            bbox = overlay.getbbox()
+            rects = [] if bbox is None else [bbox]
+        else:
+            rects = tiles.rects()
+        if not rects:
+            return
+        color, coverage = self.layer()
+        for box in rects:
+            region = overlay.crop(box)
+            alpha = region.getchannel('A')
+            color.paste(region.convert('RGB'), box[:2], alpha)
+            coverage.paste(255, box[:2], alpha)
+            self.dirty.mark(box[0], box[1], box[2] - 1, box[3] - 1)
+
+    def flatten(self):
+        """把待合成图层混合进工作帧，只处理脏瓦片覆盖的矩形"""
+        if self._color is None:
+            return
+        with self.stage('flatten'):
+            arena = FrameBufferArena.current()
+            for box in self.dirty.rects():
+                x0, y0, x1, y1 = box
+                region = self.frame[y0:y1, x0:x1]
+                remain = arena.get('coverage', (y1 - y0, x1 - x0, 1))
+                np.multiply(np.asarray(self._coverage.crop(box))[..., None], np.float32(-1 / 255), out=remain)
+                remain += 1
+                region *= remain
+                region += np.asarray(self._color.crop(box))
+            self.dirty.clear()
+            self._color = self._coverage = None
+
+    @staticmethod
+    def gaussian_kernel(sigma: float) -> np.ndarray:
+        """标准差 sigma 的一维高斯核右半边 [k0, k1, ..., kr]，截断在3σ并归一化"""
+        radius = max(1, int(math.ceil(3 * sigma)))
+        kernel = np.exp(-np.arange(radius + 1) ** 2 / (2 * sigma * sigma))
+        return (kernel / (kernel[0] + 2 * kernel[1:].sum())).astype(np.float32)
+
+    @classmethod
+    def box_kernels(cls, sigma: float, passes: int = 3) -> List[np.ndarray]:
+        """近似标准差 sigma 高斯的 passes 个盒式核（右半边，权重相等），奇数宽度按方差之和等于 σ² 选取
+
+        sigma < BOX_MIN_SIGMA 时返回 [gaussian_kernel(sigma)]
+        """
+        if sigma < cls.BOX_MIN_SIGMA:
+            return [cls.gaussian_kernel(sigma)]
+        ideal = math.sqrt(12 * sigma * sigma / passes + 1)
+        lower = int(ideal) - (1 - int(ideal) % 2)  # 不超过理想宽度的最大奇数
+        upper = lower + 2
+        count = round((12 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes)
+                      / (-4 * lower - 4))
+        widths = [lower if i < count else upper for i in range(passes)]
+        return [np.full(width // 2 + 1, 1 / width, dtype=np.float32) for width in widths if width > 1]
 
-        for i in range(count):
-            x, y = positions[i]
-            size = sizes[i]
-            color = ColorManager.random_color_rgba((30, 70))
+    @classmethod
+    def downsample_factor(cls, sigma: float, backend: str) -> int:
+        """downsample 后端的缩小倍数（2的幂，使小图上的 σ 落在 [1, 2)），其他后端或小半径为1"""
+        if backend != 'downsample' or sigma < cls.DOWNSAMPLE_MIN_SIGMA:
+            return 1
+        return 2 ** int(math.log2(sigma))
+
+    @classmethod
+    def blur_reach(cls, sigma: float, backend: str = 'gaussian') -> int:
+        """模糊结果受多远（像素）的输入影响，分带渲染据此确定halo；downsample 时向上取到缩小倍数的整数倍"""
+        if sigma <= 0:
+            return 0
+        factor = cls.downsample_factor(sigma, backend)
+        if factor > 1:
+            reach = factor * (int(math.ceil(3 * cls._residual_sigma(sigma, factor))) + 2)
+            return -(-reach // factor) * factor
+        kernels = cls.box_kernels(sigma) if backend == 'box' else [cls.gaussian_kernel(sigma)]
+        return sum(len(kernel) - 1 for kernel in kernels)
 
-            # 只绘制圆点，最简单的形状
-            self.draw.ellipse([x - size, y - size, x + size, y + size], fill=color)
+    @staticmethod
+    def _residual_sigma(sigma: float, factor: int) -> float:
+        """小图上还需补的 σ：扣除块均值下采样 ((f²-1)/12) 和双线性上采样 (f²/6) 引入的方差"""
+        variance = sigma * sigma - (factor * factor - 1) / 12 - factor * factor / 6
+        return math.sqrt(max(variance, 0.0)) / factor
+
+    @staticmethod
+    def _convolve(src: np.ndarray, out: np.ndarray, kernel: np.ndarray, axis: int, scratch: Tuple[np.ndarray, ...]):
+        """对称一维卷积（valid）：src 沿 axis 比 out 两端各多 r 个样本，out = k0·x + Σ kd·(x[-d] + x[+d])
+
+        等权的盒式核按倍增求窗口和：逐级求相邻 2、4、8… 个样本之和，再按宽度的二进制位拼出窗口，
+        加法次数约为 log2(宽度) 而不是宽度（numpy 的 cumsum 在这里比逐元素加法慢一个数量级）。
+        """
+        radius, n = len(kernel) - 1, out.shape[axis]
+        def span(start, length=n):
+            return (slice(start, start + length),) if axis == 0 else (slice(None), slice(start, start + length))
+        def buffer(index, like_length):
+            shape = list(src.shape)
+            shape[axis] = like_length
+            return scratch[index][tuple(slice(0, size) for size in shape)]
+
+        if radius >= 2 and kernel.min() == kernel.max():
+            width = 2 * radius + 1
+            level, size, offset, length, started, current = src, 1, 0, src.shape[axis], False, 1
+            while True:
+                if width & size:
+                    part = level[span(offset)]
+                    if started:
+                        out += part
+                    else:
+                        np.copyto(out, part)
+                        started = True
+                    offset += size
+                if size * 2 > width:
+                    break
+                length -= size
+                current = 1 - current
+                summed = buffer(current, length)
+                np.add(level[span(0, length)], level[span(size, length)], out=summed)
+                level, size = summed, size * 2
+            out *= kernel[0]
+            return
+
+        pair = buffer(0, n)
+        np.multiply(src[span(radius)], kernel[0], out=out)
+        for d in range(1, radius + 1):
+            np.add(src[span(radius - d)], src[span(radius + d)], out=pair)
+            pair *= kernel[d]
+            out += pair
+
+    def blur(self, sigma: float, name: str = 'blur', backend: str = 'gaussian'):
+        """原地模糊工作帧，sigma 与 ImageFilter.GaussianBlur 的 radius 相同，边界取边缘像素
+
+        backend: gaussian 为截断在3σ的精确高斯；box 为三遍盒式滤波近似，sigma < BOX_MIN_SIGMA 时等同 gaussian；
+        downsample 在 sigma ≥ DOWNSAMPLE_MIN_SIGMA 时先块均值缩小、小图上高斯、再双线性放大，
+        半径更小时等同 gaussian。
+        """
+        if backend not in self.BLUR_BACKENDS:
+            raise ValueError(f"未知的模糊后端: {backend}，可选 {self.BLUR_BACKENDS}")
+        self.flatten()
+        if sigma <= 0:
+            return
+        with self.stage(name):
+            factor = self.downsample_factor(sigma, backend)
+            if factor > 1:
+                self._blur_downsampled(sigma, factor)
+            elif backend == 'box':
+                self._blur_blocks(self.frame, self.box_kernels(sigma))
+            else:
+                self._blur_blocks(self.frame, [self.gaussian_kernel(sigma)])
+
+    def _blur_blocks(self, frame: np.ndarray, kernels: List[np.ndarray]):
+        """对 frame 依次做 kernels 中的可分离卷积：按 CHUNK_ROWS 行分块，窗口上下左右各多取 R（各核半径之和）
+        个样本，横向各遍逐次收窄，再纵向各遍逐次收窄，结果写回本块；
+        上一块覆盖前的末尾 R 行保存在 carry 中，暂存区只有几块大小。
+        """
+        h, w = frame.shape[:2]
+        radii = [len(kernel) - 1 for kernel in kernels]
+        total = sum(radii)
+        if total == 0:
+            return
+        block = max(self.CHUNK_ROWS, total)
+        shape = (block + 2 * total, w + 2 * total, 3)
+
+        arena = FrameBufferArena.current()
+        window = arena.get('blur_window', shape)
+        buffers = (arena.get('blur_ping', shape), arena.get('blur_pong', shape))
+        scratch = (arena.get('blur_scratch', shape), arena.get('blur_scratch2', shape))
+        carry = arena.get('blur_carry', (total, w, 3))
+
+        for y0 in range(0, h, block):
+            y1 = min(y0 + block, h)
+            n = y1 - y0
+            win = window[:n + 2 * total]
+            inner = win[:, total:total + w]
+            # 上方halo：上一块模糊前的末尾行，首块取第0行
+            inner[:total] = carry if y0 > 0 else frame[0]
+            end = min(y1 + total, h)
+            inner[total:total + end - y0] = frame[y0:end]
+            inner[total + end - y0:] = frame[h - 1]
+            if y1 < h:
+                carry[...] = frame[y1 - total:y1]
+            win[:, :total] = win[:, total:total + 1]
+            win[:, total + w:] = win[:, total + w - 1:total + w]
+
+            src, current = win, None
+            passes = [(kernel, radius, 1) for kernel, radius in zip(kernels, radii)]
+            passes += [(kernel, radius, 0) for kernel, radius in zip(kernels, radii)]
+            for i, (kernel, radius, axis) in enumerate(passes):
+                rows, cols = src.shape[:2]
+                if i == len(passes) - 1:
+                    dst = frame[y0:y1]
+                else:
+                    current = 1 if current == 0 else 0
+                    dst = buffers[current][:rows - 2 * radius * (axis == 0), :cols - 2 * radius * (axis == 1)]
+                self._convolve(src, dst, kernel, axis, scratch)
+                src = dst
+
+    @staticmethod
+    def _block_sum(src: np.ndarray, factor: int, axis: int, out: np.ndarray) -> np.ndarray:
+        """沿 axis 每 factor 个样本求和（跨步切片相加，比 np.add.reduceat 快得多），末尾不足一块的单独求和"""
+        full = src.shape[axis] // factor
+        def pick(index):
+            return (index,) if axis == 0 else (slice(None), index)
+        head = out[pick(slice(0, full))]
+        np.copyto(head, src[pick(slice(0, full * factor, factor))])
+        for k in range(1, factor):
+            head += src[pick(slice(k, full * factor, factor))]
+        if full * factor < src.shape[axis]:
+            out[pick(full)] = src[pick(slice(full * factor, None))].sum(axis=axis)
+        return out
+
+    def _blur_downsampled(self, sigma: float, factor: int):
+        """块均值缩小 factor 倍 → 小图上补足剩余 σ 的高斯 → 按像素中心双线性放大写回工作帧"""
+        frame, (h, w) = self.frame, (self.height, self.width)
+        arena = FrameBufferArena.current()
+        row_starts, col_starts = np.arange(0, h, factor), np.arange(0, w, factor)
+        hs, ws = len(row_starts), len(col_starts)
+
+        # 1. 块均值下采样（末尾不足一块的按实际像素数平均）
+        rows = self._block_sum(frame, factor, 0, arena.get('blur_reduce', (hs, w, 3)))
+        small = self._block_sum(rows, factor, 1, arena.get('blur_small', (hs, ws, 3)))
+        counts = np.diff(np.append(row_starts, h))[:, None] * np.diff(np.append(col_starts, w))[None, :]
+        small /= counts[..., None].astype(np.float32)
+
+        # 2. 小图上的高斯
+        residual = self._residual_sigma(sigma, factor)
+        if residual > 0:
+            self._blur_blocks(small, [self.gaussian_kernel(residual)])
+
+        # 3. 双线性上采样：全分辨率像素中心映射到小图坐标
+        def taps(size, small_size):
+            coords = np.clip((np.arange(size) + 0.5) / factor - 0.5, 0, small_size - 1)
+            first = coords.astype(np.intp)
+            return first, np.minimum(first + 1, small_size - 1), (coords - first).astype(np.float32)
+        y_lo, y_hi, y_t = taps(h, hs)
+        x_lo, x_hi, x_t = taps(w, ws)
+        x_t = x_t[None, :, None]
+        for y0 in range(0, h, self.CHUNK_ROWS):
+            y1 = min(y0 + self.CHUNK_ROWS, h)
+            n = y1 - y0
+            lines = arena.get('blur_lines', (n, ws, 3))
+            np.take(small, y_lo[y0:y1], axis=0, out=lines)
+            lines += (small[y_hi[y0:y1]] - lines) * y_t[y0:y1, None, None]
+            out = frame[y0:y1]
+            upper = arena.get('blur_upper', (n, w, 3))
+            np.take(lines, x_lo, axis=1, out=out)
+            np.take(lines, x_hi, axis=1, out=upper)
+            upper -= out
+            upper *= x_t
+            out += upper
+
+    def to_array(self, out: np.ndarray = None) -> np.ndarray:
+        """唯一一次转换：合入剩余图层，裁剪到0-255后写入uint8数组
+
+        out: 目标数组（如共享内存帧槽），默认为缓冲区池中下一帧会复用的数组
+        """
+        self.flatten()
+        with self.stage('convert'):
+            np.clip(self.frame, 0, 255, out=self.frame)
+            if out is None:
+                out = FrameBufferArena.current().get('frame', self.frame.shape, np.uint8)
+            np.copyto(out, self.frame, casting='unsafe')
+        return out
+
+    def to_image(self) -> Image.Image:
+        """转换为RGB图像（PIL会复制数据）"""
+        return Image.fromarray(self.to_array(), 'RGB')
 
 
 class FastImageGenerator:
     """快速图像生成器"""
 
-    def __init__(self, config: ImageConfig = None):
+    def __init__(self, config: ImageConfig = None, rng: SeededRandom = None):
         self.config = config or ImageConfig()
         self.monitor = PerformanceMonitor()
-
-    def create_fast_background(self) -> Image.Image:
-        """快速创建背景"""
+        # 未指定帧号时使用的随机源
+        self.rng = rng or SeededRandom(self.config.seed)
+
+    def frame_rng(self, frame_id: int) -> SeededRandom:
+        """第 frame_id 帧的独立随机流：同一种子和帧号在任何进程、任何分块方式下都相同"""
+        return SeededRandom(self.config.seed, frame_id)
+
+    def frame_config(self, frame_id: int, randomize: bool = False) -> ImageConfig:
+        """第 frame_id 帧渲染时实际使用的配置（不修改 self.config），用于渲染前估算成本
+
+        按 compose_frames 的顺序消耗该帧的随机流再随机化，种子固定时与渲染结果一致。
+        """
+        config = ImageConfig(**asdict(self.config))
+        if randomize:
+            rng = self.frame_rng(frame_id)
+            if config.gradient_stops <= 2:
+                # create_gradient_batch 先为每帧抽取方向和颜色
+                FastGradientGenerator.get_random_direction(rng)
+                ColorManager.get_gradient_colors(4, rng)
+            randomize_config(config, rng)
+        return config
+
+    def create_fast_background(self, base_gradient: np.ndarray = None, rng: SeededRandom = None) -> Image.Image:
+        """快速创建背景图像（渐变、噪声和轻量模糊），见 compose_background"""
+        return self.compose_background(base_gradient, rng).to_image()
+
+    def compose_background(self, base_gradient: np.ndarray = None, rng: SeededRandom = None) -> FrameCompositor:
+        """在缓冲区池的float32工作帧上生成背景，返回合成管线供后续图层继续合成
+
+        base_gradient: 可选的预生成渐变（来自 create_gradient_batch），为None时现场生成
+        """
         w, h = self.config.width, self.config.height
+        rng = rng or self.rng
+        compositor = FrameCompositor(FrameBufferArena.current().get('gradient', (h, w, 3)))
 
         # 1. 快速创建渐变
-        colors = ColorManager.get_gradient_colors(4)
-        direction = FastGradientGenerator.get_random_direction()
-        gradient = FastGradientGenerator.create_gradient_vectorized(w, h, colors, direction)
+        with compositor.stage('gradient') as gradient:
+            if base_gradient is not None:
+                np.copyto(gradient, base_gradient)
+            elif self.config.gradient_stops > 2:
+                direction = FastGradientGenerator.get_random_direction(rng)
+                stops = ColorManager.get_gradient_colors(self.config.gradient_stops, rng)
+                FastGradientGenerator.fill_gradient_lut(gradient, GradientLUT(stops), direction)
+            else:
+                direction = FastGradientGenerator.get_random_direction(rng)
+                colors = ColorManager.get_gradient_colors(4, rng)
+                FastGradientGenerator.fill_gradient(gradient, colors, direction)
 
         # 2. 可选噪声（减少强度）
         if self.config.noise_intensity > 0:
-            # 使用更高效的噪声生成
-            noise_scale = self.config.noise_intensity * 25  # 减少噪声强度
-            noise = np.random.normal(0, noise_scale, gradient.shape).astype(np.float32)
-            gradient = gradient.astype(np.float32) + noise
-            gradient = np.clip(gradient, 0, 255)
-
-        # 3. 转换为PIL图像
-        base_img = Image.fromarray(gradient.astype(np.uint8), 'RGB')
-
-        # 4. 轻量级模糊
+            with compositor.stage('noise') as gradient:
+                # 从共享的噪声纹理库平铺，代替逐帧采样整帧高斯噪声
+                noise_scale = self.config.noise_intensity * 25  # 减少噪声强度
+                NoiseBank.add_noise(gradient, noise_scale, rng.generator)
+                np.clip(gradient, 0, 255, out=gradient)
+
+        # 2b. 可选Perlin云层纹理
+        if self.config.cloud_intensity > 0:
+            with compositor.stage('clouds') as gradient:
+                placement = NoiseBank.cloud_placement(rng.generator)
+                NoiseBank.add_clouds(gradient, self.config.cloud_intensity * 255, placement)
+                np.clip(gradient, 0, 255, out=gradient)
+
+        # 3. 轻量级模糊，直接在float32工作帧上完成
         if self.config.blur_radius > 0:
-            blur_radius = min(self.config.blur_radius, 1.0)  # 限制模糊半径
-            base_img = base_img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+            blur_radius = min(self.config.blur_radius, self.config.max_blur_radius)  # 限制模糊半径
+            compositor.blur(blur_radius, backend=self.config.blur_backend)
+
+        return compositor
+
+    def create_gradient_batch(self, count: int, rngs: List[SeededRandom] = None) -> np.ndarray:
+        """为接下来的 count 帧一次生成 (count, h, w, 3) 的渐变，rngs 为每帧的随机源"""
+        rngs = rngs or [self.rng] * count
+        directions = [FastGradientGenerator.get_random_direction(rng) for rng in rngs]
+        colors_list = [ColorManager.get_gradient_colors(4, rng) for rng in rngs]
+        return FastGradientGenerator.create_gradient_batch(
+            self.config.width, self.config.height, colors_list, directions)
+
+    def generate_images_fast(self, count: int, randomize: bool = False, frame_ids: List[int] = None):
+        """逐张产出 count 张图像，渐变整批预先生成；randomize=True 时每张随机化配置
+
+        frame_ids: 每张图的帧号（默认0..count-1），每帧使用 frame_rng(帧号) 的独立随机流，
+        同一帧在单独重渲染（render_frame）时得到相同结果
+        """
+        for compositor in self.compose_frames(count, randomize, frame_ids):
+            yield compositor.to_image()
+
+    def compose_frames(self, count: int, randomize: bool = False, frame_ids: List[int] = None):
+        """同 generate_images_fast，但逐帧产出尚未转换的合成管线（调用方决定转换到哪里）"""
+        frame_ids = list(range(count)) if frame_ids is None else list(frame_ids)
+        rngs = [self.frame_rng(frame_id) for frame_id in frame_ids]
+        if self.config.gradient_stops > 2:
+            # 多色标渐变逐帧查表生成
+            gradients = [None] * len(rngs)
+        else:
+            gradients = self.create_gradient_batch(len(rngs), rngs)
 
-        return base_img
+        for rng, gradient in zip(rngs, gradients):
+            if randomize:
+                randomize_config(self.config, rng)
+            yield self.compose_frame(gradient, rng)
 
-    def generate_image_fast(self) -> Image.Image:
-        """快速生成图像"""
-        # 创建背景
-        img = self.create_fast_background()
+    def render_frame(self, frame_id: int, randomize: bool = False) -> Image.Image:
+        """按帧号重渲染单张图像，与批量生成中同一帧号的结果一致"""
+        return next(self.generate_images_fast(1, randomize, frame_ids=[frame_id]))
 
-        # 创建装饰图层（减少元素数量）
-        overlay = Image.new('RGBA', (self.config.width, self.config.height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
-        drawer = FastElementDrawer(draw, self.config.width, self.config.height)
-
-        # 根据配置添加效果（减少密度）
+    def add_effects(self, drawer: 'FastElementDrawer'):
+        """根据配置添加效果（减少密度）"""
         density = min(self.config.element_density * 0.6, 1.0)  # 减少元素密度
 
         for effect in self.config.effects:
@@ -341,106 +894,794 @@ class FastImageGenerator:
                 drawer.add_curves_fast(count=max(1, int(4 * density)))
             elif effect == 'particles':
                 drawer.add_particles_fast(count=max(1, int(25 * density)))
+            elif effect == 'bokeh':
+                drawer.add_bokeh_fast(count=max(1, int(5000 * density)))
+
+    def compose_frame(self, base_gradient: np.ndarray = None, rng: SeededRandom = None) -> FrameCompositor:
+        """合成背景和装饰元素，返回尚未转换的合成管线（可继续叠加图层）"""
+        rng = rng or self.rng
+        compositor = self.compose_background(base_gradient, rng)
 
-        # 合并图层
-        final_img = Image.alpha_composite(img.convert('RGBA'), overlay)
-        return final_img.convert('RGB')
+        # 创建装饰图层（减少元素数量）
+        with compositor.stage('elements'):
+            w, h = self.config.width, self.config.height
+            overlay = Image.new('RGBA', (w, h), (0, 0, 0, 0))
+            tiles = DirtyTiles(w, h)
+            drawer = FastElementDrawer(DirtyDraw(ImageDraw.Draw(overlay), tiles), w, h, rng)
+            self.add_effects(drawer)
+
+        # 气泡和粒子在下，曲线图层在上，只合成绘制触及的瓦片
+        with compositor.stage('layers'):
+            compositor.add_splats(drawer.splats)
+            compositor.add_overlay(overlay, tiles)
+        return compositor
+
+    def generate_image_fast(self, base_gradient: np.ndarray = None, rng: SeededRandom = None) -> Image.Image:
+        """快速生成图像"""
+        return self.compose_frame(base_gradient, rng).to_image()
 
 
-def generate_single_image(args):
-    """单个图像生成函数（用于多进程）"""
-    config, output_dir, index = args
+class StripRenderer:
+    """分带渲染器 - 超大画布按行带生成并流式写出PNG，峰值内存与画布高度无关
 
-    # 随机化配置
-    config.noise_intensity = random.uniform(0.005, 0.015)
-    config.blur_radius = random.uniform(0.3, 1.0)
-    config.element_density = random.uniform(0.6, 1.2)
+    与 FastImageGenerator 的效果一致：渐变、噪声、轻量模糊和装饰元素，
+    模糊在带上下各多算若干行（halo）后裁掉，避免带间接缝。
+    """
+
+    def __init__(self, config: ImageConfig = None, band_rows: int = 256):
+        if band_rows < 1:
+            raise ValueError(f"band_rows 必须为正整数: {band_rows}")
+        self.config = config or ImageConfig()
+        # downsample 后端各带的块均值网格须对齐：带高向上取到缩小倍数的整数倍
+        blur_radius = min(self.config.blur_radius, self.config.max_blur_radius) if self.config.blur_radius > 0 else 0
+        factor = FrameCompositor.downsample_factor(blur_radius, self.config.blur_backend)
+        self.band_rows = -(-band_rows // factor) * factor
+        self.timings: Dict[str, float] = OrderedDict()  # 各带合成阶段的累计耗时
+
+    def render(self, filepath: str) -> str:
+        config = self.config
+        w, h = config.width, config.height
+        arena = FrameBufferArena.current()
+        rng = SeededRandom(config.seed)
+
+        direction = FastGradientGenerator.get_random_direction(rng)
+        lut = None
+        if config.gradient_stops > 2:
+            lut = GradientLUT(ColorManager.get_gradient_colors(config.gradient_stops, rng))
+            if direction not in FastGradientGenerator._SCALAR_DIRECTIONS:
+                direction = 'diagonal'
+        else:
+            colors = ColorManager.get_gradient_colors(4, rng)
+
+        # 装饰元素先记录全画布坐标，之后按带重放
+        recorder = DrawRecorder()
+        drawer = FastElementDrawer(recorder, w, h, rng)
+        FastImageGenerator(config, rng).add_effects(drawer)
+
+        blur_radius = min(config.blur_radius, config.max_blur_radius) if config.blur_radius > 0 else 0
+        # halo 为模糊的影响范围；downsample 时是缩小倍数的整数倍，各带的块均值网格因此对齐
+        halo = FrameCompositor.blur_reach(blur_radius, config.blur_backend)
+        noise_scale = config.noise_intensity * 25
+        clouds = NoiseBank.cloud_placement(rng.generator) if config.cloud_intensity > 0 else None
+
+        with PNGStreamWriter(filepath, w, h) as writer:
+            for top in range(0, h, self.band_rows):
+                bottom = min(top + self.band_rows, h)
+                t0, b0 = max(0, top - halo), min(h, bottom + halo)
+                rows = b0 - t0
+
+                # 1. 渐变条带
+                band = arena.get('strip', (rows, w, 3))
+                fields = CoordinateFieldCache.get_band(w, h, direction, t0, b0)
+                if lut is not None:
+                    indices = CoordinateFieldCache.quantize(fields[0], lut.size)
+                    FastGradientGenerator.fill_gradient_lut(band, lut, direction, indices=indices)
+                else:
+                    FastGradientGenerator.fill_gradient(band, colors, direction, fields=fields)
+
+                # 2. 噪声
+                if config.noise_intensity > 0:
+                    NoiseBank.add_noise(band, noise_scale, rng.generator)
+                    np.clip(band, 0, 255, out=band)
+                if clouds is not None:
+                    NoiseBank.add_clouds(band, config.cloud_intensity * 255, clouds, top=t0)
+                    np.clip(band, 0, 255, out=band)
+
+                # 3. 在float32条带上模糊，裁掉halo
+                FrameCompositor(band, self.timings).blur(blur_radius, backend=config.blur_backend)
+                compositor = FrameCompositor(band[top - t0:bottom - t0], self.timings)
+
+                # 4. 合成该带的气泡、粒子和曲线
+                compositor.add_splats(drawer.splats, top)
+                if recorder.calls:
+                    overlay = Image.new('RGBA', (w, bottom - top), (0, 0, 0, 0))
+                    tiles = DirtyTiles(w, bottom - top)
+                    recorder.replay(DirtyDraw(ImageDraw.Draw(overlay), tiles), top, bottom)
+                    compositor.add_overlay(overlay, tiles)
+
+                # 5. 转uint8后写出
+                writer.write_rows(compositor.to_array())
+
+        return filepath
+
+
+def render_large_image(width: int = 7680, height: int = 4320, filepath: str = "output_fast_bg/large_bg.png",
+                       band_rows: int = 256, config: ImageConfig = None) -> str:
+    """分带渲染超大画布（默认8K）并直接流式写入PNG"""
+    config = config or ImageConfig()
+    config.width, config.height = width, height
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    return StripRenderer(config, band_rows).render(filepath)
+
+
+def randomize_config(config: ImageConfig, rng: SeededRandom = None):
+    """随机化单张图像的噪声、模糊、密度和效果组合"""
+    rng = rng or SeededRandom()
+    config.noise_intensity = rng.uniform(0.005, 0.015)
+    config.blur_radius = rng.uniform(0.3, 1.0)
+    config.element_density = rng.uniform(0.6, 1.2)
 
     # 随机选择效果组合
     all_effects = ['gradient', 'bubbles', 'curves', 'particles']
-    config.effects = random.sample(all_effects, random.randint(2, 4))
+    config.effects = rng.sample(all_effects, rng.randint(2, 4))
 
-    # 生成图像
-    generator = FastImageGenerator(config)
-    img = generator.generate_image_fast()
 
-    # 保存
+def save_image_fast(img: Image.Image, output_dir: str, index: int) -> str:
+    """使用更快的PNG选项保存图像"""
     filename = f"fast_bg_{index:03d}.png"
     filepath = os.path.join(output_dir, filename)
-
-    # 使用更快的保存选项
     img.save(filepath, 'PNG', optimize=False, compress_level=1)
-
     return filepath
 
 
+def generate_single_image(args):
+    """单个图像生成函数（用于多进程）"""
+    config, output_dir, index = args
+
+    # 按帧号的独立随机流随机化配置并生成图像
+    generator = FastImageGenerator(config)
+    img = generator.render_frame(index, randomize=True)
+
+    return save_image_fast(img, output_dir, index)
+
+
+def generate_image_chunk(args):
+    """一组图像的生成函数（用于多进程），一个任务渲染多张以摊薄进程间通信开销"""
+    config, output_dir, indices = args
+
+    generator = FastImageGenerator(config)
+    filepaths = []
+    for index, img in zip(indices, generator.generate_images_fast(len(indices), randomize=True,
+                                                                   frame_ids=indices)):
+        filepaths.append(save_image_fast(img, output_dir, index))
+
+    return filepaths
+
+
+class SharedFrameRing:
+    """共享内存帧环 - slots 个 (h, w, 3) uint8 帧槽放在一块 multiprocessing.shared_memory 上
+
+    父进程创建并负责分配槽位；工作进程按名称附加后把图像直接渲染进槽位，只回传槽位号和元数据，
+    父进程通过 frames[槽位] 拿到零拷贝的NumPy视图，像素不经过pickle。
+    """
+
+    # 工作进程内按名称缓存附加的帧环，只保留最近一个
+    _ATTACHED: Dict[str, 'SharedFrameRing'] = {}
+
+    def __init__(self, slots: int, width: int, height: int, name: str = None):
+        self.slots = slots
+        self.width = width
+        self.height = height
+        self._owner = name is None
+        nbytes = slots * height * width * 3
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=self._shm.buf)
+
+    def view(self, slot: int, width: int, height: int) -> np.ndarray:
+        """槽位开头的 (height, width, 3) 视图，用于在同一帧环上存放不大于槽位的其他尺寸帧"""
+        if width * height > self.width * self.height:
+            raise ValueError(f"帧 {width}x{height} 超出槽位容量 {self.width}x{self.height}")
+        return self.frames[slot].reshape(-1)[:height * width * 3].reshape(height, width, 3)
+
+    @property
+    def spec(self) -> Tuple[str, int, int, int]:
+        """工作进程附加用的 (名称, 槽数, 宽, 高)"""
+        return self._shm.name, self.slots, self.width, self.height
+
+    @classmethod
+    def attach(cls, name: str, slots: int, width: int, height: int) -> 'SharedFrameRing':
+        """在工作进程中按名称附加帧环，同一帧环只附加一次"""
+        ring = cls._ATTACHED.get(name)
+        if ring is None:
+            for stale in cls._ATTACHED.values():
+                stale.close()
+            cls._ATTACHED.clear()
+            ring = cls._ATTACHED[name] = cls(slots, width, height, name)
+        return ring
+
+    def close(self):
+        """解除映射；调用方仍持有帧视图时保留映射，由垃圾回收释放；创建者同时删除共享内存"""
+        self.frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
+        if self._owner:
+            self._shm.unlink()
+            self._owner = False
+
+
+def render_frame_to_slot(args) -> Tuple[int, Dict[str, Any]]:
+    """工作进程：把第 frame_id 帧直接渲染进共享内存帧环的槽位，只返回帧号和元数据"""
+    start_time = time.perf_counter()
+    config, ring_spec, slot, frame_id, randomize = args
+    ring = SharedFrameRing.attach(*ring_spec)
+    generator = FastImageGenerator(config)
+    compositor = next(generator.compose_frames(1, randomize, frame_ids=[frame_id]))
+    compositor.to_array(out=ring.view(slot, config.width, config.height))
+    meta = {
+        'pid': os.getpid(),
+        'effects': list(generator.config.effects),
+        'timings': dict(compositor.timings),
+        'seconds': time.perf_counter() - start_time,
+    }
+    return frame_id, meta
+
+
+def render_frames_to_slots(tasks) -> List[Tuple[int, Dict[str, Any]]]:
+    """工作进程：依次把一组帧渲染进各自的槽位（廉价帧合并成一个任务，摊薄调度开销）
+
+    单帧出错不影响同块的其余帧：该帧的 meta 只含 pid、seconds 和 error（错误描述）
+    """
+    results = []
+    for task in tasks:
+        start_time = time.perf_counter()
+        try:
+            results.append(render_frame_to_slot(task))
+        except Exception as exc:
+            results.append((task[3], {
+                'pid': os.getpid(),
+                'error': f"{type(exc).__name__}: {exc}",
+                'seconds': time.perf_counter() - start_time,
+            }))
+    return results
+
+
+def _render_probe(args):
+    """测量吞吐量用的探测任务：渲染一帧但不回传像素"""
+    config, frame_id = args
+    next(FastImageGenerator(config).compose_frames(1, True, frame_ids=[frame_id])).to_array()
+
+
+def warm_worker(sizes: List[Tuple[int, int]] = (), render: bool = True):
+    """预热当前进程：建好颜色池、映射噪声纹理库、构建 sizes 各尺寸所有方向的坐标场，
+    render=True 时再各渲染一帧，让缓冲区池和蒙版缓存就位（缓冲区池按进程区分，只能在工作进程里预热）
+    """
+    ColorManager.get_gradient_colors(4, SeededRandom(0))
+    NoiseBank.load()
+    NoiseBank.load_clouds()
+    for w, h in sizes:
+        for direction in FastGradientGenerator.DIRECTIONS:
+            CoordinateFieldCache.get(w, h, direction)
+        if render:
+            FastImageGenerator(ImageConfig(width=w, height=h, seed=0)).render_frame(0)
+
+
+def _worker_pid(_=None) -> int:
+    return os.getpid()
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """把 (h, w, 3) uint8 像素编码成PNG字节，选项与 save_image_fast 相同（Pillow编码期间释放GIL）"""
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, 'RGB').save(buffer, 'PNG', optimize=False, compress_level=1)
+    return buffer.getvalue()
+
+
+class PipelineStage:
+    """流水线阶段统计 - 工作者数、累计忙碌时间，以及交给本阶段但尚未取走的任务数（队列深度）"""
+
+    def __init__(self, name: str, workers: int, capacity: int):
+        self.name = name
+        self.workers = workers
+        self.capacity = capacity
+        self.busy = 0.0
+        self.items = 0
+        self.depth = 0
+        self.depth_max = 0
+        self.depth_total = 0
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def arrive(self, items: int = 1):
+        """任务进入本阶段队列，同时采样队列深度"""
+        with self._lock:
+            self.depth += items
+            self.depth_max = max(self.depth_max, self.depth)
+            self.depth_total += self.depth
+            self.samples += 1
+
+    def leave(self, seconds: float, items: int = 1):
+        """任务离开本阶段，记录处理耗时"""
+        with self._lock:
+            self.depth = max(0, self.depth - items)
+            self.busy += seconds
+            self.items += items
+
+    def report(self, wall: float) -> Dict[str, float]:
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'utilization': self.busy / (wall * self.workers) if wall > 0 else 0.0,
+            'avg_depth': self.depth_total / self.samples if self.samples else 0.0,
+            'max_depth': self.depth_max,
+            'capacity': self.capacity,
+        }
+
+
+class TaskScheduler:
+    """成本感知调度 - 估算每帧渲染成本，按成本从高到低排序并按剩余成本切分任务块
+
+    成本 = 像素数 ×（1 + Σ效果权重 × 元素密度），权重是1080p下各效果相对背景（渐变、噪声、模糊、转换）
+    的实测耗时比例；gradient 效果不额外绘制。最贵的帧最先开始，批次末尾只剩廉价的小块，
+    不会出现一个进程独自渲染最后一张4K帧的长尾。
+    """
+
+    EFFECT_WEIGHTS = {'gradient': 0.0, 'bubbles': 0.05, 'curves': 0.06, 'particles': 0.05, 'bokeh': 0.7}
+    TASKS_PER_WORKER = 4  # 每块目标成本为剩余成本 / (进程数 × TASKS_PER_WORKER)
+    MAX_CHUNK = 8
+
+    @classmethod
+    def estimate(cls, config: ImageConfig) -> float:
+        """按配置估算一帧的相对渲染成本"""
+        weight = sum(cls.EFFECT_WEIGHTS.get(effect, 0.0) for effect in config.effects)
+        return config.width * config.height * (1.0 + weight * config.element_density)
+
+    @staticmethod
+    def pin_seeds(tasks: List[Tuple[ImageConfig, str, int]]) -> List[Tuple[ImageConfig, str, int]]:
+        """给 seed=None 的配置换上本批次固定的种子副本（同一配置对象共用一个种子）
+
+        seed=None 时每次构造随机源都取新的系统熵，预测用的 frame_config 与实际渲染的帧不一致；
+        固定种子后两者按帧号派生同一随机流，每个批次仍各不相同
+        """
+        pinned = {}
+        result = []
+        for config, output_dir, index in tasks:
+            if config.seed is None:
+                if id(config) not in pinned:
+                    pinned[id(config)] = replace(config, seed=np.random.SeedSequence().entropy)
+                config = pinned[id(config)]
+            result.append((config, output_dir, index))
+        return result
+
+    @classmethod
+    def frame_cost(cls, config: ImageConfig, frame_id: int, randomize: bool = True) -> float:
+        """按该帧随机化后的实际配置估算成本（config.seed 须已固定，见 pin_seeds）"""
+        return cls.estimate(FastImageGenerator(config).frame_config(frame_id, randomize))
+
+    @classmethod
+    def plan(cls, tasks: List[Tuple[ImageConfig, str, int]], workers: int,
+             max_chunk: int = None) -> List[List[Tuple[ImageConfig, str, int]]]:
+        """把 (配置, 输出目录, 帧号) 任务按成本从高到低排序后切块
+
+        每块开始时的目标成本为剩余总成本 / (进程数 × TASKS_PER_WORKER)：批次开头贵的帧单独成块，
+        廉价的帧合并成块（最多 max_chunk 帧），越接近末尾块越小。
+        """
+        max_chunk = max_chunk or cls.MAX_CHUNK
+        costed = sorted(((cls.frame_cost(task[0], task[2]), task) for task in tasks),
+                        key=lambda item: item[0], reverse=True)
+        remaining = sum(cost for cost, _ in costed)
+        chunks = []
+        chunk, chunk_cost, target = [], 0.0, 0.0
+        for cost, task in costed:
+            if not chunk:
+                target = remaining / (workers * cls.TASKS_PER_WORKER)
+            chunk.append(task)
+            chunk_cost += cost
+            if chunk_cost >= target or len(chunk) >= max_chunk:
+                chunks.append(chunk)
+                remaining -= chunk_cost
+                chunk, chunk_cost = [], 0.0
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+
 class FastBatchGenerator:
-    """快速批量生成器"""
+    """快速批量生成器 - 持有常驻的预热进程池，跨多次调用、多种配置复用
+
+    进程池在第一次生成（或 start）时创建，用完需调用 shutdown，也可以用 with 语句管理。
+    未指定 max_workers 时默认使用全部可用CPU；probe_workers=True 时改为在 start 里按实测吞吐量选择。
+    """
+
+    # 本进程内测得的最佳进程数，只测量一次；结果同时写入 WORKERS_PATH，同一台机器后续运行直接读取
+    _MEASURED_WORKERS: Optional[int] = None
+    WORKERS_PATH = os.path.join(tempfile.gettempdir(), "fast_bg_workers_v1.json")
+
+    def __init__(self, max_workers: int = None, warm_sizes: List[Tuple[int, int]] = None,
+                 probe_workers: bool = False):
+        self.max_workers = max_workers or self.available_cpus()
+        # 构造时不启动任何进程，吞吐量探测推迟到 start
+        self._probe_workers = max_workers is None and probe_workers
+        # 预热坐标场和缓冲区的画布尺寸
+        self.warm_sizes = [(1920, 1080)] if warm_sizes is None else list(warm_sizes)
+        self._executor = None
 
-    def __init__(self, max_workers: int = None):
-        if max_workers is None:
-            # 使用CPU核心数，但不超过8个进程避免过载
-            self.max_workers = min(multiprocessing.cpu_count(), 8)
+    @staticmethod
+    def available_cpus() -> int:
+        """当前进程可用的CPU数（考虑CPU亲和性/容器限制）"""
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return multiprocessing.cpu_count()
+
+    @classmethod
+    def measure_workers(cls, probe: Tuple[int, int] = (960, 540), frames_per_worker: int = 4,
+                        refresh: bool = False) -> int:
+        """依次用 1, 2, 4, ... 个进程渲染探测帧测量吞吐量，吞吐量提升不足10%时停止，返回此前最佳的进程数
+
+        结果在本进程内缓存，并按 (可用CPU数, 探测帧尺寸) 记入 WORKERS_PATH，refresh=True 时重新测量；
+        只有1个可用CPU时不做测量。
+        """
+        if cls._MEASURED_WORKERS is not None and not refresh:
+            return cls._MEASURED_WORKERS
+        cpus = cls.available_cpus()
+        key = f"{cpus}:{probe[0]}x{probe[1]}"
+        try:
+            with open(cls.WORKERS_PATH, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        if not refresh and isinstance(saved.get(key), int):
+            cls._MEASURED_WORKERS = saved[key]
+            return saved[key]
+
+        candidates = sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+        config = ImageConfig(width=probe[0], height=probe[1], seed=0)
+        best_workers, best_throughput = 1, 0.0
+        if len(candidates) > 1:
+            for workers in candidates:
+                with concurrent.futures.ProcessPoolExecutor(
+                        max_workers=workers, initializer=warm_worker, initargs=([probe],)) as executor:
+                    list(executor.map(_worker_pid, range(workers)))
+                    frames = workers * frames_per_worker
+                    start_time = time.perf_counter()
+                    list(executor.map(_render_probe, [(config, i) for i in range(frames)]))
+                    throughput = frames / (time.perf_counter() - start_time)
+                if throughput < best_throughput * 1.1:
+                    break
+                best_workers, best_throughput = workers, throughput
+            print(f"🔎 实测吞吐量: {best_workers} 个进程 {best_throughput:.1f} 帧/秒 ({cpus} 个可用CPU)")
+        cls._MEASURED_WORKERS = best_workers
+        saved[key] = best_workers
+        tmp_path = f"{cls.WORKERS_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, cls.WORKERS_PATH)
+        except OSError:
+            pass  # 写不了缓存只影响下次运行是否重新测量
+        return best_workers
+
+    def start(self) -> 'FastBatchGenerator':
+        """创建并预热进程池，已创建时直接返回
+
+        父进程先建好颜色池、噪声纹理库和坐标场，fork出的工作进程直接继承（写时复制共享）；
+        每个工作进程启动时再执行 warm_worker（spawn 平台上在子进程内构建）并渲染一帧，
+        提交与进程数相同的空任务等待全部进程就绪，首批任务不再承担启动开销。
+        构造时设置了 probe_workers 的，先在这里测量进程数（见 measure_workers）。
+        """
+        if self._executor is None:
+            if self._probe_workers:
+                self.max_workers = self.measure_workers()
+                self._probe_workers = False
+            print(f"🚀 使用 {self.max_workers} 个进程并行生成")
+            warm_worker(self.warm_sizes, render=False)
+            # 先启动资源跟踪进程再fork，工作进程附加共享内存帧环时与父进程共用同一个跟踪器，
+            # 否则各自的跟踪器会在退出时把父进程的共享内存当作泄漏删除
+            resource_tracker.ensure_running()
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=warm_worker, initargs=(self.warm_sizes,))
+            list(self._executor.map(_worker_pid, range(self.max_workers)))
+        return self
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池；wait=False 时取消尚未开始的任务"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+    def __enter__(self) -> 'FastBatchGenerator':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    async def __aenter__(self) -> 'FastBatchGenerator':
+        # 创建和预热进程池是阻塞操作，放到默认线程池里执行，不占用事件循环
+        await asyncio.get_running_loop().run_in_executor(None, self.start)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+    def stream_frames(self, config: ImageConfig, count: int, frame_ids: List[int] = None,
+                      randomize: bool = True, slots: int = None):
+        """按完成顺序逐帧产出 (帧号, 像素, 元数据)，像素是共享内存帧环上的 (h, w, 3) uint8 视图
+
+        工作进程把图像直接渲染进空闲槽位，只回传槽位号；在途任务数不超过槽位数（默认进程数的2倍），
+        父进程消费慢时自动限流。视图在下一次迭代时被回收复用，需要保留请自行复制。
+        同一帧号的像素与 FastImageGenerator.render_frame 一致。
+        """
+        frame_ids = iter(range(1, count + 1) if frame_ids is None else frame_ids)
+        executor = self.start()._executor
+        ring = SharedFrameRing(slots or 2 * self.max_workers, config.width, config.height)
+        free = list(range(ring.slots))
+        pending = {}
+
+        def submit():
+            for frame_id in frame_ids:
+                slot = free.pop()
+                task = (config, ring.spec, slot, frame_id, randomize)
+                pending[executor.submit(render_frame_to_slot, task)] = slot
+                if not free:
+                    break
+
+        try:
+            submit()
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    slot = pending.pop(future)
+                    frame_id, meta = future.result()
+                    yield frame_id, ring.frames[slot], meta
+                    free.append(slot)
+                    submit()
+        finally:
+            # 提前结束时取消排队的任务，等正在写槽位的任务完成后再释放共享内存
+            for future in pending:
+                future.cancel()
+            concurrent.futures.wait(pending)
+            ring.close()
+
+    async def agenerate(self, config: ImageConfig, count: int, frame_ids: List[int] = None,
+                        output_dir: str = None, limit: int = None):
+        """asyncio 原生接口：按完成顺序逐张异步产出 (帧号, 图像或文件路径)，不阻塞事件循环
+
+            async with FastBatchGenerator() as generator:
+                async for frame_id, img in generator.agenerate(config, 10):
+                    ...
+
+        渲染在常驻进程池里进行，事件循环只等待包装后的 future；在途任务不超过 limit（默认进程数的2倍），
+        消费方不取下一张就不再提交新任务。提前 break、aclose 或所在任务被取消时取消尚未开始的任务，
+        只等正在渲染的几帧完成。output_dir 为 None 时产出 PIL 图像（经共享内存帧环回传后复制），
+        否则在工作进程内保存PNG并产出路径。同一帧号的图像与 render_frame(帧号, randomize=True) 一致。
+        """
+        loop = asyncio.get_running_loop()
+        executor = (await loop.run_in_executor(None, self.start))._executor
+        frame_ids = iter(range(1, count + 1) if frame_ids is None else frame_ids)
+        limit = limit or 2 * self.max_workers
+        ring = SharedFrameRing(limit, config.width, config.height) if output_dir is None else None
+        free = list(range(limit))
+        pending = {}
+
+        def submit():
+            for frame_id in frame_ids:
+                slot = free.pop()
+                if ring is None:
+                    future = executor.submit(generate_single_image, (config, output_dir, frame_id))
+                else:
+                    future = executor.submit(render_frame_to_slot, (config, ring.spec, slot, frame_id, True))
+                pending[asyncio.wrap_future(future, loop=loop)] = (future, slot, frame_id)
+                if not free:
+                    break
+
+        try:
+            submit()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    _, slot, frame_id = pending.pop(future)
+                    result = future.result()
+                    if ring is None:
+                        yield frame_id, result
+                    else:
+                        yield frame_id, Image.fromarray(ring.view(slot, config.width, config.height), 'RGB')
+                    free.append(slot)
+                    submit()
+        finally:
+            # 取消进程池里排队的任务；已开始的任务无法中断，等它们写完槽位再释放帧环
+            running = [wrapped for wrapped, (future, _, _) in pending.items() if not future.cancel()]
+            if running:
+                await asyncio.wait(running)
+            if ring is not None:
+                ring.close()
+
+    def run_pipeline(self, tasks: List[Tuple[ImageConfig, str, int]], encode_workers: int = 2,
+                     write_queue: int = 8, slots: int = None, on_written=None,
+                     schedule: bool = True) -> Tuple[List[str], 'OrderedDict[str, PipelineStage]']:
+        """渲染 → 编码 → 写盘 三级流水线，tasks 为 (配置, 输出目录, 帧号)，返回写出的文件和各阶段统计
+
+        渲染：常驻进程池（max_workers 个进程）把帧直接渲染进共享内存帧环，空闲槽位数限制在途帧数；
+        编码：encode_workers 个线程从槽位编码PNG，编码完立即归还槽位；
+        写盘：1 个线程顺序写文件，编码结果经容量为 write_queue 的有界队列传入。
+        任何一级变慢都会经队列/槽位逐级反压，整体速度取决于最慢的一级，内存占用有上限。
+        schedule=True 时由 TaskScheduler 按成本从高到低排序并切块，否则按给定顺序逐帧提交。
+        """
+        if not tasks:
+            return [], OrderedDict()
+        executor = self.start()._executor
+        slots = slots or 2 * (self.max_workers + encode_workers)
+        # 未设种子的配置先固定本批次的种子，成本预测和渲染才是同一帧
+        tasks = TaskScheduler.pin_seeds(tasks)
+        if schedule:
+            chunks = TaskScheduler.plan(tasks, self.max_workers, max_chunk=max(1, slots // 2))
         else:
-            self.max_workers = max_workers
+            chunks = [[task] for task in tasks]
+        largest = max((config for config, _, _ in tasks), key=lambda c: c.width * c.height)
+        ring = SharedFrameRing(slots, largest.width, largest.height)
+        free = Queue()
+        for slot in range(slots):
+            free.put(slot)
+        rendered = Queue()
+        encoded = Queue(maxsize=write_queue)
+        stages = OrderedDict([
+            ('render', PipelineStage('render', self.max_workers, slots)),
+            ('encode', PipelineStage('encode', encode_workers, slots)),
+            ('write', PipelineStage('write', 1, write_queue)),
+        ])
+        files = []
+
+        def on_rendered(future, frames: int):
+            if future.cancelled() or future.exception() is not None:
+                stages['render'].leave(0.0, frames)
+                return
+            results = future.result()
+            stages['render'].leave(sum(meta['seconds'] for _, meta in results), len(results))
+            stages['encode'].arrive(sum('error' not in meta for _, meta in results))
+
+        def encode_loop():
+            # 按提交顺序取任务块，进程池按先进先出执行，先提交的块通常先完成
+            while True:
+                item = rendered.get()
+                if item is None:
+                    break
+                chunk, chunk_slots, future = item
+                try:
+                    results = future.result()
+                except concurrent.futures.CancelledError:
+                    pass
+                except Exception as exc:
+                    frames = ', '.join(f"{config.style} #{index}" for config, _, index in chunk)
+                    print(f"❌ 任务失败: {frames} - {exc}")
+                else:
+                    for (config, output_dir, index), slot, (_, meta) in zip(chunk, chunk_slots, results):
+                        if 'error' in meta:
+                            print(f"❌ 任务失败: {config.style} #{index} - {meta['error']}")
+                            free.put(slot)
+                            continue
+                        start_time = time.perf_counter()
+                        try:
+                            data = encode_png(ring.view(slot, config.width, config.height))
+                        except Exception as exc:
+                            print(f"❌ 任务失败: {config.style} #{index} - {exc}")
+                            continue
+                        finally:
+                            # 编码成败都归还槽位，否则提交循环会在 free.get() 上永久阻塞
+                            stages['encode'].leave(time.perf_counter() - start_time)
+                            free.put(slot)
+                        stages['write'].arrive()
+                        encoded.put((os.path.join(output_dir, f"fast_bg_{index:03d}.png"), data))
+                    continue
+                for slot in chunk_slots:
+                    free.put(slot)
+
+        def write_loop():
+            while True:
+                item = encoded.get()
+                if item is None:
+                    break
+                filepath, data = item
+                start_time = time.perf_counter()
+                try:
+                    with open(filepath, 'wb') as f:
+                        f.write(data)
+                except OSError as exc:
+                    print(f"❌ 写入失败: {filepath} - {exc}")
+                    continue
+                finally:
+                    stages['write'].leave(time.perf_counter() - start_time)
+                files.append(filepath)
+                if on_written is not None:
+                    on_written(len(files))
+
+        encoders = [threading.Thread(target=encode_loop, daemon=True) for _ in range(encode_workers)]
+        writer = threading.Thread(target=write_loop, daemon=True)
+        for thread in encoders + [writer]:
+            thread.start()
+
+        futures = []
+        try:
+            for chunk in chunks:
+                # 没有足够的空闲槽位时阻塞，编码跟不上就不再提交渲染
+                chunk_slots = [free.get() for _ in chunk]
+                stages['render'].arrive(len(chunk))
+                future = executor.submit(render_frames_to_slots, [
+                    (config, ring.spec, slot, index, True) for (config, _, index), slot in zip(chunk, chunk_slots)])
+                future.add_done_callback(partial(on_rendered, frames=len(chunk)))
+                futures.append(future)
+                rendered.put((chunk, chunk_slots, future))
+        except BaseException:
+            # 提前结束时取消排队的任务
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            # 编码线程处理完已提交的帧后退出，写盘线程随后退出
+            for _ in encoders:
+                rendered.put(None)
+            for thread in encoders:
+                thread.join()
+            encoded.put(None)
+            writer.join()
+            concurrent.futures.wait(futures)
+            ring.close()
+        return files, stages
 
-        print(f"🚀 使用 {self.max_workers} 个进程并行生成")
+    @staticmethod
+    def print_stage_report(stages: 'OrderedDict[str, PipelineStage]', wall: float):
+        """打印各阶段的工作者数、利用率和队列深度"""
+        print("📈 流水线阶段统计:")
+        for name, stage in stages.items():
+            r = stage.report(wall)
+            print(f"  {name:<7} {r['workers']:>2} 个工作者  完成 {r['items']:>4}  利用率 {r['utilization']:6.1%}  "
+                  f"队列 平均 {r['avg_depth']:4.1f} / 最大 {r['max_depth']:>2} / 容量 {r['capacity']:>2}")
 
     def batch_generate_parallel(self, configs: List[ImageConfig], images_per_config: int,
-                               output_base_dir: str = "output_fast_bg") -> List[str]:
+                               output_base_dir: str = "output_fast_bg", encode_workers: int = 2,
+                               write_queue: int = 8, slots: int = None) -> List[str]:
         # 当output_fast_bg是默认值时，添加随机数子目录，格式为output_fast_bg-xxxx
         if output_base_dir == "output_fast_bg":
             output_base_dir = f"{output_base_dir}-{random.randint(1000, 9999)}"
-        """并行批量生成图像"""
+        """并行批量生成图像：渲染、编码、写盘三级流水线，各级规模见 run_pipeline"""
         monitor = PerformanceMonitor()
         monitor.start()
 
         total_images = len(configs) * images_per_config
         print(f"📊 准备生成 {total_images} 张图片...")
 
-        # 准备任务列表
+        # 准备任务列表，每个任务一帧
         tasks = []
-        all_files = []
-
         for i, config in enumerate(configs):
             output_dir = f"{output_base_dir}_{config.style}_{random.randint(1000, 9999)}"
             os.makedirs(output_dir, exist_ok=True)
+            tasks.extend((config, output_dir, i * images_per_config + j + 1) for j in range(images_per_config))
 
-            for j in range(images_per_config):
-                task_index = i * images_per_config + j + 1
-                tasks.append((config, output_dir, task_index))
-
+        # 常驻进程池（首次调用时创建并预热，噪声纹理库由父进程生成后只读映射）
+        self.start()
         monitor.log("任务准备")
 
-        # 并行执行
-        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            print(f"🔄 开始并行生成...")
+        print(f"🔄 开始并行生成...")
+        step = max(1, total_images // 20)
 
-            # 提交所有任务
-            future_to_task = {executor.submit(generate_single_image, task): task for task in tasks}
+        def on_written(completed):
+            # 显示进度
+            if completed % step == 0 or completed == total_images:
+                percentage = (completed / total_images) * 100
+                print(f"✅ 已完成: {completed}/{total_images} ({percentage:.1f}%)")
 
-            # 收集结果
-            completed = 0
-            for future in concurrent.futures.as_completed(future_to_task):
-                try:
-                    filepath = future.result()
-                    all_files.append(filepath)
-                    completed += 1
-
-                    # 显示进度
-                    if completed % 5 == 0 or completed == total_images:
-                        percentage = (completed / total_images) * 100
-                        print(f"✅ 已完成: {completed}/{total_images} ({percentage:.1f}%)")
-
-                except Exception as exc:
-                    task = future_to_task[future]
-                    print(f"❌ 任务失败: {task} - {exc}")
+        start_time = time.perf_counter()
+        all_files, stages = self.run_pipeline(tasks, encode_workers, write_queue, slots, on_written)
+        wall = time.perf_counter() - start_time
 
         monitor.log("图像生成")
         monitor.summary()
+        self.print_stage_report(stages, wall)
 
         print(f"\n🎉 成功生成 {len(all_files)} 张图片！")
-        print(f"📁 平均每张耗时: {(time.time() - monitor.start_time) / len(all_files):.2f}s")
+        print(f"📁 平均每张耗时: {(time.time() - monitor.start_time) / max(1, len(all_files)):.2f}s")
 
         return all_files
 
@@ -467,15 +1708,18 @@ async def generate_images_async(count: int = 20):
     for i in range(remaining):
         config_counts[i] += 1
 
-    # 启动并行生成
-    generator = FastBatchGenerator()
-
-    # 为每个配置生成对应数量的图片
+    # 所有配置共用同一个预热进程池，逐张等待完成的文件，等待期间事件循环可以处理其他任务
+    output_base_dir = f"output_fast_bg-{random.randint(1000, 9999)}"
     all_files = []
-    for i, (config, img_count) in enumerate(zip(configs, config_counts)):
-        if img_count > 0:
-            files = generator.batch_generate_parallel([config], img_count)
-            all_files.extend(files)
+    async with FastBatchGenerator() as generator:
+        # 为每个配置生成对应数量的图片
+        for i, (config, img_count) in enumerate(zip(configs, config_counts)):
+            if img_count > 0:
+                output_dir = f"{output_base_dir}_{config.style}_{random.randint(1000, 9999)}"
+                os.makedirs(output_dir, exist_ok=True)
+                async for _, filepath in generator.agenerate(config, img_count, output_dir=output_dir):
+                    all_files.append(filepath)
+                    print(f"✅ 已完成: {len(all_files)}/{count} ({len(all_files) / count * 100:.1f}%)")
 
     return all_files
 
@@ -494,8 +1738,8 @@ def benchmark_performance():
         print(f"\n测试 {workers} 个进程:")
         start_time = time.time()
 
-        generator = FastBatchGenerator(max_workers=workers)
-        files = generator.batch_generate_parallel(test_configs, 5, f"benchmark_{workers}")
+        with FastBatchGenerator(max_workers=workers) as generator:
+            files = generator.batch_generate_parallel(test_configs, 5, f"benchmark_{workers}")
 
         total_time = time.time() - start_time
         avg_time = total_time / len(files)
@@ -505,8 +1749,386 @@ def benchmark_performance():
         print(f"  吞吐量: {len(files)/total_time:.2f} 张/秒")
 
 
+def benchmark_pool_latency(batches: int = 4, images: int = 2, workers: int = 2):
+    """小批量延迟基准测试：每次调用新建进程池（旧行为）vs 复用常驻预热进程池"""
+    import shutil
+    print(f"🔬 小批量延迟基准测试 ({batches} 批 × {images} 张, {workers} 个进程)")
+    print("=" * 30)
+    configs = [ImageConfig(width=1920, height=1080, style='latency')]
+    output_root = tempfile.mkdtemp(prefix="fast_bg_latency_")
+    try:
+        cold = []
+        for batch in range(batches):
+            start_time = time.perf_counter()
+            # 不预热坐标场和缓冲区，等同于每次调用新建一个普通进程池
+            with FastBatchGenerator(max_workers=workers, warm_sizes=[]) as generator:
+                generator.batch_generate_parallel(configs, images, os.path.join(output_root, f"cold_{batch}"))
+            cold.append(time.perf_counter() - start_time)
+
+        warm = []
+        generator = FastBatchGenerator(max_workers=workers)
+        start_time = time.perf_counter()
+        generator.start()
+        startup = time.perf_counter() - start_time
+        try:
+            for batch in range(batches):
+                start_time = time.perf_counter()
+                generator.batch_generate_parallel(configs, images, os.path.join(output_root, f"warm_{batch}"))
+                warm.append(time.perf_counter() - start_time)
+        finally:
+            generator.shutdown()
+    finally:
+        shutil.rmtree(output_root, ignore_errors=True)
+
+    print(f"\n  每批新建进程池: 平均 {np.mean(cold) * 1000:7.1f}ms  首批 {cold[0] * 1000:7.1f}ms")
+    print(f"  常驻预热进程池: 平均 {np.mean(warm) * 1000:7.1f}ms  首批 {warm[0] * 1000:7.1f}ms"
+          f"（一次性启动预热 {startup * 1000:.1f}ms）")
+
+
+def _render_frame_pickled(args) -> np.ndarray:
+    """对照组：渲染一帧并把像素数组经pickle返回父进程"""
+    config, frame_id = args
+    return np.asarray(FastImageGenerator(config).render_frame(frame_id, randomize=True))
+
+
+def benchmark_frame_transport(frames: int = 8, workers: int = 2, size: Tuple[int, int] = (1920, 1080)):
+    """帧回传基准测试：工作进程经pickle返回像素数组 vs 渲染进共享内存帧环只回传槽位号"""
+    w, h = size
+    print(f"🔬 帧回传基准测试 ({w}x{h}, {frames} 帧, {workers} 个进程)")
+    print("=" * 30)
+    config = ImageConfig(width=w, height=h, seed=0)
+    with FastBatchGenerator(max_workers=workers, warm_sizes=[size]) as generator:
+        executor = generator._executor
+        checksum = 0
+        start_time = time.perf_counter()
+        for pixels in executor.map(_render_frame_pickled, [(config, i) for i in range(1, frames + 1)]):
+            checksum += int(pixels[0, 0, 0])
+        pickled = (time.perf_counter() - start_time) / frames
+
+        start_time = time.perf_counter()
+        for _, pixels, _ in generator.stream_frames(config, frames):
+            checksum += int(pixels[0, 0, 0])
+        shared = (time.perf_counter() - start_time) / frames
+
+    print(f"  pickle回传   {pickled * 1000:7.1f}ms/帧")
+    print(f"  共享内存帧环 {shared * 1000:7.1f}ms/帧")
+
+
+def benchmark_pipeline(images: int = 16, workers: int = 2, encode_workers: int = 2):
+    """流水线基准测试：工作进程内渲染+编码+写盘（旧的分块任务）vs 渲染/编码/写盘三级流水线"""
+    import shutil
+    print(f"🔬 流水线基准测试 ({images} 张, {workers} 个渲染进程, {encode_workers} 个编码线程)")
+    print("=" * 30)
+    config = ImageConfig(width=1920, height=1080, style='pipeline')
+    output_root = tempfile.mkdtemp(prefix="fast_bg_pipeline_")
+    try:
+        with FastBatchGenerator(max_workers=workers) as generator:
+            executor = generator._executor
+            chunk_size = max(1, min(8, math.ceil(images / (workers * 4))))
+            output_dir = os.path.join(output_root, "chunked")
+            os.makedirs(output_dir)
+            indices = list(range(1, images + 1))
+            chunks = [(config, output_dir, indices[i:i + chunk_size]) for i in range(0, images, chunk_size)]
+            start_time = time.perf_counter()
+            list(executor.map(generate_image_chunk, chunks))
+            chunked = time.perf_counter() - start_time
+
+            output_dir = os.path.join(output_root, "pipelined")
+            os.makedirs(output_dir)
+            tasks = [(config, output_dir, index) for index in indices]
+            start_time = time.perf_counter()
+            files, stages = generator.run_pipeline(tasks, encode_workers)
+            pipelined = time.perf_counter() - start_time
+
+        print(f"  分块任务  {chunked / images * 1000:7.1f}ms/张  {images / chunked:5.2f} 张/秒")
+        print(f"  三级流水线 {pipelined / images * 1000:7.1f}ms/张  {len(files) / pipelined:5.2f} 张/秒")
+        FastBatchGenerator.print_stage_report(stages, pipelined)
+    finally:
+        shutil.rmtree(output_root, ignore_errors=True)
+
+
+def benchmark_scheduler(workers: int = 2):
+    """成本感知调度基准测试：720p/1080p/4K 混合批次，大图排在最后提交（最坏情况）
+
+    先逐帧实测渲染耗时检验成本模型，再用实测耗时模拟不同进程数下按提交顺序逐帧分发与
+    按成本排序切块的完成时间，最后在本机用 workers 个进程实际运行两种方式。
+    """
+    import shutil
+    sizes = [(1280, 720)] * 12 + [(1920, 1080)] * 4 + [(3840, 2160)] * 2
+    print(f"🔬 成本感知调度基准测试 ({len(sizes)} 张混合分辨率)")
+    print("=" * 30)
+    output_root = tempfile.mkdtemp(prefix="fast_bg_schedule_")
+    configs = {size: ImageConfig(width=size[0], height=size[1], style=f"{size[1]}p", seed=0) for size in set(sizes)}
+    tasks = [(configs[size], output_root, index) for index, size in enumerate(sizes, 1)]
+
+    # 逐帧实测渲染耗时（单进程）
+    measured = {}
+    for config, _, index in tasks:
+        generator = FastImageGenerator(config)
+        generator.render_frame(0)
+        start_time = time.perf_counter()
+        next(generator.compose_frames(1, True, frame_ids=[index])).to_array()
+        measured[index] = time.perf_counter() - start_time
+    unit = TaskScheduler.estimate(ImageConfig(width=1920, height=1080, effects=[]))
+    for config in sorted(configs.values(), key=lambda c: c.width):
+        indices = [index for c, _, index in tasks if c is config]
+        cost = sum(TaskScheduler.frame_cost(config, index) for index in indices) / len(indices) / unit
+        elapsed = sum(measured[index] for index in indices) / len(indices)
+        print(f"  {config.width}x{config.height}  估算成本 {cost:5.2f}  实测 {elapsed * 1000:6.1f}ms/帧")
+
+    def makespan(chunks, n):
+        # 列表调度：每块交给最早空闲的进程
+        finish = [0.0] * n
+        for chunk in chunks:
+            i = finish.index(min(finish))
+            finish[i] += sum(measured[index] for _, _, index in chunk)
+        return max(finish)
+
+    print("  模拟完成时间（按实测逐帧耗时）:")
+    for n in (2, 4, 8):
+        fifo = makespan([[task] for task in tasks], n)
+        planned = makespan(TaskScheduler.plan(tasks, n), n)
+        # 下限：平均分配的总耗时，且不少于最慢的一帧
+        ideal = max(sum(measured.values()) / n, max(measured.values()))
+        print(f"    {n} 个进程  提交顺序 {fifo * 1000:7.1f}ms  成本调度 {planned * 1000:7.1f}ms  "
+              f"下限 {ideal * 1000:7.1f}ms")
+
+    try:
+        with FastBatchGenerator(max_workers=workers) as generator:
+            for schedule in (False, True):
+                start_time = time.perf_counter()
+                generator.run_pipeline(tasks, schedule=schedule)
+                elapsed = time.perf_counter() - start_time
+                print(f"  本机 {workers} 个进程 {'成本调度' if schedule else '提交顺序'}: {elapsed * 1000:7.1f}ms")
+    finally:
+        shutil.rmtree(output_root, ignore_errors=True)
+
+
+def benchmark_gradient_cache(frames: int = 50, sizes: List[Tuple[int, int]] = None):
+    """渐变坐标场缓存基准测试：每帧清空缓存(重建坐标场) vs 命中缓存"""
+    print("🔬 渐变坐标场缓存基准测试")
+    print("=" * 30)
+
+    if sizes is None:
+        sizes = [(1280, 720), (1920, 1080)]
+    colors = ColorManager.get_gradient_colors(4)
+
+    for w, h in sizes:
+        print(f"\n尺寸 {w}x{h}:")
+        for direction in ('horizontal', 'vertical', 'diagonal', 'radial', 'four_corner'):
+            CoordinateFieldCache.clear()
+            start_time = time.perf_counter()
+            for _ in range(frames):
+                CoordinateFieldCache.clear()
+                FastGradientGenerator.create_gradient_vectorized(w, h, colors, direction)
+            cold = (time.perf_counter() - start_time) / frames
+
+            CoordinateFieldCache.clear()
+            start_time = time.perf_counter()
+            for _ in range(frames):
+                FastGradientGenerator.create_gradient_vectorized(w, h, colors, direction)
+            warm = (time.perf_counter() - start_time) / frames
+
+            stats = CoordinateFieldCache.stats()
+            print(f"  {direction:<12} 无缓存: {cold * 1000:6.2f}ms  缓存: {warm * 1000:6.2f}ms  "
+                  f"加速: {cold / warm:.2f}x  (命中 {stats['hits']} / 未命中 {stats['misses']})")
+
+        # 多色标查找表：色标数量不影响逐像素开销
+        gradient = np.empty((h, w, 3), dtype=np.float32)
+        for stop_count in (2, 4, 8):
+            lut = GradientLUT(ColorManager.get_gradient_colors(stop_count))
+            start_time = time.perf_counter()
+            for _ in range(frames):
+                FastGradientGenerator.fill_gradient_lut(gradient, lut, 'radial')
+            elapsed = (time.perf_counter() - start_time) / frames
+            print(f"  radial {stop_count}色标查找表: {elapsed * 1000:6.2f}ms")
+
+
+def benchmark_gradient_directions(frames: int = 20, size: Tuple[int, int] = (1920, 1080)):
+    """逐方向微基准：标量场构建耗时、缓存命中后的混合耗时和标量场内存"""
+    w, h = size
+    print(f"🔬 渐变方向微基准 ({w}x{h}, 每项 {frames} 帧)")
+    print(f"{'方向':<18}{'构建(ms)':>10}{'混合(ms)':>10}{'标量场(MB)':>12}  可分离")
+    print("-" * 60)
+
+    colors = ColorManager.get_gradient_colors(4)
+    gradient = np.empty((h, w, 3), dtype=np.float32)
+    for direction in FastGradientGenerator.DIRECTIONS:
+        start_time = time.perf_counter()
+        for _ in range(frames):
+            fields = CoordinateFieldCache._build_fields(w, h, direction)
+        build = (time.perf_counter() - start_time) / frames
+
+        CoordinateFieldCache.get(w, h, direction)
+        start_time = time.perf_counter()
+        for _ in range(frames):
+            FastGradientGenerator.fill_gradient(gradient, colors, direction)
+        blend = (time.perf_counter() - start_time) / frames
+
+        field_bytes = sum(field.nbytes for field in fields)
+        separable = all(field.size < w * h for field in fields)
+        print(f"{direction:<18}{build * 1000:>10.2f}{blend * 1000:>10.2f}"
+              f"{field_bytes / 1024 / 1024:>12.2f}  {'是' if separable else '否'}")
+
+
+def benchmark_noise_bank(frames: int = 20, size: Tuple[int, int] = (1920, 1080)):
+    """噪声基准测试：逐帧采样整帧高斯噪声 vs 噪声纹理库平铺"""
+    w, h = size
+    print(f"🔬 噪声纹理库基准测试 ({w}x{h}, {frames} 帧)")
+    print("=" * 30)
+    rng = np.random.default_rng()
+    frame = np.zeros((h, w, 3), dtype=np.float32)
+
+    start_time = time.perf_counter()
+    for _ in range(frames):
+        frame += rng.standard_normal(frame.shape, dtype=np.float32) * 25
+    fresh = (time.perf_counter() - start_time) / frames
+
+    NoiseBank.load()
+    start_time = time.perf_counter()
+    for _ in range(frames):
+        NoiseBank.add_noise(frame, 25, rng)
+    banked = (time.perf_counter() - start_time) / frames
+
+    print(f"  逐帧采样: {fresh * 1000:6.2f}ms")
+    print(f"  纹理库:   {banked * 1000:6.2f}ms  加速: {fresh / banked:.1f}x")
+
+
+def benchmark_splats(frames: int = 5, size: Tuple[int, int] = (1920, 1080), counts=(25, 1000, 5000, 20000)):
+    """气泡基准测试：逐个 ImageDraw.ellipse 画到叠加层再合成 vs SplatLayer 按包围盒抗锯齿混合（散景气泡，含半数高光）"""
+    w, h = size
+    print(f"🔬 气泡光栅化基准测试 ({w}x{h}, {frames} 帧)")
+    print("=" * 30)
+    frame = Image.new('RGB', (w, h), (128, 128, 128))
+
+    for count in counts:
+        drawer = FastElementDrawer(None, w, h, SeededRandom(0))
+        drawer.add_bokeh_fast(count)
+        cx, cy, radius, rgba = (np.concatenate(column).tolist() for column in zip(*drawer.splats._batches))
+
+        start_time = time.perf_counter()
+        for _ in range(frames):
+            overlay = Image.new('RGBA', (w, h), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(overlay)
+            for x, y, r, color in zip(cx, cy, radius, rgba):
+                draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(color))
+            Image.alpha_composite(frame.convert('RGBA'), overlay).convert('RGB')
+        per_element = (time.perf_counter() - start_time) / frames
+
+        start_time = time.perf_counter()
+        for _ in range(frames):
+            drawer.splats.composite(frame.copy())
+        splatted = (time.perf_counter() - start_time) / frames
+
+        print(f"  {count:>6} 个: 逐个绘制 {per_element * 1000:7.2f}ms  批量混合 {splatted * 1000:7.2f}ms")
+
+
+def benchmark_compositing(frames: int = 5, size: Tuple[int, int] = (1920, 1080)):
+    """合成管线基准测试：create_random_background 同款流程的逐阶段耗时，
+    对照旧流程在PIL图像上的转换链（转uint8、两次高斯模糊、RGB↔RGBA往返和 alpha_composite）
+    """
+    w, h = size
+    print(f"🔬 合成管线基准测试 ({w}x{h}, {frames} 帧)")
+    print("=" * 30)
+    generator = FastImageGenerator(ImageConfig(width=w, height=h, blur_radius=1.0, seed=0))
+    totals: Dict[str, float] = OrderedDict()
+
+    for frame_id in range(frames):
+        compositor = generator.compose_frame(rng=generator.frame_rng(frame_id))
+        compositor.blur(0.8, 'final_blur')
+        compositor.to_image()
+        for name, seconds in compositor.timings.items():
+            totals[name] = totals.get(name, 0.0) + seconds
+
+    for name, seconds in totals.items():
+        print(f"  {name:<12} {seconds / frames * 1000:7.2f}ms")
+    print(f"  {'合计':<12} {sum(totals.values()) / frames * 1000:7.2f}ms")
+
+    overlay = Image.new('RGBA', (w, h), (0, 0, 0, 0))
+    ImageDraw.Draw(overlay).line([0, 0, w, h], fill=(255, 255, 255, 40), width=2)
+    gradient = FrameBufferArena.current().get('gradient', (h, w, 3))
+    start_time = time.perf_counter()
+    for _ in range(frames):
+        frame = np.empty((h, w, 3), dtype=np.uint8)
+        np.copyto(frame, gradient, casting='unsafe')
+        img = Image.fromarray(frame, 'RGB').filter(ImageFilter.GaussianBlur(radius=1.0))
+        img = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
+        img.convert('RGBA').filter(ImageFilter.GaussianBlur(radius=0.8)).convert('RGB')
+    legacy = (time.perf_counter() - start_time) / frames
+    print(f"  旧转换链(不含渐变/元素) {legacy * 1000:7.2f}ms")
+
+
+def benchmark_blur_backends(frames: int = 3, size: Tuple[int, int] = (1920, 1080),
+                            sigmas=(0.8, 1.0, 2.0, 4.0, 8.0)):
+    """模糊后端基准测试：各后端耗时，以及相对精确高斯的误差（8位色阶的平均/最大绝对误差和PSNR）"""
+    w, h = size
+    print(f"🔬 模糊后端基准测试 ({w}x{h}, {frames} 帧取最快)")
+    print("=" * 30)
+    generator = FastImageGenerator(ImageConfig(width=w, height=h, blur_radius=0, seed=0))
+    source = generator.compose_frame(rng=generator.frame_rng(0))
+    source.flatten()
+    source = source.frame.copy()
+    work = np.empty_like(source)
+
+    for sigma in sigmas:
+        results = {}
+        for backend in FrameCompositor.BLUR_BACKENDS:
+            best = float('inf')
+            for _ in range(frames):
+                np.copyto(work, source)
+                compositor = FrameCompositor(work)
+                compositor.blur(sigma, backend=backend)
+                best = min(best, compositor.timings['blur'])
+            results[backend] = (best, work.copy())
+
+        exact = results['gaussian'][1]
+        print(f"  σ={sigma:g}")
+        for backend, (seconds, blurred) in results.items():
+            error = np.abs(blurred - exact)
+            mse = float(np.mean(error * error))
+            psnr = 10 * math.log10(255 ** 2 / mse) if mse > 0 else float('inf')
+            speedup = results['gaussian'][0] / seconds
+            print(f"    {backend:<10} {seconds * 1000:7.2f}ms  x{speedup:4.1f}  "
+                  f"平均误差 {error.mean():5.2f}  最大误差 {error.max():6.2f}  PSNR {psnr:6.1f}dB")
+
+
+def _render_peak_rss(args):
+    """在工作进程中连续渲染背景，返回 (进程号, 峰值RSS MB)"""
+    width, height, frames = args
+    import resource
+    generator = FastImageGenerator(ImageConfig(width=width, height=height))
+    for _ in range(frames):
+        generator.create_fast_background()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位为KB，macOS上为字节
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return os.getpid(), peak_mb
+
+
+def benchmark_worker_memory(workers: int = 2, frames: int = 8, sizes: List[Tuple[int, int]] = None):
+    """工作进程峰值内存测试（需要resource模块，仅类Unix系统）"""
+    print("🔬 工作进程峰值内存测试")
+    print("=" * 30)
+
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        print("当前平台不支持resource模块，跳过")
+        return
+
+    if sizes is None:
+        sizes = [(1920, 1080), (3840, 2160)]
+
+    for w, h in sizes:
+        print(f"\n尺寸 {w}x{h}，每个进程 {frames} 帧:")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = dict(executor.map(_render_peak_rss, [(w, h, frames)] * workers))
+        for pid, peak_mb in results.items():
+            print(f"  进程 {pid}: 峰值RSS {peak_mb:.0f}MB")
+
+
 def create_random_background(width: int = 1920, height: int = 1080, save: bool = False,
-                             save_path: str = "random_background.png") -> Image.Image:
+                             save_path: str = "random_background.png", seed: int = None) -> Image.Image:
     """
     创建随机背景图片，优化版本
 
@@ -515,29 +2137,34 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
         height: 图片高度
         save: 是否保存图片，默认False
         save_path: 保存路径，默认为"random_background.png"
+        seed: 随机种子，相同种子生成相同图片，默认None（每次不同）
 
     返回:
         PIL.Image.Image: 生成的图片对象
     """
+    rng = SeededRandom(seed)
+
     # 创建配置，降低元素密度和增加模糊
     config = ImageConfig(
         width=width,
         height=height,
-        noise_intensity=random.uniform(0.01, 0.02),  # 适度降低噪点
-        blur_radius=random.uniform(0.8, 2.0),  # 增加模糊效果
-        element_density=random.uniform(0.8, 1.2)  # 降低元素密度
+        noise_intensity=rng.uniform(0.01, 0.02),  # 适度降低噪点
+        blur_radius=rng.uniform(0.8, 2.0),  # 增加模糊效果
+        element_density=rng.uniform(0.8, 1.2),  # 降低元素密度
+        seed=seed
     )
 
     # 确保使用所有效果但密度适中
     config.effects = ['gradient', 'bubbles', 'curves', 'particles']
 
-    # 生成图像
-    generator = FastImageGenerator(config)
-    img = generator.generate_image_fast()
+    # 生成背景和装饰元素，保持在float32工作帧上，最后只转换一次
+    generator = FastImageGenerator(config, rng)
+    compositor = generator.compose_frame()
 
-    # 转为RGBA以便添加半透明元素
-    img = img.convert('RGBA')
-    draw = ImageDraw.Draw(img)
+    # 半透明元素画在独立的RGBA图层上，再按预乘 over 合成
+    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    tiles = DirtyTiles(width, height)
+    draw = DirtyDraw(ImageDraw.Draw(overlay), tiles)
 
     # 定义中心安全区域 - 将避免在这里放置明显元素
     center_margin_x = width // 4
@@ -554,7 +2181,7 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
     cell_w, cell_h = width // grid_w, height // grid_h
 
     # 1. 添加分散的半透明几何形状(数量减少20%)
-    shape_count = random.randint(2, 6)  # 减少形状数量
+    shape_count = rng.randint(2, 6)  # 减少形状数量
 
     # 在每个网格单元中放置不超过1个形状
     used_cells = set()
@@ -566,12 +2193,12 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
         if not available_cells:
             break
 
-        cell_x, cell_y = random.choice(available_cells)
+        cell_x, cell_y = rng.choice(available_cells)
         used_cells.add((cell_x, cell_y))
 
         # 计算此单元格内的随机位置
-        base_x = cell_x * cell_w + random.randint(10, cell_w - 10)
-        base_y = cell_y * cell_h + random.randint(10, cell_h - 10)
+        base_x = cell_x * cell_w + rng.randint(10, cell_w - 10)
+        base_y = cell_y * cell_h + rng.randint(10, cell_h - 10)
 
         # 检查是否在中心安全区域
         is_in_center = (
@@ -580,19 +2207,19 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
         )
 
         # 形状类型和颜色
-        shape_type = random.choice(['rect', 'circle', 'polygon'])
+        shape_type = rng.choice(['rect', 'circle', 'polygon'])
 
         # 如果在中心区域，使用更高透明度
-        alpha = random.randint(5, 15) if is_in_center else random.randint(15, 30)
+        alpha = rng.randint(5, 15) if is_in_center else rng.randint(15, 30)
 
         # 降低颜色饱和度 - 使用更柔和的颜色
-        r = random.randint(180, 240)
-        g = random.randint(180, 240)
-        b = random.randint(180, 240)
+        r = rng.randint(180, 240)
+        g = rng.randint(180, 240)
+        b = rng.randint(180, 240)
         color = (r, g, b, alpha)
 
         if shape_type == 'rect':
-            size = random.randint(20, 100)
+            size = rng.randint(20, 100)
             x1 = base_x
             y1 = base_y
             x2 = x1 + size
@@ -600,14 +2227,14 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
             draw.rectangle([x1, y1, x2, y2], fill=color)
 
         elif shape_type == 'circle':
-            radius = random.randint(20, 80)
+            radius = rng.randint(20, 80)
             draw.ellipse([base_x - radius, base_y - radius,
                           base_x + radius, base_y + radius], fill=color)
 
         else:  # polygon
             points = []
-            sides = random.randint(3, 5)
-            radius = random.randint(20, 60)
+            sides = rng.randint(3, 5)
+            radius = rng.randint(20, 60)
             for i in range(sides):
                 angle = 2 * math.pi * i / sides
                 px = base_x + radius * math.cos(angle)
@@ -616,17 +2243,17 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
             draw.polygon(points, fill=color)
 
     # 2. 添加随机线条 (减少数量，增加透明度)
-    line_count = random.randint(4, 10)  # 减少线条数量
+    line_count = rng.randint(4, 10)  # 减少线条数量
 
     for _ in range(line_count):
         # 均匀分布线条
-        start_grid_x, start_grid_y = random.randint(0, grid_w - 1), random.randint(0, grid_h - 1)
-        end_grid_x, end_grid_y = random.randint(0, grid_w - 1), random.randint(0, grid_h - 1)
+        start_grid_x, start_grid_y = rng.randint(0, grid_w - 1), rng.randint(0, grid_h - 1)
+        end_grid_x, end_grid_y = rng.randint(0, grid_w - 1), rng.randint(0, grid_h - 1)
 
-        x1 = start_grid_x * cell_w + random.randint(10, cell_w - 10)
-        y1 = start_grid_y * cell_h + random.randint(10, cell_h - 10)
-        x2 = end_grid_x * cell_w + random.randint(10, cell_w - 10)
-        y2 = end_grid_y * cell_h + random.randint(10, cell_h - 10)
+        x1 = start_grid_x * cell_w + rng.randint(10, cell_w - 10)
+        y1 = start_grid_y * cell_h + rng.randint(10, cell_h - 10)
+        x2 = end_grid_x * cell_w + rng.randint(10, cell_w - 10)
+        y2 = end_grid_y * cell_h + rng.randint(10, cell_h - 10)
 
         # 如果线条穿过中心区域，降低其可见度
         crosses_center = (
@@ -634,19 +2261,23 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
                 (y1 <= center_box[3] and y2 >= center_box[1])
         )
 
-        line_width = random.randint(1, 3)  # 减小线宽
-        alpha = random.randint(10, 25) if crosses_center else random.randint(20, 40)
+        line_width = rng.randint(1, 3)  # 减小线宽
+        alpha = rng.randint(10, 25) if crosses_center else rng.randint(20, 40)
 
         # 使用柔和颜色
-        r = random.randint(160, 220)
-        g = random.randint(160, 220)
-        b = random.randint(160, 220)
+        r = rng.randint(160, 220)
+        g = rng.randint(160, 220)
+        b = rng.randint(160, 220)
         color = (r, g, b, alpha)
 
         draw.line([x1, y1, x2, y2], fill=color, width=line_width)
 
+    with compositor.stage('shapes'):
+        compositor.add_overlay(overlay, tiles)
+
     # 对整个图像应用轻微模糊，使元素更加柔和
-    img = img.filter(ImageFilter.GaussianBlur(radius=0.8))
+    compositor.blur(0.8, 'final_blur', config.blur_backend)
+    img = compositor.to_image()
 
     # 如果需要保存
     if save:
@@ -659,7 +2290,7 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
         img.save(save_path)
         print(f"图片已保存至: {save_path}")
 
-    return img.convert('RGB')  # 返回RGB模式的图像
+    return img
 
 # 这个版本，生成的元素太密，并且颜色太重，影响后期添加的标题
 # def create_random_background(width: int = 1920, height: int = 1080, save: bool = False,
@@ -748,10 +2379,39 @@ def create_random_background(width: int = 1920, height: int = 1080, save: bool =
 #     return img
 
 if __name__ == "__main__":
-    import sys
-
     if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
         benchmark_performance()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-gradient":
+        benchmark_gradient_cache()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-directions":
+        benchmark_gradient_directions()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-noise":
+        benchmark_noise_bank()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-splats":
+        benchmark_splats()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-compositing":
+        benchmark_compositing()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-blur":
+        benchmark_blur_backends()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-pool":
+        benchmark_pool_latency()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-transport":
+        benchmark_frame_transport()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-pipeline":
+        benchmark_pipeline()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-scheduler":
+        benchmark_scheduler()
+    elif len(sys.argv) > 1 and sys.argv[1] == "benchmark-memory":
+        benchmark_worker_memory()
+    elif len(sys.argv) > 1 and sys.argv[1] == "probe-workers":
+        # 重新测量最佳进程数并写入缓存，之后 FastBatchGenerator(probe_workers=True) 直接读取
+        print(f"最佳进程数: {FastBatchGenerator.measure_workers(refresh=True)}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "large":
+        # python py-image-bg-fast.py large [宽] [高]
+        size = [int(v) for v in sys.argv[2:4]] or [7680, 4320]
+        start = time.time()
+        path = render_large_image(*size)
+        print(f"✅ 已生成 {path}，耗时 {time.time() - start:.2f}s")
     else:
         # 正常生成
         print("🚀 快速随机背景图片生成器")
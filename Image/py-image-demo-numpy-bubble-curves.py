@@ -1,12 +1,16 @@
 import numpy as np
 from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
-import random
 import os
 import math
+import shutil
 import json
 from typing import Dict, List, Tuple, Any, Optional
 from dataclasses import dataclass, asdict
-import colorsys
+from functools import lru_cache
+
+from image_helpers import (CoordinateFieldCache, DrawRecorder, GradientLUT, PNGStreamWriter, SeededRandom,
+                           SpriteAtlas, clip_polyline)
+from perlin_noise import PerlinNoise
 
 
 @dataclass
@@ -15,12 +19,15 @@ class GenerationConfig:
     width: int = 1920  # 默认改为1920
     height: int = 1080  # 默认改为1080
     style: str = 'mixed'
-    color_scheme: str = 'pastel'
+    color_scheme: str = 'pastel'  # SCHEMES中的方案，或动态生成的 'random'（HLS类似色）、'perceptual'（OKLCh类似色）
     noise_intensity: float = 0.01
+    noise_type: str = 'standard'  # standard: 逐像素高斯噪声；perlin: 可平铺的分形梯度噪声（单通道，约快4倍）
     blur_radius: float = 0.5
     effects: List[str] = None
     element_density: float = 1.0
     export_sizes: List[Tuple[int, int]] = None
+    gradient_style: str = 'four_corner'  # 非four_corner时按该方向生成配色方案的多色标渐变
+    seed: Optional[int] = None  # 随机种子，批量生成时每张图按 (seed, 序号) 派生独立的随机流
 
     def __post_init__(self):
         if self.effects is None:
@@ -76,6 +83,126 @@ class CurveGenerator:
         return list(zip(x, y))
 
 
+class ColorSpace:
+    """向量化颜色空间转换 - HLS/HSV/RGB 与 OKLab，整组颜色一次转换
+
+    RGB 与 HLS/HSV 各分量均为 0-1 浮点，公式与 colorsys 一致；输入可为任意形状的数组，
+    RGB/OKLab 数组的最后一维为3个分量
+    """
+
+    # 线性sRGB -> LMS -> OKLab（Björn Ottosson）
+    _RGB_TO_LMS = np.array([[0.4122214708, 0.5363325363, 0.0514459929],
+                            [0.2119034982, 0.6806995451, 0.1073969566],
+                            [0.0883024619, 0.2817188376, 0.6299787005]])
+    _LMS_TO_LAB = np.array([[0.2104542553, 0.7936177850, -0.0040720468],
+                            [1.9779984951, -2.4285922050, 0.4505937099],
+                            [0.0259040371, 0.7827717662, -0.8086757660]])
+    _LAB_TO_LMS = np.array([[1.0, 0.3963377774, 0.2158037573],
+                            [1.0, -0.1055613458, -0.0638541728],
+                            [1.0, -0.0894841775, -1.2914855480]])
+    _LMS_TO_RGB = np.array([[4.0767416621, -3.3077115913, 0.2309699292],
+                            [-1.2684380046, 2.6097574011, -0.3413193965],
+                            [-0.0041960863, -0.7034186147, 1.7076147010]])
+
+    @staticmethod
+    def _hue_components(rgb: np.ndarray):
+        """rgb_to_hls/rgb_to_hsv 共用：最大值、最小值和色相"""
+        rgb = np.asarray(rgb, dtype=np.float64)
+        r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+        maxc = rgb.max(axis=-1)
+        minc = rgb.min(axis=-1)
+        rangec = maxc - minc
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rc = (maxc - r) / rangec
+            gc = (maxc - g) / rangec
+            bc = (maxc - b) / rangec
+        hue = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+        hue = np.where(rangec > 0, (hue / 6.0) % 1.0, 0.0)
+        return maxc, minc, hue
+
+    @staticmethod
+    def hls_to_rgb(h, l, s) -> np.ndarray:
+        """HLS -> RGB，返回形状为 broadcast(h, l, s) + (3,) 的数组"""
+        h, l, s = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (h, l, s)))
+        m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - l * s)
+        m1 = 2.0 * l - m2
+
+        def channel(hue):
+            hue = hue % 1.0
+            return np.select([hue < 1 / 6, hue < 0.5, hue < 2 / 3],
+                             [m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (2 / 3 - hue) * 6.0], m1)
+
+        rgb = np.stack([channel(h + 1 / 3), channel(h), channel(h - 1 / 3)], axis=-1)
+        return np.where((s == 0.0)[..., None], l[..., None], rgb)
+
+    @classmethod
+    def rgb_to_hls(cls, rgb) -> np.ndarray:
+        """RGB -> HLS，最后一维依次为 (h, l, s)"""
+        maxc, minc, hue = cls._hue_components(rgb)
+        lightness = (maxc + minc) / 2.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            saturation = np.where(lightness <= 0.5, (maxc - minc) / (maxc + minc), (maxc - minc) / (2.0 - maxc - minc))
+        saturation = np.where(maxc > minc, saturation, 0.0)
+        return np.stack([hue, lightness, saturation], axis=-1)
+
+    @staticmethod
+    def hsv_to_rgb(h, s, v) -> np.ndarray:
+        """HSV -> RGB，返回形状为 broadcast(h, s, v) + (3,) 的数组"""
+        h, s, v = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (h, s, v)))
+        sector = np.floor(h * 6.0)
+        f = h * 6.0 - sector
+        sector = sector.astype(np.int64) % 6
+        p = v * (1.0 - s)
+        q = v * (1.0 - s * f)
+        t = v * (1.0 - s * (1.0 - f))
+        table = np.stack([np.stack(channel, axis=-1) for channel in
+                          ((v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q))])
+        rgb = np.take_along_axis(table, sector[None, ..., None], axis=0)[0]
+        return np.where((s == 0.0)[..., None], v[..., None], rgb)
+
+    @classmethod
+    def rgb_to_hsv(cls, rgb) -> np.ndarray:
+        """RGB -> HSV，最后一维依次为 (h, s, v)"""
+        maxc, minc, hue = cls._hue_components(rgb)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            saturation = np.where(maxc > minc, (maxc - minc) / maxc, 0.0)
+        return np.stack([hue, saturation, maxc], axis=-1)
+
+    @staticmethod
+    def srgb_to_linear(rgb) -> np.ndarray:
+        rgb = np.asarray(rgb, dtype=np.float64)
+        return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+    @staticmethod
+    def linear_to_srgb(rgb) -> np.ndarray:
+        rgb = np.clip(np.asarray(rgb, dtype=np.float64), 0.0, 1.0)
+        return np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * rgb ** (1 / 2.4) - 0.055)
+
+    @classmethod
+    def rgb_to_oklab(cls, rgb) -> np.ndarray:
+        """sRGB -> OKLab，最后一维依次为 (L, a, b)"""
+        lms = np.cbrt(cls.srgb_to_linear(rgb) @ cls._RGB_TO_LMS.T)
+        return lms @ cls._LMS_TO_LAB.T
+
+    @classmethod
+    def oklab_to_rgb(cls, lab) -> np.ndarray:
+        """OKLab -> sRGB，超出色域的分量截断到 0-1"""
+        lms = (np.asarray(lab, dtype=np.float64) @ cls._LAB_TO_LMS.T) ** 3
+        return cls.linear_to_srgb(lms @ cls._LMS_TO_RGB.T)
+
+    @classmethod
+    def oklch_to_rgb(cls, lightness, chroma, hue) -> np.ndarray:
+        """OKLCh（hue 为 0-1 圈）-> sRGB，适合生成感知亮度一致的配色"""
+        lightness, chroma, hue = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (lightness, chroma, hue)))
+        angle = 2 * np.pi * hue
+        return cls.oklab_to_rgb(np.stack([lightness, chroma * np.cos(angle), chroma * np.sin(angle)], axis=-1))
+
+    @staticmethod
+    def to_uint8(rgb) -> np.ndarray:
+        """0-1 的RGB转成 0-255 整数（与 int(c * 255) 一样向下取整）"""
+        return (np.clip(rgb, 0.0, 1.0) * 255).astype(np.int64)
+
+
 class ColorSchemeManager:
     """配色方案管理器"""
 
@@ -111,38 +238,66 @@ class ColorSchemeManager:
         """获取配色方案"""
         return cls.SCHEMES.get(scheme, cls.SCHEMES['pastel'])
 
+    _LUT_CACHE: Dict[str, GradientLUT] = {}
+
+    @staticmethod
+    def build_lut(stops: List[np.ndarray]) -> GradientLUT:
+        """把色标列表插值成多色标查找表"""
+        return GradientLUT(stops)
+
+    @classmethod
+    def get_lut(cls, scheme: str) -> GradientLUT:
+        """获取配色方案全部颜色组成的多色标查找表（按方案缓存）"""
+        if scheme not in cls._LUT_CACHE:
+            cls._LUT_CACHE[scheme] = cls.build_lut(cls.get_colors(scheme))
+        return cls._LUT_CACHE[scheme]
+
     @classmethod
-    def generate_analogous(cls, base_hue: float, count: int = 6) -> List[np.ndarray]:
+    def generate_analogous(cls, base_hue: float, count: int = 6, rng: SeededRandom = None) -> List[np.ndarray]:
         """生成类似色配色方案"""
-        colors = []
-        for i in range(count):
-            hue = (base_hue + i * 30 / 360) % 1.0
-            saturation = 0.3 + random.random() * 0.4
-            lightness = 0.7 + random.random() * 0.2
-            rgb = colorsys.hls_to_rgb(hue, lightness, saturation)
-            colors.append(np.array([int(c * 255) for c in rgb]))
-        return colors
+        rng = rng or SeededRandom()
+        hues = (base_hue + np.arange(count) * 30 / 360) % 1.0
+        saturation = 0.3 + rng.generator.random(count) * 0.4
+        lightness = 0.7 + rng.generator.random(count) * 0.2
+        return list(ColorSpace.to_uint8(ColorSpace.hls_to_rgb(hues, lightness, saturation)))
+
+    @classmethod
+    def generate_perceptual(cls, base_hue: float, count: int = 6, rng: SeededRandom = None) -> List[np.ndarray]:
+        """生成OKLCh类似色配色方案：色相等距，感知亮度和彩度相近，各颜色看起来一样亮"""
+        rng = rng or SeededRandom()
+        hues = (base_hue + np.arange(count) * 30 / 360) % 1.0
+        lightness = 0.86 + rng.generator.random(count) * 0.06
+        chroma = 0.03 + rng.generator.random(count) * 0.04
+        return list(ColorSpace.to_uint8(ColorSpace.oklch_to_rgb(lightness, chroma, hues)))
 
 
 class AdvancedDecorator:
-    """高级装饰器类"""
+    """高级装饰器类
 
-    def __init__(self, draw: ImageDraw.Draw, width: int, height: int):
+    网格图层以每格一像素的小图记录在 layers 中，由 composite_layers 放大并混合到底图上；
+    粒子记录在 particles 中，由 composite_particles 在图层合并后一次混合。
+    两者都可以只合成画布的一段行（分带渲染）
+    """
+
+    def __init__(self, draw: ImageDraw.Draw, width: int, height: int, rng: SeededRandom = None):
         self.draw = draw
         self.width = width
         self.height = height
+        self.rng = rng or SeededRandom()
+        self.layers = []
+        self.particles = []
 
     def add_watermark_texture(self, count: int = 30, opacity: int = 10):
         """添加水印纹理"""
         for _ in range(count):
-            x = random.randint(0, self.width)
-            y = random.randint(0, self.height)
-            size = random.randint(20, 60)
-            rotation = random.randint(0, 360)
+            x = self.rng.randint(0, self.width)
+            y = self.rng.randint(0, self.height)
+            size = self.rng.randint(20, 60)
+            rotation = self.rng.randint(0, 360)
 
             # 创建简单的水印形状
             shapes = ['line', 'cross', 'diamond']
-            shape = random.choice(shapes)
+            shape = self.rng.choice(shapes)
             color = (255, 255, 255, opacity)
 
             if shape == 'line':
@@ -159,46 +314,47 @@ class AdvancedDecorator:
                 self.draw.polygon(points, outline=color, width=1)
 
     def add_gradient_grid(self, cell_size: int = 40, opacity: int = 15):
-        """添加渐变网格"""
-        for x in range(0, self.width, cell_size):
-            for y in range(0, self.height, cell_size):
-                # 随机决定是否绘制这个网格
-                if random.random() > 0.7:
-                    continue
-
-                # 创建渐变色
-                hue = random.random()
-                saturation = 0.2 + random.random() * 0.3
-                lightness = 0.8 + random.random() * 0.15
-                rgb = colorsys.hls_to_rgb(hue, lightness, saturation)
-                color = tuple([int(c * 255) for c in rgb] + [opacity])
-
-                self.draw.rectangle([x, y, x + cell_size, y + cell_size], fill=color)
+        """添加渐变网格：每格一个像素生成 (rows, cols, 4) 的小图
+
+        小图和格子大小记录在 self.layers 中，由 composite_layers 在装饰图层之下最近邻放大并一次混合，
+        耗时与格子大小无关
+        """
+        rows = -(-self.height // cell_size)
+        cols = -(-self.width // cell_size)
+        samples = self.rng.generator.random((4, rows, cols))
+
+        grid = np.empty((rows, cols, 4), dtype=np.uint8)
+        # 创建渐变色
+        grid[..., :3] = ColorSpace.to_uint8(ColorSpace.hls_to_rgb(samples[1], 0.8 + samples[3] * 0.15,
+                                                                  0.2 + samples[2] * 0.3))
+        # 随机决定是否绘制这个网格
+        grid[..., 3] = np.where(samples[0] <= 0.7, opacity, 0)
+
+        self.layers.append((grid, cell_size))
 
     def add_abstract_shapes(self, count: int = 10):
         """添加抽象形状"""
         shapes = ['blob', 'organic', 'fluid']
 
-        for _ in range(count):
-            shape_type = random.choice(shapes)
-            x = random.randint(0, self.width)
-            y = random.randint(0, self.height)
-            size = random.randint(15, 50)
-            opacity = random.randint(5, 25)
-
-            hue = random.random()
-            saturation = 0.3 + random.random() * 0.4
-            lightness = 0.7 + random.random() * 0.2
-            rgb = colorsys.hls_to_rgb(hue, lightness, saturation)
-            color = tuple([int(c * 255) for c in rgb] + [opacity])
+        # 所有形状的颜色一次采样、批量转换
+        hls = self.rng.generator.random((3, count))
+        colors = ColorSpace.to_uint8(ColorSpace.hls_to_rgb(hls[0], 0.7 + hls[1] * 0.2, 0.3 + hls[2] * 0.4))
+        opacities = self.rng.generator.integers(5, 26, count)
+
+        for rgb, opacity in zip(colors.tolist(), opacities.tolist()):
+            shape_type = self.rng.choice(shapes)
+            x = self.rng.randint(0, self.width)
+            y = self.rng.randint(0, self.height)
+            size = self.rng.randint(15, 50)
+            color = tuple(rgb) + (opacity,)
 
             if shape_type == 'blob':
                 # 创建不规则blob形状
                 points = []
-                num_points = random.randint(6, 12)
+                num_points = self.rng.randint(6, 12)
                 for i in range(num_points):
                     angle = 2 * math.pi * i / num_points
-                    radius = size * (0.7 + random.random() * 0.6)
+                    radius = size * (0.7 + self.rng.random() * 0.6)
                     px = x + radius * math.cos(angle)
                     py = y + radius * math.sin(angle)
                     points.append((px, py))
@@ -207,151 +363,220 @@ class AdvancedDecorator:
             elif shape_type == 'organic':
                 # 有机形状（多个重叠圆）
                 for i in range(3):
-                    offset_x = random.randint(-size // 2, size // 2)
-                    offset_y = random.randint(-size // 2, size // 2)
-                    radius = random.randint(size // 3, size // 2)
+                    offset_x = self.rng.randint(-size // 2, size // 2)
+                    offset_y = self.rng.randint(-size // 2, size // 2)
+                    radius = self.rng.randint(size // 3, size // 2)
                     self.draw.ellipse([
                         x + offset_x - radius, y + offset_y - radius,
                         x + offset_x + radius, y + offset_y + radius
                     ], fill=color)
 
     def add_particle_effects(self, count: int = 50):
-        """添加粒子效果"""
-        particle_types = ['dot', 'star', 'cross', 'ring']
-
-        for _ in range(count):
-            particle_type = random.choice(particle_types)
-            x = random.randint(0, self.width)
-            y = random.randint(0, self.height)
-            size = random.randint(1, 4)
-            opacity = random.randint(10, 40)
-
-            color = (200 + random.randint(-50, 50),
-                     200 + random.randint(-50, 50),
-                     200 + random.randint(-50, 50), opacity)
-
-            if particle_type == 'dot':
-                self.draw.ellipse([x - size, y - size, x + size, y + size], fill=color)
-            elif particle_type == 'star':
-                # 简单星形
-                for i in range(4):
-                    angle = i * math.pi / 2
-                    x2 = x + size * math.cos(angle)
-                    y2 = y + size * math.sin(angle)
-                    self.draw.line([(x, y), (x2, y2)], fill=color, width=1)
-            elif particle_type == 'cross':
-                self.draw.line([(x - size, y), (x + size, y)], fill=color, width=1)
-                self.draw.line([(x, y - size), (x, y + size)], fill=color, width=1)
-            elif particle_type == 'ring':
-                self.draw.ellipse([x - size, y - size, x + size, y + size], outline=color, width=1)
+        """添加粒子效果：圆点、星形、十字和圆环取自精灵图集"""
+        generator = self.rng.generator
+        kinds = generator.integers(0, len(SpriteAtlas.KINDS), count)
+        positions = generator.integers([0, 0], [self.width + 1, self.height + 1], (count, 2))
+        sizes = generator.integers(1, 5, count)
+        colors = generator.integers([150, 150, 150, 10], [251, 251, 251, 41], (count, 4))
+        self.particles.append((kinds, positions[:, 0], positions[:, 1], sizes, colors))
+
+    def composite_layers(self, img: Image.Image, top: int = 0) -> Image.Image:
+        """把记录的网格图层原地混合到不透明图像 img 上，img 第0行对应画布第 top 行
+
+        只放大 img 覆盖的那几行格子，图层的alpha作蒙版，一次 paste
+        """
+        bottom = top + img.height
+        for grid, cell_size in self.layers:
+            first = top // cell_size
+            rows = grid[first:-(-bottom // cell_size)].repeat(cell_size, axis=0)
+            rows = rows[top - first * cell_size:bottom - first * cell_size]
+            layer = Image.fromarray(np.ascontiguousarray(rows.repeat(cell_size, axis=1)[:, :img.width]), 'RGBA')
+            img.paste(layer, (0, 0), layer)
+        return img
+
+    def composite_particles(self, img: Image.Image, top: int = 0) -> Image.Image:
+        """把记录的粒子原地混合到不透明图像 img 上，img 第0行对应画布第 top 行"""
+        for kinds, cx, cy, sizes, colors in self.particles:
+            SpriteAtlas.blit(img, kinds, cx, cy - top, sizes, colors)
+        return img
 
     def add_curve_patterns(self, count: int = 8):
         """添加曲线图案"""
         curve_gen = CurveGenerator()
 
         for _ in range(count):
-            curve_type = random.choice(['bezier', 'sine', 'spiral', 'lissajous', 'rose'])
-            opacity = random.randint(10, 30)
-            color = (180 + random.randint(-30, 30),
-                     180 + random.randint(-30, 30),
-                     180 + random.randint(-30, 30), opacity)
+            curve_type = self.rng.choice(['bezier', 'sine', 'spiral', 'lissajous', 'rose'])
+            opacity = self.rng.randint(10, 30)
+            color = (180 + self.rng.randint(-30, 30),
+                     180 + self.rng.randint(-30, 30),
+                     180 + self.rng.randint(-30, 30), opacity)
 
             if curve_type == 'bezier':
-                p0 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
-                p1 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
-                p2 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
-                p3 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
+                p0 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
+                p1 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
+                p2 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
+                p3 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
                 points = curve_gen.bezier_curve(p0, p1, p2, p3, 50)
-                for i in range(len(points) - 1):
-                    p1_coords = (int(points[i][0]), int(points[i][1]))
-                    p2_coords = (int(points[i + 1][0]), int(points[i + 1][1]))
-                    if (0 <= p1_coords[0] < self.width and 0 <= p1_coords[1] < self.height and
-                            0 <= p2_coords[0] < self.width and 0 <= p2_coords[1] < self.height):
-                        self.draw.line([p1_coords, p2_coords], fill=color, width=1)
 
             elif curve_type == 'sine':
-                start_x = random.randint(0, self.width // 2)
-                start_y = random.randint(0, self.height)
-                length = random.randint(50, 150)
-                amplitude = random.randint(10, 30)
-                frequency = random.uniform(0.5, 2.0)
+                start_x = self.rng.randint(0, self.width // 2)
+                start_y = self.rng.randint(0, self.height)
+                length = self.rng.randint(50, 150)
+                amplitude = self.rng.randint(10, 30)
+                frequency = self.rng.uniform(0.5, 2.0)
                 points = curve_gen.sine_wave(start_x, start_y, length, amplitude, frequency)
-                for i in range(len(points) - 1):
-                    p1_coords = (int(points[i][0]), int(points[i][1]))
-                    p2_coords = (int(points[i + 1][0]), int(points[i + 1][1]))
-                    if (0 <= p1_coords[0] < self.width and 0 <= p1_coords[1] < self.height and
-                            0 <= p2_coords[0] < self.width and 0 <= p2_coords[1] < self.height):
-                        self.draw.line([p1_coords, p2_coords], fill=color, width=1)
 
             elif curve_type == 'spiral':
-                center_x = random.randint(50, self.width - 50)
-                center_y = random.randint(50, self.height - 50)
-                max_radius = random.randint(20, 40)
-                turns = random.uniform(1, 3)
+                center_x = self.rng.randint(50, self.width - 50)
+                center_y = self.rng.randint(50, self.height - 50)
+                max_radius = self.rng.randint(20, 40)
+                turns = self.rng.uniform(1, 3)
                 points = curve_gen.spiral(center_x, center_y, max_radius, turns)
-                for i in range(len(points) - 1):
-                    p1_coords = (int(points[i][0]), int(points[i][1]))
-                    p2_coords = (int(points[i + 1][0]), int(points[i + 1][1]))
-                    if (0 <= p1_coords[0] < self.width and 0 <= p1_coords[1] < self.height and
-                            0 <= p2_coords[0] < self.width and 0 <= p2_coords[1] < self.height):
-                        self.draw.line([p1_coords, p2_coords], fill=color, width=1)
+
+            else:
+                continue
+
+            # 裁剪到画布，每条可见折线一次 draw.line 调用
+            for run in clip_polyline(points, self.width, self.height, 0.5):
+                self.draw.line(run.ravel().tolist(), fill=color, width=1, joint='curve')
 
 
 class EffectsProcessor:
     """效果处理器"""
 
+    # perlin噪声未指定种子时从这些种子中随机选择，保证 PerlinNoise 的表缓存能命中
+    NOISE_SEED_POOL = 16
+    # 标准噪声每次从随机源取这么多行；分带渲染的带高取它的整数倍，随机序列才与整帧一致
+    NOISE_BAND_ROWS = 256
+    DEPTH_SCALE = 8  # 景深图相对原图的缩小倍数
+    DEPTH_LEVEL_GAIN = 10 / 3  # blur_map_intensity 到金字塔最深层级的倍数，默认0.3对应第1层
+
+    # 光源衰减曲线：t 为到光心的距离 / 半径（0-1），返回相对亮度
+    LIGHT_FALLOFFS = {
+        'linear': lambda t: 1.0 - t,
+        'quadratic': lambda t: (1.0 - t) ** 2,
+        'smooth': lambda t: (1.0 - t * t) ** 2,
+        'gaussian': lambda t: np.exp(-4.0 * t * t) * (1.0 - t),
+    }
+
     @staticmethod
-    def add_lighting_effects(img: Image.Image, light_count: int = 3) -> Image.Image:
-        """添加光影效果"""
-        overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
+    @lru_cache(maxsize=512)
+    def light_mask(radius: int, intensity: int, falloff: str) -> Image.Image:
+        """(2r+1)² 的光源蒙版：intensity · curve(d / radius)，超出半径为0"""
+        offsets = np.arange(-radius, radius + 1, dtype=np.float32)
+        t = np.minimum(np.hypot(offsets[:, None], offsets[None, :]) / radius, 1.0)
+        alpha = EffectsProcessor.LIGHT_FALLOFFS[falloff](t) * intensity
+        return Image.fromarray(np.rint(alpha).astype(np.uint8), 'L')
 
-        for _ in range(light_count):
-            x = random.randint(0, img.width)
-            y = random.randint(0, img.height)
-            radius = random.randint(30, 80)
-            intensity = random.randint(5, 15)
+    @staticmethod
+    def add_lighting_effects(img: Image.Image, light_count: int = 3, rng: SeededRandom = None,
+                             falloff: str = 'smooth') -> Image.Image:
+        """添加光影效果：每个光源用解析径向衰减的蒙版只在自身包围盒内原地向白色混合
 
-            # 创建径向渐变光源
-            for r in range(radius, 0, -5):
-                alpha = max(0, intensity - (radius - r) // 3)
-                color = (255, 255, 255, alpha)
-                draw.ellipse([x - r, y - r, x + r, y + r], fill=color)
+        falloff 为 LIGHT_FALLOFFS 中的衰减曲线；不再分配整帧叠加层，光源数量可以到几十个
+        """
+        if falloff not in EffectsProcessor.LIGHT_FALLOFFS:
+            raise ValueError(f"未知的光源衰减曲线: {falloff}")
+        lights = EffectsProcessor.sample_lights(img.width, img.height, light_count, rng)
+        return EffectsProcessor.paint_lights(img, lights, falloff)
 
-        return Image.alpha_composite(img.convert('RGBA'), overlay)
+    @staticmethod
+    def sample_lights(width: int, height: int, light_count: int = 3,
+                      rng: SeededRandom = None) -> List[Tuple[int, int, int, int]]:
+        """采样光源 (x, y, 半径, 强度)"""
+        rng = rng or SeededRandom()
+        lights = []
+        for _ in range(light_count):
+            x = rng.randint(0, width)
+            y = rng.randint(0, height)
+            radius = rng.randint(30, 80)
+            intensity = rng.randint(5, 15)
+            lights.append((x, y, radius, intensity))
+        return lights
 
     @staticmethod
-    def add_depth_blur(img: Image.Image, blur_map_intensity: float = 0.3) -> Image.Image:
-        """添加景深模糊效果"""
-        # 创建深度图
-        depth_map = Image.new('L', img.size, 128)
-        draw = ImageDraw.Draw(depth_map)
+    def paint_lights(img: Image.Image, lights: List[Tuple[int, int, int, int]], falloff: str = 'smooth',
+                     top: int = 0) -> Image.Image:
+        """把光源原地向白色混合到 img 上，img 第0行对应画布第 top 行"""
+        white = (255,) * len(img.getbands())
+        for x, y, radius, intensity in lights:
+            # 径向渐变光源，paste 在C层按蒙版混合并裁剪到画布内
+            img.paste(white, (x - radius, y - radius - top), EffectsProcessor.light_mask(radius, intensity, falloff))
+        return img
 
-        # 添加一些深度变化
-        for _ in range(5):
-            x = random.randint(0, img.width)
-            y = random.randint(0, img.height)
-            radius = random.randint(50, 150)
-            intensity = random.randint(50, 200)
+    @staticmethod
+    def add_depth_blur(img: Image.Image, blur_map_intensity: float = 0.3, rng: SeededRandom = None,
+                       spots: List[Tuple[float, float, float, int]] = None) -> Image.Image:
+        """添加景深模糊效果：按深度场在下采样模糊金字塔的相邻层级之间逐像素插值
+
+        金字塔第k层为 2^k 倍盒式下采样，每层再做半径1的高斯平滑，放大后没有块状痕迹。
+        从最粗的层级开始，每级把结果双线性放大2倍，再按混合蒙版叠上该层级，
+        只有最后一级在原尺寸上运算；深度场在1/8分辨率上计算。
+        最模糊处的层级为 blur_map_intensity·DEPTH_LEVEL_GAIN：默认0.3对应第1层，
+        观感与原先"原图和半径2高斯模糊按深度图混合"一致；调高 intensity 得到更强的景深
+        """
+        scale = EffectsProcessor.DEPTH_SCALE
+        small_size = (max(1, img.width // scale), max(1, img.height // scale))
+        if spots is None:
+            spots = EffectsProcessor.sample_depth_spots(img.width, img.height, rng)
+
+        # 创建深度图（值越大越清晰），在小图上绘制并平滑，得到渐变的景深
+        depth_map = Image.new('L', small_size, 128)
+        draw = ImageDraw.Draw(depth_map)
+        for x, y, radius, intensity in spots:
             draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=intensity)
+        depth_map = depth_map.filter(ImageFilter.GaussianBlur(radius=2))
+
+        max_level = max(0.0, blur_map_intensity * EffectsProcessor.DEPTH_LEVEL_GAIN)
+        level = (1.0 - np.asarray(depth_map, dtype=np.float32) / 255.0) * max_level
+
+        # 模糊金字塔（不透明图像按RGB处理，更快）
+        pyramid = [img.convert('RGB')]
+        while len(pyramid) <= math.ceil(max_level) and min(pyramid[-1].size) >= 2:
+            pyramid.append(pyramid[-1].reduce(2).filter(ImageFilter.GaussianBlur(radius=1)))
+
+        # 由粗到细：第k层按 clip(k + 1 - level, 0, 1) 叠加到放大后的结果上
+        result = pyramid[-1]
+        for k in range(len(pyramid) - 2, -1, -1):
+            result = result.resize(pyramid[k].size, Image.BILINEAR)
+            weight = np.clip(k + 1 - level, 0.0, 1.0)
+            if weight.any():
+                mask = Image.fromarray(np.rint(weight * 255).astype(np.uint8), 'L')
+                result = Image.composite(pyramid[k], result, mask.resize(pyramid[k].size, Image.BILINEAR))
+        return result.convert(img.mode)
 
-        # 应用模糊
-        blurred = img.filter(ImageFilter.GaussianBlur(radius=2))
-
-        # 根据深度图混合原图和模糊图
-        result = Image.composite(img, blurred, depth_map)
-        return result
+    @staticmethod
+    def sample_depth_spots(width: int, height: int, rng: SeededRandom = None) -> List[Tuple[float, float, float, int]]:
+        """采样深度图上的5个深度变化 (x, y, 半径, 清晰度)，坐标已换算到 1/DEPTH_SCALE 的深度图上"""
+        rng = rng or SeededRandom()
+        scale = EffectsProcessor.DEPTH_SCALE
+        spots = []
+        for _ in range(5):
+            x = rng.randint(0, width) / scale
+            y = rng.randint(0, height) / scale
+            radius = rng.randint(50, 150) / scale
+            intensity = rng.randint(50, 200)
+            spots.append((x, y, radius, intensity))
+        return spots
 
     @staticmethod
-    def add_color_overlay(img: Image.Image, blend_mode: str = 'multiply') -> Image.Image:
-        """添加色彩叠加"""
-        overlay_color = (
-            random.randint(200, 255),
-            random.randint(200, 255),
-            random.randint(200, 255),
+    def sample_overlay_color(rng: SeededRandom = None) -> Tuple[int, int, int, int]:
+        """采样色彩叠加的RGBA颜色"""
+        rng = rng or SeededRandom()
+        return (
+            rng.randint(200, 255),
+            rng.randint(200, 255),
+            rng.randint(200, 255),
             30
         )
 
+    @staticmethod
+    def add_color_overlay(img: Image.Image, blend_mode: str = 'multiply', rng: SeededRandom = None,
+                          overlay_color: Tuple[int, int, int, int] = None) -> Image.Image:
+        """添加色彩叠加（逐像素运算，可以按行带分别处理）"""
+        if overlay_color is None:
+            overlay_color = EffectsProcessor.sample_overlay_color(rng)
+
         overlay = Image.new('RGBA', img.size, overlay_color)
 
         if blend_mode == 'multiply':
@@ -366,37 +591,80 @@ class EffectsProcessor:
         return result
 
     @staticmethod
-    def add_dynamic_noise(img_array: np.ndarray, noise_type: str = 'perlin') -> np.ndarray:
-        """添加动态噪声"""
+    def add_dynamic_noise(img_array: np.ndarray, noise_type: str = 'perlin', strength: float = 10.0,
+                          seed: int = None, band_rows: int = NOISE_BAND_ROWS, rng: SeededRandom = None) -> np.ndarray:
+        """添加动态噪声，按行带原地写回uint8数组并返回该数组
+
+        perlin: 可平铺的分形梯度噪声，单通道生成、混合时广播到RGB三个通道，取值在[-strength, strength]
+        其他: 逐像素逐通道的高斯噪声（标准差5），每 band_rows 行从 rng 取一次
+        """
+        h, w = img_array.shape[:2]
+        rng = rng or SeededRandom()
         if noise_type == 'perlin':
-            # 简化的柏林噪声模拟
-            noise = np.zeros(img_array.shape[:2], dtype=np.float32)
-            for octave in range(3):
-                freq = 2 ** octave
-                amplitude = 1.0 / (2 ** octave)
-
-                x = np.arange(img_array.shape[1]) * freq / img_array.shape[1]
-                y = np.arange(img_array.shape[0]) * freq / img_array.shape[0]
-                X, Y = np.meshgrid(x, y)
-
-                octave_noise = amplitude * np.sin(2 * np.pi * X) * np.cos(2 * np.pi * Y)
-                noise = noise + octave_noise.astype(np.float32)
-
-            # 标准化噪声到合理范围
-            if noise.max() != noise.min():
-                noise = (noise - noise.min()) / (noise.max() - noise.min()) * 20 - 10
-            else:
-                noise = np.zeros_like(noise)
-
-            # 扩展到RGB三个通道
-            noise_3d = np.stack([noise, noise, noise], axis=2)
-            result = img_array.astype(np.float32) + noise_3d
+            if seed is None:
+                seed = rng.randrange(EffectsProcessor.NOISE_SEED_POOL)
+            EffectsProcessor.add_perlin_rows(img_array, EffectsProcessor.perlin_levels(w, h, strength, seed),
+                                             band_rows=band_rows)
         else:
             # 标准随机噪声
-            noise = np.random.normal(0, 5, img_array.shape).astype(np.float32)
-            result = img_array.astype(np.float32) + noise
+            for top in range(0, h, band_rows):
+                band = img_array[top:top + band_rows]
+                buf = rng.generator.standard_normal(band.shape, dtype=np.float32)
+                buf *= 5
+                buf += band
+                np.clip(buf, 0, 255, out=buf)
+                np.copyto(band, buf, casting='unsafe')
+
+        return img_array
 
-        return np.clip(result, 0, 255).astype(np.uint8)
+    @staticmethod
+    def perlin_levels(w: int, h: int, strength: float = 10.0, seed: int = 0) -> Image.Image:
+        """1/4分辨率的Perlin噪声灰阶图，128为零点，取值在[128 - strength, 128 + strength]
+
+        最细一层每格仍有上百像素，在1/4分辨率上生成，量化为灰阶后双线性放大，误差不超过1个灰阶
+        """
+        noise = PerlinNoise(seed).tileable(max(1, w // 4), period=4, octaves=3, height=max(1, h // 4))
+        peak = np.abs(noise).max()
+        if peak > 0:
+            noise *= np.float32(strength / peak)
+        noise += 128
+        np.clip(noise, 0, 255, out=noise)
+        return Image.fromarray(np.rint(noise).astype(np.uint8), 'L')
+
+    @staticmethod
+    def add_perlin_rows(img_array: np.ndarray, levels: Image.Image, top: int = 0, height: int = None,
+                        band_rows: int = NOISE_BAND_ROWS) -> np.ndarray:
+        """把 levels 双线性放大到整帧（高 height，默认为 img_array 的行数）后的偏移加到 img_array 上
+
+        img_array 第0行对应整帧第 top 行；每个行带只放大自己的行（resize 的 box 参数），
+        单通道int16偏移混合时广播到RGB，结果与整帧放大后再切片相同
+        """
+        rows, w = img_array.shape[:2]
+        height = height or rows
+        small_w, small_h = levels.size
+        for start in range(0, rows, band_rows):
+            band = img_array[start:start + band_rows]
+            y0, y1 = top + start, top + start + len(band)
+            band_levels = levels.resize((w, len(band)), Image.BILINEAR,
+                                        box=(0, y0 * small_h / height, small_w, y1 * small_h / height))
+            buf = band.astype(np.int16)
+            buf += (np.asarray(band_levels, dtype=np.int16) - np.int16(128))[:, :, None]
+            np.clip(buf, 0, 255, out=buf)
+            np.copyto(band, buf, casting='unsafe')
+        return img_array
+
+
+@dataclass
+class BackgroundPlan:
+    """一张背景的全部随机采样结果，由 EnhancedBackgroundGenerator.render_rows 按行区间光栅化"""
+    config: GenerationConfig
+    gradient: Tuple[str, Any]  # ('four_corner', 四个角的颜色) 或 (方向, GradientLUT)
+    decorator: AdvancedDecorator  # 网格图层和粒子
+    recorder: DrawRecorder  # 装饰图层的绘制调用
+    lights: List[Tuple[int, int, int, int]] = None
+    depth_spots: List[Tuple[float, float, float, int]] = None
+    overlay_color: Tuple[int, int, int, int] = None
+    noise_levels: Image.Image = None  # perlin 噪声的1/4分辨率灰阶图，标准噪声为None
 
 
 class EnhancedBackgroundGenerator:
@@ -407,41 +675,79 @@ class EnhancedBackgroundGenerator:
         self.color_manager = ColorSchemeManager()
         self.curve_gen = CurveGenerator()
 
-    def create_gradient_fast(self, w: int, h: int, colors: List[np.ndarray]) -> np.ndarray:
-        """快速生成渐变图像"""
+    def create_gradient_fast(self, w: int, h: int, colors: List[np.ndarray], band_rows: int = 256,
+                             top: int = 0, bottom: int = None) -> np.ndarray:
+        """快速生成渐变图像的 [top, bottom) 行，按行带计算float32双线性插值并直接写入uint8输出"""
         if len(colors) < 4:
             colors = colors * (4 // len(colors) + 1)
 
-        top_left, top_right, bottom_left, bottom_right = colors[:4]
-        x = np.linspace(0, 1, w)
-        y = np.linspace(0, 1, h)
-        X, Y = np.meshgrid(x, y)
-
-        top = top_left[None, None, :] * (1 - X[:, :, None]) + top_right[None, None, :] * X[:, :, None]
-        bottom = bottom_left[None, None, :] * (1 - X[:, :, None]) + bottom_right[None, None, :] * X[:, :, None]
-        gradient = top * (1 - Y[:, :, None]) + bottom * Y[:, :, None]
+        top_left, top_right, bottom_left, bottom_right = [np.asarray(c, dtype=np.float32) for c in colors[:4]]
+        x = np.linspace(0, 1, w, dtype=np.float32)[:, None]
+        y = np.linspace(0, 1, h, dtype=np.float32)[top:bottom]
+
+        # 上下边只是 (w, 3) 的行向量，逐行带 top + (bottom - top) * y
+        upper = top_left + (top_right - top_left) * x
+        delta = (bottom_left + (bottom_right - bottom_left) * x) - upper
+
+        gradient = np.empty((len(y), w, 3), dtype=np.uint8)
+        band = np.empty((min(band_rows, len(y)), w, 3), dtype=np.float32)
+        for start in range(0, len(y), band_rows):
+            rows = y[start:start + band_rows]
+            buf = band[:len(rows)]
+            np.multiply(rows[:, None, None], delta, out=buf)
+            buf += upper
+            np.clip(buf, 0, 255, out=buf)
+            gradient[start:start + len(rows)] = buf
+
+        return gradient
+
+    def create_gradient_lut(self, w: int, h: int, lut: GradientLUT, direction: str = 'diagonal',
+                            top: int = 0, bottom: int = None) -> np.ndarray:
+        """多色标渐变的 [top, bottom) 行：标量场查表，色标数量不影响逐像素开销
+
+        整帧的下标场由 CoordinateFieldCache 按字节数限额缓存（uint16），水平/垂直方向只存一行/一列；
+        部分行（分带渲染）按需计算，不进入缓存
+        """
+        bottom = h if bottom is None else bottom
+        if top == 0 and bottom == h:
+            indices = CoordinateFieldCache.get_indices(w, h, direction, lut.size)
+        else:
+            field = CoordinateFieldCache.get_band(w, h, direction, top, bottom)[0]
+            indices = CoordinateFieldCache.quantize(field, lut.size)
+        return lut.fill(np.empty((bottom - top, w, 3), dtype=np.uint8), indices)
 
-        return np.clip(gradient, 0, 255).astype(np.uint8)
+    def plan_background(self, config: GenerationConfig = None, rng: SeededRandom = None) -> BackgroundPlan:
+        """完成一张背景的全部随机采样（配色、装饰元素、光影、景深、色彩叠加、噪声种子），不分配整帧图像
 
-    def create_background(self, config: GenerationConfig = None) -> Image.Image:
-        """创建背景图像"""
+        装饰图层的绘制调用记录在 DrawRecorder 中，之后由 render_rows 按任意行区间光栅化；
+        标准噪声在光栅化时按行从 rng 取，所以同一 plan 必须从上到下渲染一次
+        """
         if config:
             self.config = config
 
         w, h = self.config.width, self.config.height
+        rng = rng or SeededRandom(self.config.seed)
 
-        # 1. 创建基础渐变
+        # 1. 基础渐变的配色
         colors = self.color_manager.get_colors(self.config.color_scheme)
         if self.config.color_scheme == 'random':
-            colors = self.color_manager.generate_analogous(random.random())
+            colors = self.color_manager.generate_analogous(rng.random(), rng=rng)
+        elif self.config.color_scheme == 'perceptual':
+            colors = self.color_manager.generate_perceptual(rng.random(), rng=rng)
 
-        gradient = self.create_gradient_fast(w, h, random.sample(colors, min(4, len(colors))))
-        base_img = Image.fromarray(gradient.astype(np.uint8), 'RGB')
+        if self.config.gradient_style == 'four_corner':
+            gradient = ('four_corner', rng.sample(colors, min(4, len(colors))))
+        else:
+            # 配色方案的全部颜色依次作为色标
+            if self.config.color_scheme in ('random', 'perceptual'):
+                lut = self.color_manager.build_lut(colors)
+            else:
+                lut = self.color_manager.get_lut(self.config.color_scheme)
+            gradient = (self.config.gradient_style, lut)
 
-        # 2. 创建装饰图层
-        overlay = Image.new('RGBA', (w, h), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
-        decorator = AdvancedDecorator(draw, w, h)
+        # 2. 装饰图层：绘制调用先记录下来
+        recorder = DrawRecorder()
+        decorator = AdvancedDecorator(recorder, w, h, rng)
 
         # 3. 根据配置添加效果
         density_factor = self.config.element_density
@@ -458,39 +764,132 @@ class EnhancedBackgroundGenerator:
             elif effect == 'curves':
                 decorator.add_curve_patterns(count=int(8 * density_factor))
             elif effect == 'bubbles':
-                self.add_bubbles(draw, w, h, count=int(15 * density_factor))
+                self.add_bubbles(recorder, w, h, count=int(15 * density_factor), rng=rng)
             elif effect == 'dots':
-                self.add_dots(draw, w, h, count=int(25 * density_factor))
+                self.add_dots(recorder, w, h, count=int(25 * density_factor), rng=rng)
 
-        # 4. 合并图层
-        final_img = Image.alpha_composite(base_img.convert('RGBA'), overlay)
+        plan = BackgroundPlan(self.config, gradient, decorator, recorder)
 
-        # 5. 应用后处理效果
+        # 4. 后处理效果的随机参数
         if 'lighting' in self.config.effects:
-            final_img = EffectsProcessor.add_lighting_effects(final_img)
+            plan.lights = EffectsProcessor.sample_lights(w, h, rng=rng)
         if 'depth_blur' in self.config.effects:
-            final_img = EffectsProcessor.add_depth_blur(final_img)
+            plan.depth_spots = EffectsProcessor.sample_depth_spots(w, h, rng)
         if 'color_overlay' in self.config.effects:
-            final_img = EffectsProcessor.add_color_overlay(final_img)
+            plan.overlay_color = EffectsProcessor.sample_overlay_color(rng)
+        if self.config.noise_intensity > 0 and self.config.noise_type == 'perlin':
+            plan.noise_levels = EffectsProcessor.perlin_levels(
+                w, h, seed=rng.randrange(EffectsProcessor.NOISE_SEED_POOL))
+        return plan
 
-        # 6. 添加模糊和噪声
-        if self.config.blur_radius > 0:
-            final_img = final_img.filter(ImageFilter.GaussianBlur(radius=self.config.blur_radius))
+    @staticmethod
+    def blur_halo(radius: float) -> int:
+        """GaussianBlur(radius) 的影响范围（行）：Pillow 用三遍盒式模糊，每遍最多延伸 ⌈radius⌉+1 行"""
+        return 3 * (math.ceil(radius) + 1) if radius > 0 else 0
+
+    def render_rows(self, plan: BackgroundPlan, top: int, bottom: int, rng: SeededRandom) -> Image.Image:
+        """把 plan 的 [top, bottom) 行光栅化成RGB图像
+
+        上下各多算 blur_halo 行再裁掉，带间没有接缝；景深模糊需要整帧，只能 top=0、bottom=高度
+        """
+        config = plan.config
+        w, h = config.width, config.height
+        halo = self.blur_halo(config.blur_radius)
+        t0, b0 = max(0, top - halo), min(h, bottom + halo)
+        if plan.depth_spots is not None and (t0, b0) != (0, h):
+            raise ValueError("景深模糊需要整帧渲染")
+
+        # 1. 基础渐变
+        style, colors = plan.gradient
+        if style == 'four_corner':
+            gradient = self.create_gradient_fast(w, h, colors, top=t0, bottom=b0)
+        else:
+            gradient = self.create_gradient_lut(w, h, colors, style, top=t0, bottom=b0)
+        base_img = Image.fromarray(gradient, 'RGB')
 
-        if self.config.noise_intensity > 0:
+        # 2. 合并图层
+        overlay = Image.new('RGBA', (w, b0 - t0), (0, 0, 0, 0))
+        plan.recorder.replay(ImageDraw.Draw(overlay), t0, b0)
+        plan.decorator.composite_layers(base_img, t0)
+        final_img = Image.alpha_composite(base_img.convert('RGBA'), overlay)
+        plan.decorator.composite_particles(final_img, t0)
+
+        # 3. 后处理效果
+        if plan.lights is not None:
+            EffectsProcessor.paint_lights(final_img, plan.lights, top=t0)
+        if plan.depth_spots is not None:
+            final_img = EffectsProcessor.add_depth_blur(final_img, spots=plan.depth_spots)
+        if plan.overlay_color is not None:
+            final_img = EffectsProcessor.add_color_overlay(final_img, overlay_color=plan.overlay_color)
+
+        # 4. 模糊后裁掉 halo，再加噪声
+        if config.blur_radius > 0:
+            final_img = final_img.filter(ImageFilter.GaussianBlur(radius=config.blur_radius))
+        if (t0, b0) != (top, bottom):
+            final_img = final_img.crop((0, top - t0, w, bottom - t0))
+
+        if config.noise_intensity > 0:
             img_array = np.array(final_img.convert('RGB'))
-            img_array = EffectsProcessor.add_dynamic_noise(img_array, 'standard')
+            if plan.noise_levels is not None:
+                EffectsProcessor.add_perlin_rows(img_array, plan.noise_levels, top, h)
+            else:
+                EffectsProcessor.add_dynamic_noise(img_array, 'standard', rng=rng)
             final_img = Image.fromarray(img_array)
 
         return final_img.convert('RGB')
 
-    def add_bubbles(self, draw: ImageDraw.Draw, w: int, h: int, count: int = 15):
+    def create_background(self, config: GenerationConfig = None, rng: SeededRandom = None) -> Image.Image:
+        """创建背景图像
+
+        rng: 本张图的随机源，默认按 config.seed 创建；所有随机采样都从它取，种子相同则输出相同
+        """
+        rng = rng or SeededRandom((config or self.config).seed)
+        plan = self.plan_background(config, rng)
+        return self.render_rows(plan, 0, plan.config.height, rng)
+
+    def render_to_png(self, filepath: str, config: GenerationConfig = None, rng: SeededRandom = None,
+                      band_rows: int = EffectsProcessor.NOISE_BAND_ROWS) -> str:
+        """按行带渲染背景并流式写出PNG，峰值内存与带高成正比而不是与画布大小成正比
+
+        输出与 create_background 相同；band_rows 向上取到 NOISE_BAND_ROWS 的整数倍，
+        标准噪声的随机序列因此与整帧一致。含景深模糊（需要整帧金字塔）时整帧渲染后再写出
+        """
+        rng = rng or SeededRandom((config or self.config).seed)
+        plan = self.plan_background(config, rng)
+        w, h = plan.config.width, plan.config.height
+        step = EffectsProcessor.NOISE_BAND_ROWS
+        band_rows = h if plan.depth_spots is not None else -(-max(1, band_rows) // step) * step
+
+        with PNGStreamWriter(filepath, w, h) as writer:
+            for top in range(0, h, band_rows):
+                band = self.render_rows(plan, top, min(h, top + band_rows), rng)
+                writer.write_rows(np.asarray(band))
+        return filepath
+
+    @staticmethod
+    def save_resized(img: Image.Image, size: Tuple[int, int], filepath: str, band_rows: int = 256) -> str:
+        """把 img 按 LANCZOS 缩放到 size 并按行带流式写出PNG，缩放后的整帧不驻留内存
+
+        每个行带用 resize 的 box 参数只缩放自己覆盖的源区域，滤波仍取到带外的源像素，结果与整帧缩放相同
+        """
+        width, height = size
+        scale = img.height / height
+        with PNGStreamWriter(filepath, width, height) as writer:
+            for top in range(0, height, band_rows):
+                bottom = min(height, top + band_rows)
+                band = img.resize((width, bottom - top), Image.Resampling.LANCZOS,
+                                  box=(0, top * scale, img.width, bottom * scale))
+                writer.write_rows(np.asarray(band.convert('RGB')))
+        return filepath
+
+    def add_bubbles(self, draw: DrawRecorder, w: int, h: int, count: int = 15, rng: SeededRandom = None):
         """添加气泡效果"""
+        rng = rng or SeededRandom()
         for _ in range(count):
-            x = random.randint(0, w)
-            y = random.randint(0, h)
-            radius = random.randint(5, 30)
-            alpha = random.randint(10, 40)
+            x = rng.randint(0, w)
+            y = rng.randint(0, h)
+            radius = rng.randint(5, 30)
+            alpha = rng.randint(10, 40)
 
             bubble_color = (255, 255, 255, alpha)
             draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=bubble_color)
@@ -505,44 +904,57 @@ class EnhancedBackgroundGenerator:
                 highlight_x + highlight_radius, highlight_y + highlight_radius
             ], fill=highlight_color)
 
-    def add_dots(self, draw: ImageDraw.Draw, w: int, h: int, count: int = 25):
+    def add_dots(self, draw: DrawRecorder, w: int, h: int, count: int = 25, rng: SeededRandom = None):
         """添加点状装饰"""
+        rng = rng or SeededRandom()
         for _ in range(count):
-            x = random.randint(0, w)
-            y = random.randint(0, h)
-            radius = random.randint(1, 3)
-            alpha = random.randint(15, 40)
-
-            color = (180 + random.randint(-30, 30),
-                     180 + random.randint(-30, 30),
-                     180 + random.randint(-30, 30), alpha)
+            x = rng.randint(0, w)
+            y = rng.randint(0, h)
+            radius = rng.randint(1, 3)
+            alpha = rng.randint(15, 40)
+
+            color = (180 + rng.randint(-30, 30),
+                     180 + rng.randint(-30, 30),
+                     180 + rng.randint(-30, 30), alpha)
             draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=color)
 
     def batch_generate(self, count: int, output_dir: str = "enhanced_backgrounds",
-                       configs: List[GenerationConfig] = None) -> List[str]:
-        """批量生成背景"""
+                       configs: List[GenerationConfig] = None, seed: int = None) -> List[str]:
+        """批量生成背景，第 i 张图使用 SeededRandom(config.seed, i) 的独立随机流，可单独复现
+
+        只导出原尺寸时按行带渲染并流式写出PNG；需要其他尺寸时整帧渲染原尺寸，
+        缩放后的尺寸（如4K）按行带缩放并流式写出
+        """
         os.makedirs(output_dir, exist_ok=True)
         generated_files = []
 
         if not configs:
             # 生成随机配置
-            configs = self.generate_random_configs(count)
+            configs = self.generate_random_configs(count, seed)
 
         for i, config in enumerate(configs[:count]):
             print(f"Generating background {i + 1}/{count}")
 
-            bg_img = self.create_background(config)
+            rng = SeededRandom(config.seed, i + 1)
+            native = (config.width, config.height)
+            bg_img = None
+            if any(size != native for size in config.export_sizes):
+                bg_img = self.create_background(config, rng)
+            streamed = None
 
             # 导出多种尺寸
             for size_idx, (width, height) in enumerate(config.export_sizes):
-                if width != config.width or height != config.height:
-                    resized_img = bg_img.resize((width, height), Image.Resampling.LANCZOS)
-                else:
-                    resized_img = bg_img
-
                 filename = f"enhanced_bg_{config.style}_{config.color_scheme}_{width}x{height}_{i + 1:03d}.png"
                 filepath = os.path.join(output_dir, filename)
-                resized_img.save(filepath)
+                if bg_img is None:
+                    if streamed is None:
+                        streamed = self.render_to_png(filepath, config, rng)
+                    elif streamed != filepath:
+                        shutil.copyfile(streamed, filepath)
+                elif (width, height) != native:
+                    self.save_resized(bg_img, (width, height), filepath)
+                else:
+                    bg_img.save(filepath)
                 generated_files.append(filepath)
                 print(f"Saved {filename}")
 
@@ -554,11 +966,12 @@ class EnhancedBackgroundGenerator:
 
         return generated_files
 
-    def generate_random_configs(self, count: int) -> List[GenerationConfig]:
-        """生成随机配置"""
+    def generate_random_configs(self, count: int, seed: int = None) -> List[GenerationConfig]:
+        """生成随机配置，seed 相同则配置相同，并写入各配置供渲染时派生随机流"""
+        rng = SeededRandom(seed)
         configs = []
         styles = ['mixed', 'bubble', 'geometric', 'organic', 'minimal', 'abstract']
-        color_schemes = list(self.color_manager.SCHEMES.keys()) + ['random']
+        color_schemes = list(self.color_manager.SCHEMES.keys()) + ['random', 'perceptual']
 
         effect_pools = [
             ['gradient', 'bubbles', 'dots', 'curves'],  # 确保curves在效果池中
@@ -579,13 +992,15 @@ class EnhancedBackgroundGenerator:
             config = GenerationConfig(
                 width=1920,  # 默认1920
                 height=1080,  # 默认1080
-                style=random.choice(styles),
-                color_scheme=random.choice(color_schemes),
-                noise_intensity=random.uniform(0.005, 0.02),
-                blur_radius=random.uniform(0.2, 1.0),
-                effects=random.choice(effect_pools),
-                element_density=random.uniform(0.5, 1.5),
-                export_sizes=random.choice(export_sizes_options)
+                style=rng.choice(styles),
+                color_scheme=rng.choice(color_schemes),
+                noise_intensity=rng.uniform(0.005, 0.02),
+                blur_radius=rng.uniform(0.2, 1.0),
+                effects=rng.choice(effect_pools),
+                element_density=rng.uniform(0.5, 1.5),
+                export_sizes=rng.choice(export_sizes_options),
+                gradient_style=rng.choice(['four_corner', 'horizontal', 'vertical', 'diagonal', 'radial']),
+                seed=seed
             )
             configs.append(config)
 
@@ -622,26 +1037,28 @@ class EnhancedBackgroundGenerator:
 
 
 def create_random_background(width: int = 1920, height: int = 1080,
-                             style: str = None, effects: List[str] = None) -> Image.Image:
-    """便捷函数：创建随机背景（供第三方调用）"""
+                             style: str = None, effects: List[str] = None, seed: int = None) -> Image.Image:
+    """便捷函数：创建随机背景（供第三方调用），seed 相同则生成相同图片"""
+    rng = SeededRandom(seed)
     config = GenerationConfig(
         width=width,
         height=height,
-        style=style or random.choice(['mixed', 'bubble', 'geometric', 'organic', 'minimal']),
-        color_scheme=random.choice(['pastel', 'vibrant', 'ocean', 'sunset', 'forest']),
-        effects=effects or random.choice([
+        style=style or rng.choice(['mixed', 'bubble', 'geometric', 'organic', 'minimal']),
+        color_scheme=rng.choice(['pastel', 'vibrant', 'ocean', 'sunset', 'forest']),
+        effects=effects or rng.choice([
             ['gradient', 'bubbles', 'dots', 'curves'],
             ['watermark', 'particles', 'curves'],
             ['grid', 'shapes', 'lighting', 'curves'],
             ['bubbles', 'particles', 'curves'],
         ]),
-        element_density=random.uniform(0.7, 1.3),
-        noise_intensity=random.uniform(0.005, 0.015),
-        blur_radius=random.uniform(0.3, 0.8)
+        element_density=rng.uniform(0.7, 1.3),
+        noise_intensity=rng.uniform(0.005, 0.015),
+        blur_radius=rng.uniform(0.3, 0.8),
+        seed=seed
     )
 
     generator = EnhancedBackgroundGenerator(config)
-    return generator.create_background()
+    return generator.create_background(rng=rng)
 
 
 def create_themed_background(theme: str = 'corporate', width: int = 1920, height: int = 1080) -> Image.Image:
@@ -715,13 +1132,14 @@ class BackgroundAPI:
     def generate_batch(self, count: int, output_dir: str, **kwargs) -> List[str]:
         """批量生成"""
         configs = []
+        rng = SeededRandom(kwargs.get('seed'))
         for _ in range(count):
             config_dict = kwargs.copy()
             # 添加随机变化
             if 'style' not in config_dict:
-                config_dict['style'] = random.choice(['mixed', 'bubble', 'geometric', 'organic'])
+                config_dict['style'] = rng.choice(['mixed', 'bubble', 'geometric', 'organic'])
             if 'color_scheme' not in config_dict:
-                config_dict['color_scheme'] = random.choice(['pastel', 'vibrant', 'ocean', 'sunset'])
+                config_dict['color_scheme'] = rng.choice(['pastel', 'vibrant', 'ocean', 'sunset'])
 
             configs.append(GenerationConfig(**config_dict))
 
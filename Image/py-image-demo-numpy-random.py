@@ -154,6 +154,7 @@ import numpy as np
 from PIL import Image
 import random
 import os
+from functools import lru_cache
 
 
 def get_random_gradient_colors():
@@ -190,14 +191,27 @@ def get_random_gradient_colors():
     return random.sample(color_pool, 4)
 
 
+@lru_cache(maxsize=8)
+def get_coordinate_grid(w, h, centered):
+    """缓存坐标网格(只读float32)，同尺寸的多帧渐变不再重复 linspace + meshgrid
+
+    centered=True 时坐标范围为[-1, 1]，否则为[0, 1]；命中统计见 get_coordinate_grid.cache_info()
+    """
+    start = -1 if centered else 0
+    x = np.linspace(start, 1, w, dtype=np.float32)
+    y = np.linspace(start, 1, h, dtype=np.float32)
+    X, Y = np.meshgrid(x, y)
+    X.setflags(write=False)
+    Y.setflags(write=False)
+    return X, Y
+
+
 def create_gradient_fast(w, h, colors):
     """快速生成渐变图像"""
     top_left, top_right, bottom_left, bottom_right = colors
 
-    # 创建坐标网格
-    x = np.linspace(0, 1, w)
-    y = np.linspace(0, 1, h)
-    X, Y = np.meshgrid(x, y)
+    # 创建坐标网格（缓存）
+    X, Y = get_coordinate_grid(w, h, centered=False)
 
     # 矢量化双线性插值
     top = top_left[None, None, :] * (1 - X[:, :, None]) + top_right[None, None, :] * X[:, :, None]
@@ -258,27 +272,21 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'diagonal':
         # 对角线渐变：左上到右下
-        x = np.linspace(0, 1, w)
-        y = np.linspace(0, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=False)
         t = (X + Y) / 2  # 对角线权重
         gradient = colors[0][None, None, :] * (1 - t[:, :, None]) + colors[1][None, None, :] * t[:, :, None]
         return gradient
 
     elif direction == 'diagonal_reverse':
         # 反对角线渐变：右上到左下
-        x = np.linspace(0, 1, w)
-        y = np.linspace(0, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=False)
         t = (X - Y) / 2  # 反对角线权重
         gradient = colors[0][None, None, :] * (1 - t[:, :, None]) + colors[1][None, None, :] * t[:, :, None]
         return gradient
 
     elif direction == 'radial':
         # 径向渐变：中心到边缘
-        x = np.linspace(-1, 1, w)
-        y = np.linspace(-1, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=True)
         distance = np.sqrt(X ** 2 + Y ** 2)
         distance = np.clip(distance / np.sqrt(2), 0, 1)  # 归一化
         gradient = colors[0][None, None, :] * (1 - distance[:, :, None]) + colors[1][None, None, :] * distance[
@@ -287,9 +295,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'radial_square':
         # 方形径向渐变：中心到边缘，方形
-        x = np.linspace(-1, 1, w)
-        y = np.linspace(-1, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=True)
         distance = np.maximum(np.abs(X), np.abs(Y))
         distance = np.clip(distance / np.sqrt(2), 0, 1)  # 归一化
         gradient = colors[0][None, None, :] * (1 - distance[:, :, None]) + colors[1][None, None, :] * distance[
@@ -298,9 +304,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'radial_ellipse':
         # 椭圆径向渐变：中心到边缘，椭圆形
-        x = np.linspace(-1, 1, w)
-        y = np.linspace(-1, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=True)
         distance = np.sqrt((X ** 2) + (2 * Y ** 2))
         distance = np.clip(distance / np.sqrt(3), 0, 1)  # 归一化
         gradient = colors[0][None, None, :] * (1 - distance[:, :, None]) + colors[1][None, None, :] * distance[
@@ -323,9 +327,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'spiral':
         # 螺旋渐变
-        x = np.linspace(-1, 1, w)
-        y = np.linspace(-1, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=True)
         theta = np.arctan2(Y, X)  # 计算极角
         r = np.sqrt(X ** 2 + Y ** 2)  # 计算径向
         gradient = colors[0][None, None, :] * (1 - r[:, :, None]) + colors[1][None, None, :] * r[:, :, None]
@@ -333,9 +335,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'diamond':
         # 钻石形渐变
-        x = np.linspace(-1, 1, w)
-        y = np.linspace(-1, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=True)
         distance = np.maximum(np.abs(X), np.abs(Y))
         distance = np.clip(distance / np.sqrt(2), 0, 1)  # 归一化
         gradient = colors[0][None, None, :] * (1 - distance[:, :, None]) + colors[1][None, None, :] * distance[
@@ -344,9 +344,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'cross':
         # 十字形渐变
-        x = np.linspace(0, 1, w)
-        y = np.linspace(0, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=False)
         gradient = np.zeros((h, w, 3))
         gradient[:, :w//2, :] = colors[0]  # 左半边
         gradient[:, w//2:, :] = colors[1]  # 右半边
@@ -356,9 +354,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'triangle':
         # 三角形渐变
-        x = np.linspace(0, 1, w)
-        y = np.linspace(0, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=False)
         gradient = np.zeros((h, w, 3))
         mask1 = (X + Y) <= 1
         mask2 = (X - Y) >= 0
@@ -372,9 +368,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'multi_radial':
         # 多个径向中心渐变
-        x = np.linspace(-1, 1, w)
-        y = np.linspace(-1, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=True)
         distance1 = np.sqrt((X + 0.5) ** 2 + (Y + 0.5) ** 2)
         distance2 = np.sqrt((X - 0.5) ** 2 + (Y - 0.5) ** 2)
         distance = np.minimum(distance1, distance2)
@@ -385,9 +379,7 @@ def create_random_gradient(w, h, colors, direction):
 
     elif direction == 'conic':
         # 圆锥渐变
-        x = np.linspace(-1, 1, w)
-        y = np.linspace(-1, 1, h)
-        X, Y = np.meshgrid(x, y)
+        X, Y = get_coordinate_grid(w, h, centered=True)
         theta = np.arctan2(Y, X)  # 计算极角
         r = np.sqrt(X ** 2 + Y ** 2)  # 计算径向
         gradient = colors[0][None, None, :] * (1 - r[:, :, None]) + colors[1][None, None, :] * r[:, :, None]
@@ -1,16 +1,12 @@
-import noise
-import numpy as np
 from PIL import Image
 
+from perlin_noise import pnoise2_grid, noise_to_gray
+
 w, h = 800, 600
 scale = 100.0
 
-array = np.zeros((h, w, 3), dtype=np.uint8)
-for y in range(h):
-    for x in range(w):
-        val = noise.pnoise2(x/scale, y/scale, octaves=6)
-        gray = int((val + 0.2) * 255)
-        array[y, x] = (gray, gray, gray)
+val = pnoise2_grid(w, h, scale, octaves=6)
+array = noise_to_gray(val, bias=0.2)
 
 img = Image.fromarray(array)
 img.show()
@@ -3,10 +3,11 @@ import random
 import string
 import numpy as np
 from PIL import Image
-import noise
 import matplotlib.pyplot as plt
 import turtle
 
+from perlin_noise import pnoise2_grid, noise_to_gray
+
 # 随机文件名生成
 def random_filename(ext="png"):
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8)) + f".{ext}"
@@ -15,19 +16,14 @@ def random_filename(ext="png"):
 out_dir = os.path.join(os.getcwd(), "random_images")
 os.makedirs(out_dir, exist_ok=True)
 
-# 1. 使用 noise 生成云层背景
+# 1. 使用向量化 Perlin 噪声生成云层背景
 def generate_cloud_image(width=512, height=512, scale=100.0):
-    array = np.zeros((height, width, 3), dtype=np.uint8)
-    for y in range(height):
-        for x in range(width):
-            val = noise.pnoise2(
-                x / scale, y / scale,
-                octaves=6, persistence=0.5, lacunarity=2.0,
-                repeatx=1024, repeaty=1024, base=42
-            )
-            gray = int((val + 0.5) * 255)
-            array[y, x] = (gray, gray, gray)
-    img = Image.fromarray(array)
+    values = pnoise2_grid(
+        width, height, scale,
+        octaves=6, persistence=0.5, lacunarity=2.0,
+        repeatx=1024, repeaty=1024, base=42
+    )
+    img = Image.fromarray(noise_to_gray(values))
     fname = os.path.join(out_dir, random_filename("png"))
     img.save(fname)
     print("Cloud image saved:", fname)
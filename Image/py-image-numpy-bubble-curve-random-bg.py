@@ -1,13 +1,15 @@
 import numpy as np
 from PIL import Image, ImageDraw, ImageFilter, ImageEnhance
-import random
 import os
 import math
 import json
 from typing import Dict, List, Tuple, Any, Optional
 from dataclasses import dataclass, asdict
+from functools import lru_cache
 import colorsys
 
+from image_helpers import NoiseBank, SeededRandom, SpriteAtlas, SplatLayer, clip_polyline
+
 
 @dataclass
 class ImageConfig:
@@ -21,6 +23,7 @@ class ImageConfig:
     effects: List[str] = None
     element_density: float = 1.0
     curve_types: List[str] = None
+    seed: Optional[int] = None  # 随机种子，批量生成时每张图按 (seed, 序号) 派生独立的随机流
 
     def __post_init__(self):
         if self.effects is None:
@@ -44,38 +47,41 @@ class ColorManager:
     ]
 
     @classmethod
-    def get_gradient_colors(cls, count: int = 4) -> List[np.ndarray]:
+    def get_gradient_colors(cls, count: int = 4, rng: SeededRandom = None) -> List[np.ndarray]:
         """获取渐变颜色，包含原有颜色和随机生成的柔和背景色"""
+        rng = rng or SeededRandom()
         color_pool = cls.BASE_COLORS.copy()
 
         # 生成2倍数量的随机背景色（适合背景的柔和颜色）
         num_random_colors = len(cls.BASE_COLORS) * 2
         for _ in range(num_random_colors):
             # 生成柔和的背景色：RGB值在180-255范围内，避免太暗、太亮或太鲜艳
-            r = random.randint(180, 255)
-            g = random.randint(180, 255)
-            b = random.randint(180, 255)
+            r = rng.randint(180, 255)
+            g = rng.randint(180, 255)
+            b = rng.randint(180, 255)
 
             # 确保颜色不会太过鲜艳，通过限制RGB差值来保持柔和
             max_val = max(r, g, b)
             min_val = min(r, g, b)
             if max_val - min_val > 60:  # 如果差值太大，调整到更接近的值
                 avg = (r + g + b) // 3
-                r = random.randint(max(180, avg - 30), min(255, avg + 30))
-                g = random.randint(max(180, avg - 30), min(255, avg + 30))
-                b = random.randint(max(180, avg - 30), min(255, avg + 30))
+                r = rng.randint(max(180, avg - 30), min(255, avg + 30))
+                g = rng.randint(max(180, avg - 30), min(255, avg + 30))
+                b = rng.randint(max(180, avg - 30), min(255, avg + 30))
 
             color_pool.append(np.array([r, g, b]))
 
-        return random.sample(color_pool, count)
+        return rng.sample(color_pool, count)
 
     @classmethod
-    def random_color_rgba(cls, alpha_range: Tuple[int, int] = (10, 50)) -> Tuple[int, int, int, int]:
+    def random_color_rgba(cls, alpha_range: Tuple[int, int] = (10, 50),
+                          rng: SeededRandom = None) -> Tuple[int, int, int, int]:
         """生成随机RGBA颜色"""
-        r = random.randint(100, 255)
-        g = random.randint(100, 255)
-        b = random.randint(100, 255)
-        a = random.randint(*alpha_range)
+        rng = rng or SeededRandom()
+        r = rng.randint(100, 255)
+        g = rng.randint(100, 255)
+        b = rng.randint(100, 255)
+        a = rng.randint(*alpha_range)
         return (r, g, b, a)
 
 
@@ -83,67 +89,69 @@ class GradientGenerator:
     """渐变生成器 - 提取自参照文件并扩展"""
 
     @staticmethod
-    def get_random_direction():
+    def get_random_direction(rng: SeededRandom = None):
         """随机选择渐变方向"""
         directions = [
             'diagonal', 'diagonal_reverse', 'horizontal', 'vertical', 'radial',
             'radial_square', 'radial_ellipse', 'wave_horizontal', 'wave_vertical',
             'spiral', 'diamond', 'cross', 'triangle', 'four_corner', 'multi_radial', 'conic'
         ]
-        return random.choice(directions)
+        return (rng or SeededRandom()).choice(directions)
 
     @staticmethod
-    def create_gradient(w: int, h: int, colors: List[np.ndarray], direction: str = None) -> np.ndarray:
+    @lru_cache(maxsize=16)
+    def _scalar_fields(w: int, h: int, direction: str) -> Tuple[np.ndarray, ...]:
+        """按(宽, 高, 方向)缓存归一化的只读float32标量场，命中统计见 _scalar_fields.cache_info()"""
+        if direction == 'horizontal':
+            fields = (np.linspace(0, 1, w, dtype=np.float32)[None, :],)
+        elif direction == 'vertical':
+            fields = (np.linspace(0, 1, h, dtype=np.float32)[:, None],)
+        elif direction == 'diagonal':
+            x = np.linspace(0, 0.5, w, dtype=np.float32)
+            y = np.linspace(0, 0.5, h, dtype=np.float32)
+            fields = (y[:, None] + x[None, :],)
+        elif direction == 'radial':
+            x = np.linspace(-1, 1, w, dtype=np.float32)
+            y = np.linspace(-1, 1, h, dtype=np.float32)
+            distance = np.hypot(y[:, None], x[None, :]) / np.float32(np.sqrt(2))
+            fields = (np.clip(distance, 0, 1),)
+        else:  # four_corner
+            fields = (np.linspace(0, 1, w, dtype=np.float32)[None, :],
+                      np.linspace(0, 1, h, dtype=np.float32)[:, None])
+
+        for field in fields:
+            field.setflags(write=False)
+        return fields
+
+    @staticmethod
+    def create_gradient(w: int, h: int, colors: List[np.ndarray], direction: str = None,
+                        rng: SeededRandom = None) -> np.ndarray:
         """根据方向创建不同类型的渐变"""
         if direction is None:
-            direction = GradientGenerator.get_random_direction()
+            direction = GradientGenerator.get_random_direction(rng)
 
         if len(colors) < 2:
             colors = colors * 2
         if len(colors) < 4:
             colors = colors + colors[:4-len(colors)]
 
-        if direction == 'horizontal':
-            # 水平渐变：左到右
-            x = np.linspace(0, 1, w)
-            gradient = colors[0][None, :] * (1 - x[:, None]) + colors[1][None, :] * x[:, None]
-            return np.tile(gradient[None, :, :], (h, 1, 1))
-
-        elif direction == 'vertical':
-            # 垂直渐变：上到下
-            y = np.linspace(0, 1, h)
-            gradient = colors[0][None, :] * (1 - y[:, None]) + colors[1][None, :] * y[:, None]
-            return np.tile(gradient[:, None, :], (1, w, 1))
-
-        elif direction == 'diagonal':
-            # 对角线渐变：左上到右下
-            x = np.linspace(0, 1, w)
-            y = np.linspace(0, 1, h)
-            X, Y = np.meshgrid(x, y)
-            t = (X + Y) / 2
-            gradient = colors[0][None, None, :] * (1 - t[:, :, None]) + colors[1][None, None, :] * t[:, :, None]
-            return gradient
-
-        elif direction == 'radial':
-            # 径向渐变：中心到边缘
-            x = np.linspace(-1, 1, w)
-            y = np.linspace(-1, 1, h)
-            X, Y = np.meshgrid(x, y)
-            distance = np.sqrt(X ** 2 + Y ** 2)
-            distance = np.clip(distance / np.sqrt(2), 0, 1)
-            gradient = colors[0][None, None, :] * (1 - distance[:, :, None]) + colors[1][None, None, :] * distance[:, :, None]
-            return gradient
-
-        else:  # four_corner - 默认四角渐变
-            top_left, top_right, bottom_left, bottom_right = colors[:4]
-            x = np.linspace(0, 1, w)
-            y = np.linspace(0, 1, h)
-            X, Y = np.meshgrid(x, y)
-
-            top = top_left[None, None, :] * (1 - X[:, :, None]) + top_right[None, None, :] * X[:, :, None]
-            bottom = bottom_left[None, None, :] * (1 - X[:, :, None]) + bottom_right[None, None, :] * X[:, :, None]
-            gradient = top * (1 - Y[:, :, None]) + bottom * Y[:, :, None]
-            return gradient
+        # 未实现的方向使用四角渐变
+        if direction not in ('horizontal', 'vertical', 'diagonal', 'radial'):
+            direction = 'four_corner'
+        fields = GradientGenerator._scalar_fields(w, h, direction)
+        c = [np.asarray(color, dtype=np.float32) for color in colors[:4]]
+
+        gradient = np.empty((h, w, 3), dtype=np.float32)
+        if len(fields) == 1:
+            # 两色混合：c0 + (c1 - c0) * t
+            gradient[...] = c[0] + (c[1] - c[0]) * fields[0][:, :, None]
+        else:
+            # 四角双线性插值
+            x, y = fields
+            top = c[0] + (c[1] - c[0]) * x[:, :, None]
+            bottom = c[2] + (c[3] - c[2]) * x[:, :, None]
+            gradient[...] = top + (bottom - top) * y[:, :, None]
+        return gradient
 
 
 class CurveGenerator:
@@ -216,33 +224,33 @@ class CurveGenerator:
 
 
 class ElementDrawer:
-    """装饰元素绘制器"""
+    """装饰元素绘制器，气泡和粒子写入 splats 批量光栅化"""
 
-    def __init__(self, draw: ImageDraw.Draw, width: int, height: int):
+    def __init__(self, draw: ImageDraw.Draw, width: int, height: int, rng: SeededRandom = None):
         self.draw = draw
         self.width = width
         self.height = height
+        self.rng = rng or SeededRandom()
+        self.splats = SplatLayer(width, height, cross_width=2)
 
     def add_bubbles(self, count: int = 15):
-        """添加气泡效果"""
-        for _ in range(count):
-            x = random.randint(0, self.width)
-            y = random.randint(0, self.height)
-            radius = random.randint(10, 60)
-            alpha = random.randint(15, 60)
-
-            bubble_color = ColorManager.random_color_rgba((alpha, alpha + 20))
-            self.draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=bubble_color)
-
-            # 高光
-            highlight_radius = radius // 3
-            highlight_x = x - radius // 3
-            highlight_y = y - radius // 3
-            highlight_color = (255, 255, 255, min(255, alpha + 30))
-            self.draw.ellipse([
-                highlight_x - highlight_radius, highlight_y - highlight_radius,
-                highlight_x + highlight_radius, highlight_y + highlight_radius
-            ], fill=highlight_color)
+        """添加气泡效果，每个气泡带左上方高光"""
+        generator = self.rng.generator
+        positions = generator.integers([0, 0], [self.width + 1, self.height + 1], (count, 2))
+        radii = generator.integers(10, 61, count)
+        alphas = generator.integers(15, 61, count)
+
+        colors = generator.integers([100, 100, 100, 0], [256, 256, 256, 21], (count, 4))
+        colors[:, 3] += alphas
+        self.splats.add_circles(positions[:, 0], positions[:, 1], radii, colors)
+
+        # 高光，与气泡交错排列，保持"气泡、自身高光、下一个气泡"的绘制顺序
+        offsets = radii // 3
+        highlights = np.full((count, 4), 255)
+        highlights[:, 3] = np.minimum(255, alphas + 30)
+        self.splats.add_circles(np.column_stack([positions[:, 0], positions[:, 0] - offsets]),
+                                np.column_stack([positions[:, 1], positions[:, 1] - offsets]),
+                                np.column_stack([radii, offsets]), np.stack([colors, highlights], axis=1))
 
     def add_curves(self, count: int = 8, curve_types: List[str] = None):
         """添加数学曲线"""
@@ -250,50 +258,50 @@ class ElementDrawer:
             curve_types = ['bezier', 'sine', 'spiral', 'lissajous', 'rose', 'parabola']
 
         for _ in range(count):
-            curve_type = random.choice(curve_types)
-            color = ColorManager.random_color_rgba((20, 60))
+            curve_type = self.rng.choice(curve_types)
+            color = ColorManager.random_color_rgba((20, 60), self.rng)
 
             try:
                 if curve_type == 'bezier':
-                    p0 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
-                    p1 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
-                    p2 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
-                    p3 = np.array([random.randint(0, self.width), random.randint(0, self.height)], dtype=np.float32)
+                    p0 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
+                    p1 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
+                    p2 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
+                    p3 = np.array([self.rng.randint(0, self.width), self.rng.randint(0, self.height)], dtype=np.float32)
                     points = CurveGenerator.bezier_curve(p0, p1, p2, p3, 50)
                     self._draw_curve_points(points, color)
 
                 elif curve_type == 'sine':
-                    start_x = random.randint(0, self.width // 2)
-                    start_y = random.randint(0, self.height)
-                    length = random.randint(100, 400)
-                    amplitude = random.randint(20, 80)
-                    frequency = random.uniform(1.0, 4.0)
+                    start_x = self.rng.randint(0, self.width // 2)
+                    start_y = self.rng.randint(0, self.height)
+                    length = self.rng.randint(100, 400)
+                    amplitude = self.rng.randint(20, 80)
+                    frequency = self.rng.uniform(1.0, 4.0)
                     points = CurveGenerator.sine_wave(start_x, start_y, length, amplitude, frequency)
                     self._draw_curve_line(points, color)
 
                 elif curve_type == 'spiral':
-                    center_x = random.randint(100, self.width - 100)
-                    center_y = random.randint(100, self.height - 100)
-                    max_radius = random.randint(50, 150)
-                    turns = random.uniform(2, 5)
+                    center_x = self.rng.randint(100, self.width - 100)
+                    center_y = self.rng.randint(100, self.height - 100)
+                    max_radius = self.rng.randint(50, 150)
+                    turns = self.rng.uniform(2, 5)
                     points = CurveGenerator.spiral(center_x, center_y, max_radius, turns)
                     self._draw_curve_line(points, color)
 
                 elif curve_type == 'lissajous':
-                    center_x = random.randint(100, self.width - 100)
-                    center_y = random.randint(100, self.height - 100)
-                    a = random.randint(2, 6)
-                    b = random.randint(2, 6)
-                    delta = random.uniform(0, np.pi)
-                    scale = random.randint(30, 100)
+                    center_x = self.rng.randint(100, self.width - 100)
+                    center_y = self.rng.randint(100, self.height - 100)
+                    a = self.rng.randint(2, 6)
+                    b = self.rng.randint(2, 6)
+                    delta = self.rng.uniform(0, np.pi)
+                    scale = self.rng.randint(30, 100)
                     points = CurveGenerator.lissajous(center_x, center_y, a, b, delta, scale)
                     self._draw_curve_line(points, color)
 
                 elif curve_type == 'rose':
-                    center_x = random.randint(100, self.width - 100)
-                    center_y = random.randint(100, self.height - 100)
-                    k = random.randint(3, 8)
-                    scale = random.randint(40, 120)
+                    center_x = self.rng.randint(100, self.width - 100)
+                    center_y = self.rng.randint(100, self.height - 100)
+                    k = self.rng.randint(3, 8)
+                    scale = self.rng.randint(40, 120)
                     points = CurveGenerator.rose_curve(center_x, center_y, k, scale)
                     self._draw_curve_line(points, color)
 
@@ -303,65 +311,40 @@ class ElementDrawer:
 
     def _draw_curve_points(self, points, color):
         """绘制贝塞尔曲线点"""
-        for i in range(len(points) - 1):
-            p1_coords = (int(points[i][0]), int(points[i][1]))
-            p2_coords = (int(points[i + 1][0]), int(points[i + 1][1]))
-            if (0 <= p1_coords[0] < self.width and 0 <= p1_coords[1] < self.height and
-                    0 <= p2_coords[0] < self.width and 0 <= p2_coords[1] < self.height):
-                self.draw.line([p1_coords, p2_coords], fill=color, width=random.randint(1, 3))
+        self._draw_curve_line(points, color)
 
     def _draw_curve_line(self, points, color):
-        """绘制曲线"""
-        for i in range(len(points) - 1):
-            p1_coords = (int(points[i][0]), int(points[i][1]))
-            p2_coords = (int(points[i + 1][0]), int(points[i + 1][1]))
-            if (0 <= p1_coords[0] < self.width and 0 <= p1_coords[1] < self.height and
-                    0 <= p2_coords[0] < self.width and 0 <= p2_coords[1] < self.height):
-                self.draw.line([p1_coords, p2_coords], fill=color, width=random.randint(1, 3))
+        """绘制曲线：裁剪到画布后每条可见折线一次 draw.line 调用"""
+        width = self.rng.randint(1, 3)
+        for run in clip_polyline(points, self.width, self.height, width / 2):
+            self.draw.line(run.ravel().tolist(), fill=color, width=width, joint='curve')
 
     def add_particles(self, count: int = 50):
-        """添加粒子效果"""
-        particle_types = ['dot', 'star', 'cross', 'ring']
-
-        for _ in range(count):
-            particle_type = random.choice(particle_types)
-            x = random.randint(0, self.width)
-            y = random.randint(0, self.height)
-            size = random.randint(2, 8)
-            color = ColorManager.random_color_rgba((20, 80))
-
-            if particle_type == 'dot':
-                self.draw.ellipse([x - size, y - size, x + size, y + size], fill=color)
-            elif particle_type == 'star':
-                # 简单星形
-                for i in range(4):
-                    angle = i * math.pi / 2
-                    x2 = x + size * math.cos(angle)
-                    y2 = y + size * math.sin(angle)
-                    self.draw.line([(x, y), (x2, y2)], fill=color, width=1)
-            elif particle_type == 'cross':
-                self.draw.line([(x - size, y), (x + size, y)], fill=color, width=2)
-                self.draw.line([(x, y - size), (x, y + size)], fill=color, width=2)
-            elif particle_type == 'ring':
-                self.draw.ellipse([x - size, y - size, x + size, y + size], outline=color, width=1)
+        """添加粒子效果：圆点、星形、十字和圆环取自精灵图集，整层一次混合"""
+        generator = self.rng.generator
+        kinds = generator.integers(0, len(SpriteAtlas.KINDS), count)
+        positions = generator.integers([0, 0], [self.width + 1, self.height + 1], (count, 2))
+        sizes = generator.integers(2, 9, count)
+        colors = generator.integers([100, 100, 100, 20], [256, 256, 256, 81], (count, 4))
+        self.splats.add_sprites(kinds, positions[:, 0], positions[:, 1], sizes, colors)
 
     def add_abstract_shapes(self, count: int = 10):
         """添加抽象形状"""
         for _ in range(count):
-            x = random.randint(0, self.width)
-            y = random.randint(0, self.height)
-            size = random.randint(20, 100)
-            color = ColorManager.random_color_rgba((10, 40))
+            x = self.rng.randint(0, self.width)
+            y = self.rng.randint(0, self.height)
+            size = self.rng.randint(20, 100)
+            color = ColorManager.random_color_rgba((10, 40), self.rng)
 
-            shape_type = random.choice(['blob', 'organic', 'geometric'])
+            shape_type = self.rng.choice(['blob', 'organic', 'geometric'])
 
             if shape_type == 'blob':
                 # 不规则blob形状
                 points = []
-                num_points = random.randint(6, 12)
+                num_points = self.rng.randint(6, 12)
                 for i in range(num_points):
                     angle = 2 * math.pi * i / num_points
-                    radius = size * (0.7 + random.random() * 0.6)
+                    radius = size * (0.7 + self.rng.random() * 0.6)
                     px = x + radius * math.cos(angle)
                     py = y + radius * math.sin(angle)
                     points.append((px, py))
@@ -370,9 +353,9 @@ class ElementDrawer:
             elif shape_type == 'organic':
                 # 有机形状（多个重叠圆）
                 for i in range(3):
-                    offset_x = random.randint(-size // 2, size // 2)
-                    offset_y = random.randint(-size // 2, size // 2)
-                    radius = random.randint(size // 3, size // 2)
+                    offset_x = self.rng.randint(-size // 2, size // 2)
+                    offset_y = self.rng.randint(-size // 2, size // 2)
+                    radius = self.rng.randint(size // 3, size // 2)
                     self.draw.ellipse([
                         x + offset_x - radius, y + offset_y - radius,
                         x + offset_x + radius, y + offset_y + radius
@@ -385,20 +368,20 @@ class ImageGenerator:
     def __init__(self, config: ImageConfig = None):
         self.config = config or ImageConfig()
 
-    def create_noisy_gradient_background(self) -> Image.Image:
+    def create_noisy_gradient_background(self, rng: SeededRandom = None) -> Image.Image:
         """创建带噪声的渐变背景"""
         w, h = self.config.width, self.config.height
+        rng = rng or SeededRandom(self.config.seed)
 
         # 1. 创建基础渐变
-        colors = ColorManager.get_gradient_colors(4)
-        direction = GradientGenerator.get_random_direction()
+        colors = ColorManager.get_gradient_colors(4, rng)
+        direction = GradientGenerator.get_random_direction(rng)
         gradient = GradientGenerator.create_gradient(w, h, colors, direction)
 
         # 2. 添加噪声
         if self.config.noise_intensity > 0:
-            noise = np.random.normal(0, self.config.noise_intensity * 50, gradient.shape).astype(np.float32)
-            gradient = gradient.astype(np.float32) + noise
-            gradient = np.clip(gradient, 0, 255)
+            NoiseBank.add_noise(gradient, self.config.noise_intensity * 50, rng.generator)
+            np.clip(gradient, 0, 255, out=gradient)
 
         # 3. 转换为PIL图像
         base_img = Image.fromarray(gradient.astype(np.uint8), 'RGB')
@@ -409,55 +392,74 @@ class ImageGenerator:
 
         return base_img
 
-    def generate_image(self) -> Image.Image:
-        """生成完整图像"""
+    def generate_image(self, rng: SeededRandom = None) -> Image.Image:
+        """生成完整图像
+
+        rng: 本张图的随机源，默认按 config.seed 创建；所有随机采样都从它取，种子相同则输出相同
+        """
+        rng = rng or SeededRandom(self.config.seed)
         # 创建背景
-        img = self.create_noisy_gradient_background()
+        img = self.create_noisy_gradient_background(rng)
 
         # 创建装饰图层
         overlay = Image.new('RGBA', (self.config.width, self.config.height), (0, 0, 0, 0))
         draw = ImageDraw.Draw(overlay)
-        drawer = ElementDrawer(draw, self.config.width, self.config.height)
+        drawer = ElementDrawer(draw, self.config.width, self.config.height, rng)
 
         # 根据配置添加效果
         density = self.config.element_density
 
+        # 气泡和粒子直接混合到背景像素上；若叠加层上已有曲线/形状，先把叠加层合并进背景，
+        # 保证各效果按 effects 中的顺序叠放
+        layered = False
         for effect in self.config.effects:
-            if effect == 'bubbles':
-                drawer.add_bubbles(count=int(15 * density))
+            if effect in ('bubbles', 'particles'):
+                if layered:
+                    img = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
+                    overlay = Image.new('RGBA', (self.config.width, self.config.height), (0, 0, 0, 0))
+                    drawer.draw = ImageDraw.Draw(overlay)
+                    layered = False
+                if effect == 'bubbles':
+                    drawer.add_bubbles(count=int(15 * density))
+                else:
+                    drawer.add_particles(count=int(50 * density))
+                drawer.splats.composite(img)
+                drawer.splats.clear()
             elif effect == 'curves':
                 drawer.add_curves(count=int(8 * density), curve_types=self.config.curve_types)
-            elif effect == 'particles':
-                drawer.add_particles(count=int(50 * density))
+                layered = True
             elif effect == 'shapes':
                 drawer.add_abstract_shapes(count=int(10 * density))
+                layered = True
 
-        # 合并图层
+        if not layered:
+            return img
         final_img = Image.alpha_composite(img.convert('RGBA'), overlay)
         return final_img.convert('RGB')
 
     def batch_generate(self, count: int, output_dir: str = "output_random_bg") -> List[str]:
-        """批量生成图像"""
-        # 判断输出目录output_dir是否为默认值，如果是，则在后边添加随机数
+        """批量生成图像，第 i 张图使用 SeededRandom(config.seed, i) 的独立随机流，可单独复现"""
+        # 判断输出目录output_dir是否为默认值，如果是，则在后边添加随机数（取系统熵，不受 seed 影响）
         if output_dir == "output_random_bg":
-            output_dir += f"_{random.randint(1000, 9999)}"
+            output_dir += f"_{SeededRandom().randint(1000, 9999)}"
         os.makedirs(output_dir, exist_ok=True)
         generated_files = []
 
         for i in range(count):
             print(f"Generating image {i + 1}/{count}")
+            rng = SeededRandom(self.config.seed, i + 1)
 
             # 每次都随机化配置
-            self.config.noise_intensity = random.uniform(0.005, 0.02)
-            self.config.blur_radius = random.uniform(0.5, 1.5)
-            self.config.element_density = random.uniform(0.8, 1.5)
+            self.config.noise_intensity = rng.uniform(0.005, 0.02)
+            self.config.blur_radius = rng.uniform(0.5, 1.5)
+            self.config.element_density = rng.uniform(0.8, 1.5)
 
             # 随机选择效果组合
             all_effects = ['gradient', 'bubbles', 'curves', 'particles', 'shapes']
-            self.config.effects = random.sample(all_effects, random.randint(3, 5))
+            self.config.effects = rng.sample(all_effects, rng.randint(3, 5))
 
             # 生成图像
-            img = self.generate_image()
+            img = self.generate_image(rng)
 
             # 保存
             filename = f"random_bg_{i+1:03d}.png"